@@ -1,10 +1,434 @@
+import asyncio
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+import time
 import requests
 from decimal import Decimal
 from datetime import datetime
 
+# NumPy es opcional: solo se usa para las conversiones por lote en float64
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 # El "mesero" conoce exactamente en qué parte del restaurante (GitHub) están los ingredientes.
 # El cliente no necesita saber esta dirección.
 URL_DATOS_GITHUB = "https://LucielDOD.github.io/API-Divisas/datos.json"
+# Mapa {"secuencia": N, "EUR": "1.08", ...}: tabla base de los clientes con deltas
+URL_MAPA_GITHUB = "https://LucielDOD.github.io/API-Divisas/datos_mapa.json"
+# Cambios por publicación (solo las divisas que cambiaron), ver aplicar_deltas
+URL_DELTA_GITHUB = "https://LucielDOD.github.io/API-Divisas/datos_delta.json"
+# Los datos se regeneran cada hora, así que no tiene sentido descargarlos más seguido
+TTL_DATOS = 3600
+# Si la descarga falla se sigue usando la tabla previa y se reintenta pasado este tiempo
+REINTENTO_SIN_RED = 60
+
+
+def _parsear_tabla(data) -> dict:
+    """
+    Convierte el JSON publicado en { "EUR": Decimal("1.08"), ... }.
+    Acepta la lista de registros (datos.json) o el mapa directo (datos_mapa.json),
+    del que se descarta la clave "secuencia".
+    """
+    if isinstance(data, dict):
+        return {codigo: Decimal(str(valor)) for codigo, valor in data.items() if codigo != "secuencia"}
+    # Extraer códigos, removiendo el sufijo '-USD' (Ej: 'EUR-USD' -> 'EUR')
+    return {d["codigo"].replace("-USD", ""): Decimal(str(d["valor_actual"])) for d in data}
+
+
+def _valor_relativo(valores_en_usd: dict, divisa_1: str, divisa_2: str) -> Decimal:
+    """(divisa_1 en USD) / (divisa_2 en USD) sobre una tabla ya obtenida (ValueError si falta alguna)."""
+    if divisa_1 not in valores_en_usd:
+        raise ValueError(f"La divisa base '{divisa_1}' no se encuentra en el origen de datos.")
+    if divisa_2 not in valores_en_usd:
+        raise ValueError(f"La divisa objetivo '{divisa_2}' no se encuentra en el origen de datos.")
+    return valores_en_usd[divisa_1] / valores_en_usd[divisa_2]
+
+
+def aplicar_deltas(tabla: dict, secuencia: int, documento: dict):
+    """
+    Aplica a tabla (con los valores de la publicación `secuencia`) los deltas de
+    datos_delta.json posteriores a ella. Retorna la tabla nueva (la original no se
+    modifica), o None si el documento ya no cubre esa secuencia y hace falta la
+    descarga completa.
+    """
+    if secuencia == documento["secuencia"]:
+        return tabla
+    pendientes = [d for d in documento["deltas"] if d["secuencia"] > secuencia]
+    if secuencia > documento["secuencia"] or not pendientes or pendientes[0]["secuencia"] != secuencia + 1:
+        return None
+    tabla = dict(tabla)
+    for delta in pendientes:
+        for codigo, valor in delta["cambios"].items():
+            tabla[codigo] = Decimal(str(valor))
+        for codigo in delta.get("eliminadas", ()):
+            tabla.pop(codigo, None)
+    return tabla
+
+
+# Formato de datos.bin (lo publica DatabaseManager.export_binario)
+CABECERA_SNAPSHOT = struct.Struct("<4sHHIqQ4x")
+MAGIC_SNAPSHOT = b"DIVB"
+# Cada cuántos segundos se revisa si hay un snapshot binario nuevo
+INTERVALO_REVISION_SNAPSHOT = 1.0
+
+
+class SnapshotBinario:
+    """
+    Lector de datos.bin mapeado en memoria (mmap), pensado para varios procesos
+    (p. ej. workers de gunicorn) en la misma máquina: el sistema operativo comparte
+    las páginas del archivo entre todos y los valores se leen sin copiar ni parsear.
+    Cuando se publica un archivo nuevo (rename atómico) el lector vuelve a mapear
+    en la siguiente revisión; el mapeo anterior sigue siendo válido hasta entonces.
+    """
+
+    def __init__(self, ruta: str, intervalo_revision: float = INTERVALO_REVISION_SNAPSHOT):
+        self.ruta = ruta
+        self.intervalo_revision = intervalo_revision
+        self._firma = None
+        self._proxima_revision = 0.0
+        self._mapa = None
+        self._mapear()
+
+    def _mapear(self):
+        estado = os.stat(self.ruta)
+        with open(self.ruta, 'rb') as f:
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, ancho, n, timestamp, generacion = CABECERA_SNAPSHOT.unpack_from(mapa, 0)
+        if magic != MAGIC_SNAPSHOT or version != 1:
+            mapa.close()
+            raise ValueError(f"{self.ruta} no es un snapshot binario de divisas válido.")
+        inicio_valores = CABECERA_SNAPSHOT.size + n * ancho
+        codigos = [
+            bytes(mapa[CABECERA_SNAPSHOT.size + i * ancho:CABECERA_SNAPSHOT.size + (i + 1) * ancho]).rstrip(b"\0").decode('ascii')
+            for i in range(n)
+        ]
+        # Vista float64 directa sobre el mmap (sin copia)
+        self.valores = memoryview(mapa)[inicio_valores:inicio_valores + n * 8].cast('d')
+        self.codigos = codigos
+        self.timestamp = timestamp
+        self.generacion = generacion
+        self._mapa = mapa
+        self._firma = (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+
+    def actualizar(self, forzar: bool = False) -> bool:
+        """Vuelve a mapear si se publicó un archivo nuevo. Retorna True si cambió la generación."""
+        ahora = time.monotonic()
+        if not forzar and ahora < self._proxima_revision:
+            return False
+        self._proxima_revision = ahora + self.intervalo_revision
+        try:
+            estado = os.stat(self.ruta)
+        except OSError:
+            return False
+        if (estado.st_ino, estado.st_mtime_ns, estado.st_size) == self._firma:
+            return False
+        generacion_anterior = self.generacion
+        self._mapear()
+        return self.generacion != generacion_anterior
+
+    def valor(self, codigo: str) -> float:
+        """Valor en USD de una divisa (búsqueda binaria sobre los códigos ordenados)."""
+        self.actualizar()
+        codigos = self.codigos
+        i = bisect.bisect_left(codigos, codigo)
+        if i == len(codigos) or codigos[i] != codigo:
+            raise ValueError(f"La divisa '{codigo}' no se encuentra en el origen de datos.")
+        return self.valores[i]
+
+    def valor_divisa(self, divisa_1: str, divisa_2: str) -> float:
+        """Valor de divisa_1 expresado en divisa_2."""
+        return self.valor(divisa_1) / self.valor(divisa_2)
+
+    def tabla(self) -> dict:
+        """{ "EUR": 1.08, ... } con los valores del snapshot vigente."""
+        self.actualizar()
+        return dict(zip(self.codigos, self.valores))
+
+
+class MatrizCruzada:
+    """
+    Índice de una tabla de valores en USD para conversiones masivas.
+    Se construye una sola vez por snapshot: los códigos quedan ordenados y los
+    valores en un arreglo float64, así cualquier cantidad de conversiones es una
+    sola operación vectorizada (valor origen / valor destino * monto).
+    """
+
+    def __init__(self, tabla: dict):
+        self.tabla = tabla
+        self.codigos = sorted(tabla)
+        self.indice = {codigo: i for i, codigo in enumerate(self.codigos)}
+        self._codigos_np = None
+        self._valores_np = None
+        self._matriz = None
+
+    def _arreglos(self):
+        if np is None:
+            raise ImportError("Las conversiones en float64 requieren numpy (pip install numpy); usa exacto=True.")
+        if self._valores_np is None:
+            self._codigos_np = np.array(self.codigos)
+            self._valores_np = np.array([float(self.tabla[c]) for c in self.codigos], dtype=np.float64)
+        return self._codigos_np, self._valores_np
+
+    def posiciones(self, codigos):
+        """Posición de cada código en la matriz (vectorizado con searchsorted)."""
+        codigos_np, _ = self._arreglos()
+        buscados = np.asarray(codigos)
+        if not len(codigos_np):
+            # Tabla vacía: ningún código existe (searchsorted daría posiciones fuera de rango)
+            if buscados.size:
+                no_encontradas = sorted({str(c) for c in np.atleast_1d(buscados)})
+                raise ValueError(f"Divisas no encontradas en el origen de datos: {no_encontradas}")
+            return np.zeros(buscados.shape, dtype=np.intp)
+        posiciones = np.searchsorted(codigos_np, buscados)
+        posiciones = np.minimum(posiciones, len(codigos_np) - 1)
+        faltantes = codigos_np[posiciones] != buscados
+        if faltantes.any():
+            no_encontradas = sorted({str(c) for c in np.atleast_1d(buscados)[np.atleast_1d(faltantes)]})
+            raise ValueError(f"Divisas no encontradas en el origen de datos: {no_encontradas}")
+        return posiciones
+
+    def matriz(self):
+        """Matriz N×N donde matriz[i, j] es el valor de codigos[i] expresado en codigos[j]."""
+        if self._matriz is None:
+            _, valores = self._arreglos()
+            self._matriz = valores[:, None] / valores[None, :]
+        return self._matriz
+
+    def convertir_lote(self, origenes, destinos, montos=None, exacto: bool = False):
+        """
+        Convierte montos[k] de origenes[k] a destinos[k] para todos los k a la vez.
+        Sin montos retorna las tasas. Con exacto=True calcula con Decimal (para
+        contabilidad) y retorna una lista; si no, retorna un arreglo float64.
+        """
+        if exacto:
+            if montos is None:
+                montos = [1] * len(origenes)
+            try:
+                return [
+                    Decimal(str(monto)) * self.tabla[origen] / self.tabla[destino]
+                    for origen, destino, monto in zip(origenes, destinos, montos)
+                ]
+            except KeyError as e:
+                raise ValueError(f"La divisa {e} no se encuentra en el origen de datos.")
+        _, valores = self._arreglos()
+        tasas = valores[self.posiciones(origenes)] / valores[self.posiciones(destinos)]
+        return tasas if montos is None else tasas * np.asarray(montos, dtype=np.float64)
+
+
+class ClienteDivisas:
+    """
+    Cliente con la tabla de valores en memoria.
+    Descarga el JSON como máximo una vez por TTL; al vencer revalida con un GET
+    condicional (ETag / Last-Modified), por lo que si no hubo cambios el servidor
+    responde 304 sin cuerpo. Si varios hilos piden datos vencidos a la vez, solo
+    uno descarga y el resto espera su resultado.
+    Con ruta_snapshot guarda la última tabla en disco para arrancar sin red o
+    seguir respondiendo si el servidor no está disponible.
+    Con url_delta (p. ej. URL_DELTA_GITHUB) los refrescos bajan solo las divisas que
+    cambiaron desde la última publicación conocida; la tabla completa se descarga
+    únicamente al arrancar o si el cliente quedó fuera de la ventana de deltas.
+    En ese caso la tabla base es el mapa (por defecto URL_MAPA_GITHUB), que trae su
+    propia secuencia: con una url sin "secuencia" los deltas no se usan.
+    """
+
+    def __init__(self, url: str = None, ttl: float = TTL_DATOS,
+                 ruta_snapshot: str = None, timeout: float = 10, url_delta: str = None):
+        self.url = url or (URL_MAPA_GITHUB if url_delta else URL_DATOS_GITHUB)
+        self.url_delta = url_delta
+        self.ttl = ttl
+        self.ruta_snapshot = ruta_snapshot
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._lock = threading.Lock()
+        self._tabla = None
+        self._etag = None
+        self._last_modified = None
+        self._vence = 0.0
+        self._matriz = None
+        self._secuencia = None
+        self._etag_delta = None
+        if ruta_snapshot:
+            self._cargar_snapshot()
+
+    def _cargar_snapshot(self):
+        try:
+            with open(self.ruta_snapshot, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            self._tabla = _parsear_tabla(snapshot["datos"])
+            self._etag = snapshot.get("etag")
+            self._last_modified = snapshot.get("last_modified")
+            self._secuencia = snapshot.get("secuencia")
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _guardar_snapshot(self, data):
+        temporal = f"{self.ruta_snapshot}.tmp"
+        try:
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump({"datos": data, "etag": self._etag, "last_modified": self._last_modified,
+                           "secuencia": self._secuencia}, f)
+            os.replace(temporal, self.ruta_snapshot)
+        except OSError:
+            pass
+
+    def _vigente(self) -> bool:
+        return self._tabla is not None and time.monotonic() < self._vence
+
+    def _leer_delta(self):
+        """datos_delta.json, o None si no cambió desde la última lectura (304)."""
+        headers = {"If-None-Match": self._etag_delta} if self._etag_delta else {}
+        response = self._session.get(self.url_delta, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        self._etag_delta = response.headers.get("ETag")
+        return response.json()
+
+    def _refrescar_por_delta(self) -> bool:
+        """Pone la tabla al día con los deltas. Retorna False si hace falta la descarga completa."""
+        if not self.url_delta or self._tabla is None or self._secuencia is None:
+            return False
+        documento = self._leer_delta()
+        if documento is None:
+            return True
+        tabla = aplicar_deltas(self._tabla, self._secuencia, documento)
+        if tabla is None:
+            return False
+        if tabla is not self._tabla:
+            self._tabla = tabla
+            self._secuencia = documento["secuencia"]
+            if self.ruta_snapshot:
+                self._guardar_snapshot({codigo: str(valor) for codigo, valor in tabla.items()})
+        return True
+
+    def refrescar(self, forzar: bool = False):
+        """
+        Actualiza la tabla si venció el TTL (o siempre con forzar=True).
+        Si la descarga falla y hay una tabla previa (en memoria o en disco) se sigue usando esa.
+        """
+        with self._lock:
+            # Otro hilo pudo refrescar mientras se esperaba el lock
+            if not forzar and self._vigente():
+                return
+
+            headers = {}
+            if self._tabla is not None:
+                if self._etag:
+                    headers["If-None-Match"] = self._etag
+                if self._last_modified:
+                    headers["If-Modified-Since"] = self._last_modified
+            try:
+                if self._refrescar_por_delta():
+                    self._vence = time.monotonic() + self.ttl
+                    return
+                response = self._session.get(self.url, headers=headers, timeout=self.timeout)
+                if response.status_code != 304:
+                    response.raise_for_status()
+                    data = response.json()
+                    self._tabla = _parsear_tabla(data)
+                    self._etag = response.headers.get("ETag")
+                    self._last_modified = response.headers.get("Last-Modified")
+                    # Secuencia publicada dentro de la misma tabla (solo el mapa la trae)
+                    self._secuencia = data.get("secuencia") if isinstance(data, dict) else None
+                    self._etag_delta = None
+                if response.status_code != 304 and self.ruta_snapshot:
+                    self._guardar_snapshot(data)
+                self._vence = time.monotonic() + self.ttl
+            except Exception:
+                if self._tabla is None:
+                    raise
+                # Sin red: se conserva la tabla previa y se reintenta más tarde
+                self._vence = time.monotonic() + min(self.ttl, REINTENTO_SIN_RED)
+
+    def tabla(self) -> dict:
+        """Tabla vigente { "EUR": Decimal("1.08"), ... } con los valores en USD."""
+        if not self._vigente():
+            self.refrescar()
+        return self._tabla
+
+    def matriz_cruzada(self) -> MatrizCruzada:
+        """MatrizCruzada de la tabla vigente (se reconstruye solo cuando cambia el snapshot)."""
+        tabla = self.tabla()
+        matriz = self._matriz
+        if matriz is None or matriz.tabla is not tabla:
+            matriz = self._matriz = MatrizCruzada(tabla)
+        return matriz
+
+    def convertir_lote(self, pares, montos=None, exacto: bool = False):
+        """
+        Convierte muchos montos de una vez. pares es una secuencia de (origen, destino);
+        ver MatrizCruzada.convertir_lote para el resultado.
+        """
+        origenes, destinos = zip(*pares) if len(pares) else ((), ())
+        return self.matriz_cruzada().convertir_lote(list(origenes), list(destinos), montos, exacto)
+
+    def divisas_disponibles(self) -> list:
+        """Códigos de divisas disponibles ordenados."""
+        return sorted(self.tabla())
+
+    def valor_divisa(self, divisa_1: str, divisa_2: str) -> Decimal:
+        """
+        Valor de divisa_1 expresado en divisa_2: (divisa_1 en USD) / (divisa_2 en USD).
+        Lanza ValueError si alguna divisa no existe en el origen de datos.
+        """
+        return _valor_relativo(self.tabla(), divisa_1, divisa_2)
+
+
+class ClienteDivisasAsync:
+    """
+    Variante asyncio de ClienteDivisas para servicios aiohttp/FastAPI.
+    Comparte la misma tabla en memoria y la descarga (bloqueante) corre en un hilo,
+    así no detiene el event loop. Las corrutinas que encuentran la tabla vencida se
+    unen a un único refresco en curso: mil llamadas concurrentes hacen como mucho
+    una descarga.
+    """
+
+    def __init__(self, url: str = URL_DATOS_GITHUB, ttl: float = TTL_DATOS,
+                 ruta_snapshot: str = None, timeout: float = 10):
+        self.cliente = ClienteDivisas(url, ttl, ruta_snapshot, timeout)
+        self._refresco = None
+
+    async def tabla(self) -> dict:
+        """Tabla vigente { "EUR": Decimal("1.08"), ... } con los valores en USD."""
+        if not self.cliente._vigente():
+            if self._refresco is None or self._refresco.done():
+                self._refresco = asyncio.ensure_future(asyncio.to_thread(self.cliente.refrescar))
+            # shield: si una corrutina se cancela, el refresco compartido sigue para las demás
+            await asyncio.shield(self._refresco)
+        return self.cliente._tabla
+
+    async def disponibles(self) -> list:
+        """Códigos de divisas disponibles ordenados."""
+        return sorted(await self.tabla())
+
+    async def convertir(self, divisa_1: str, divisa_2: str, monto=1) -> Decimal:
+        """
+        Convierte monto de divisa_1 a divisa_2 (ValueError si alguna divisa no existe).
+        Calcula sobre la tabla ya obtenida, sin volver a consultar el cliente síncrono
+        (que podría refrescar bloqueando el event loop); los códigos se usan tal cual,
+        igual que en ClienteDivisas.valor_divisa.
+        """
+        return Decimal(str(monto)) * _valor_relativo(await self.tabla(), divisa_1, divisa_2)
+
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def obtener_cliente() -> ClienteDivisas:
+    """Cliente compartido por las funciones Solicitar_* del módulo."""
+    global _cliente
+    with _cliente_lock:
+        if _cliente is None:
+            _cliente = ClienteDivisas()
+        return _cliente
+
 
 def Solicitar_Divisas_Disponibles() -> dict:
     """
@@ -12,13 +436,7 @@ def Solicitar_Divisas_Disponibles() -> dict:
     Retorna un diccionario con la respuesta formateada.
     """
     try:
-        response = requests.get(URL_DATOS_GITHUB)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Extraer códigos, removiendo el sufijo '-USD' (Ej: 'EUR-USD' -> 'EUR')
-        codigos = [d["codigo"].replace("-USD", "") for d in data]
-        codigos = sorted(list(set(codigos)))
+        codigos = obtener_cliente().divisas_disponibles()
         
         return {
             "status": "success",
@@ -41,16 +459,8 @@ def Solicitar_Valor_Divisa(divisa_1: str, divisa_2: str) -> dict:
     divisa_2 = divisa_2.upper()
 
     try:
-        # Descarga los precios de github
-        response = requests.get(URL_DATOS_GITHUB)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Mapeamos los datos { "EUR": Decimal("1.08"), ... }
-        valores_en_usd = { 
-            d["codigo"].replace("-USD", ""): Decimal(str(d["valor_actual"])) 
-            for d in data 
-        }
+        # Usa la tabla en memoria del cliente (solo descarga de github si venció)
+        valores_en_usd = obtener_cliente().tabla()
         
         if divisa_1 not in valores_en_usd:
             return {"status": "error", "mensaje": f"La divisa base '{divisa_1}' no se encuentra en el origen de datos."}
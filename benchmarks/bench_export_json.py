@@ -0,0 +1,66 @@
+"""
+Benchmark de los formatos de exportación de DatabaseManager.export_to_json.
+
+Carga los registros actuales de Almacenamiento/divisas.db en una base temporal,
+exporta cada formato y reporta bytes en disco, bytes comprimidos (.gz / .br)
+y tiempo de exportación y de json.loads del lado del cliente.
+Uso: python benchmarks/bench_export_json.py [repeticiones]
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(RAIZ)
+from modulos.Actualizacion_bd import DatabaseManager
+
+FORMATOS = [
+    ("lista indentada", {"formato": "lista"}),
+    ("lista compacta", {"formato": "lista", "compacto": True}),
+    ("mapa compacto", {"formato": "mapa", "compacto": True}),
+]
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    directorio = tempfile.mkdtemp()
+    db = DatabaseManager(os.path.join(directorio, "bench.db"))
+    with sqlite3.connect(os.path.join(RAIZ, "Almacenamiento", "divisas.db")) as origen:
+        filas = origen.execute(
+            'SELECT codigo, valor_actual, valor_comparacion, total_calculado, fecha_actualizacion FROM divisas'
+        ).fetchall()
+    with sqlite3.connect(db.db_path) as destino:
+        destino.executemany(
+            'INSERT INTO divisas (codigo, valor_actual, valor_comparacion, total_calculado, fecha_actualizacion) '
+            'VALUES (?, ?, ?, ?, ?)', filas
+        )
+
+    print(f"Registros: {len(filas)}")
+    print(f"{'Formato':<17} {'Bytes':>7} {'.gz':>6} {'.br':>6} {'Export (ms)':>12} {'Parse (µs)':>11}")
+    for nombre, opciones in FORMATOS:
+        ruta = os.path.join(directorio, nombre.replace(" ", "_") + ".json")
+        inicio = time.perf_counter()
+        for _ in range(max(1, repeticiones // 10)):
+            db.export_to_json(ruta, comprimir=True, **opciones)
+        t_export = (time.perf_counter() - inicio) * 1000 / max(1, repeticiones // 10)
+
+        with open(ruta, 'rb') as f:
+            contenido = f.read()
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            json.loads(contenido)
+        t_parse = (time.perf_counter() - inicio) * 1e6 / repeticiones
+
+        tam_gz = os.path.getsize(ruta + ".gz")
+        tam_br = os.path.getsize(ruta + ".br") if os.path.exists(ruta + ".br") else None
+        print(
+            f"{nombre:<17} {len(contenido):>7} {tam_gz:>6} {tam_br if tam_br is not None else '-':>6} "
+            f"{t_export:>12.2f} {t_parse:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
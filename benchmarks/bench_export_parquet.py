@@ -0,0 +1,117 @@
+"""
+Benchmark de DatabaseManager.export_parquet frente a releer snapshots JSON.
+
+Genera en un directorio temporal un historial sintético (N divisas, una corrida por
+hora durante D días), lo exporta completo a Parquet, agrega una corrida más (lo que
+hace cada ejecución de main.py) y mide la lectura para análisis:
+  - la serie completa de una divisa (filtro por código, solo dos columnas);
+  - todas las divisas de un mes (filtro por partición);
+frente a parsear un datos.json por corrida para obtener la misma serie.
+Verifica que lo leído coincide exactamente con el historial de la base.
+Requiere pyarrow. Uso: python benchmarks/bench_export_parquet.py [dias] [divisas]
+"""
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(RAIZ)
+from modulos.Actualizacion_bd import DatabaseManager, decimal_a_compacto, compacto_a_decimal, pq
+
+
+def medir(nombre: str, funcion, repeticiones: int = 5):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    print(f"  {nombre:<52} {(time.perf_counter() - inicio) / repeticiones * 1000:>9.1f} ms")
+    return resultado
+
+
+def main():
+    if pq is None:
+        sys.exit("pyarrow no está instalado.")
+    dias = int(sys.argv[1]) if len(sys.argv) > 1 else 90
+    cantidad = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+
+    rng = random.Random(11)
+    codigos = [f"D{i:02d}-USD" for i in range(cantidad - 1)] + ["EUR-USD"]
+    # (mantisa, escala) por divisa; cada corrida varía la mantisa ±0,5 % sin superar ESCALA_PARQUET decimales
+    base = {codigo: (rng.randint(10 ** 3, 10 ** 7), rng.randint(2, 10)) for codigo in codigos}
+
+    def valor(codigo: str) -> Decimal:
+        mantisa, escala = base[codigo]
+        return Decimal(mantisa * (10 ** 5 + rng.randint(-500, 500))).scaleb(-escala - 5)
+
+    fin = int(time.time()) // 3600 * 3600
+    timestamps = list(range(fin - dias * 86400, fin, 3600))
+
+    directorio = tempfile.mkdtemp(prefix="bench_parquet_")
+    try:
+        db = DatabaseManager(os.path.join(directorio, "divisas.db"))
+        with sqlite3.connect(db.historial_path) as conn:
+            for run_id, timestamp in enumerate(timestamps, start=1):
+                conn.execute('INSERT INTO corridas (run_id, timestamp) VALUES (?, ?)', (run_id, timestamp))
+                conn.executemany(
+                    'INSERT INTO historial (codigo, timestamp, run_id, mantisa, exponente) VALUES (?, ?, ?, ?, ?)',
+                    [(codigo, timestamp, run_id, *decimal_a_compacto(valor(codigo))) for codigo in codigos]
+                )
+        filas = len(timestamps) * len(codigos)
+        print(f"Historial sintético: {len(codigos)} divisas x {len(timestamps)} corridas = {filas:,} filas")
+
+        destino = os.path.join(directorio, "historial_parquet")
+        medir("export_parquet inicial (todo el historial)", lambda: db.export_parquet(destino), 1)
+        db.registrar_historial([{"codigo": c, "valor_actual": valor(c)} for c in codigos], fin)
+        medir("export_parquet incremental (una corrida)", lambda: db.export_parquet(destino), 1)
+        tamano = sum(os.path.getsize(os.path.join(r, f)) for r, _, archivos in os.walk(destino) for f in archivos)
+        print(f"  {tamano / 1024:,.0f} KiB en disco ({tamano / (filas + len(codigos)):.1f} bytes/fila)")
+
+        # Un datos.json (formato lista compacto) por corrida, como los que se publican
+        snapshots = []
+        with sqlite3.connect(db.historial_path) as conn:
+            for timestamp in timestamps:
+                registros = [
+                    {"codigo": codigo, "valor_actual": str(compacto_a_decimal(m, e)), "valor_comparacion": "USD"}
+                    for codigo, m, e in conn.execute(
+                        'SELECT codigo, mantisa, exponente FROM historial WHERE timestamp = ?', (timestamp,))
+                ]
+                snapshots.append(json.dumps(registros, separators=(',', ':')))
+            esperado = [(ts, compacto_a_decimal(m, e)) for ts, m, e in conn.execute(
+                'SELECT timestamp, mantisa, exponente FROM historial WHERE codigo = ? ORDER BY timestamp', ("EUR-USD",))]
+        print(f"\nLectura de la serie de EUR-USD ({len(esperado)} valores)")
+
+        def serie_json():
+            serie = []
+            for texto in snapshots:
+                for registro in json.loads(texto):
+                    if registro["codigo"] == "EUR-USD":
+                        serie.append(Decimal(registro["valor_actual"]))
+            return serie
+
+        medir(f"json.loads de {len(snapshots)} snapshots", serie_json, 1)
+        tabla = medir("read_table(columns, filters=codigo)", lambda: pq.read_table(
+            destino, columns=["timestamp", "valor"], filters=[("codigo", "=", "EUR-USD")]))
+        obtenido = sorted(zip(
+            (ts // 1000 for ts in tabla.column("timestamp").cast("int64").to_pylist()),
+            tabla.column("valor").to_pylist()
+        ))
+        primer_mes = time.strftime("%Y-%m-%d", time.gmtime(timestamps[0] + 30 * 86400))
+        mes = medir("read_table(filters=fecha < mes 1), todas las divisas", lambda: pq.read_table(
+            destino, filters=[("fecha", "<", primer_mes)]))
+        print(f"    {mes.num_rows:,} filas")
+
+        if obtenido != esperado:
+            print("FALLO: la serie leída de Parquet no coincide con el historial.")
+            sys.exit(1)
+        print("\nLa serie leída de Parquet coincide exactamente con el historial.")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark de la extracción del precio en ContentComparer.
+
+Compara el escáner dirigido (extraer_precio_rapido) contra el árbol completo
+de BeautifulSoup usando las páginas guardadas en Almacenamiento/.
+Uso: python benchmarks/bench_extraccion_precio.py [repeticiones]
+"""
+import os
+import sys
+import time
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(RAIZ)
+from modulos.Comparacion_front import ContentComparer, extraer_precio_rapido
+
+PAGINAS = [
+    os.path.join(RAIZ, "Almacenamiento", "plantilla2.html"),
+    os.path.join(RAIZ, "Almacenamiento", "plantilla.html"),
+    os.path.join(RAIZ, "plantilla3.html"),
+]
+
+
+def medir(funcion, html: str, repeticiones: int) -> float:
+    """Retorna el tiempo medio (ms) de una llamada."""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion(html)
+    return (time.perf_counter() - inicio) * 1000 / repeticiones
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    comparer = ContentComparer()
+
+    print(f"{'Página':<18} {'KB':>7} {'Árbol (ms)':>11} {'Escáner (ms)':>13} {'Snapshot (ms)':>14} {'Aceleración':>12}")
+    for ruta in PAGINAS:
+        if not os.path.exists(ruta):
+            print(f"{os.path.basename(ruta)}: no encontrada, se omite.")
+            continue
+        with open(ruta, 'r', encoding='utf-8') as f:
+            html = f.read()
+
+        esperado = comparer._extraer_precio_arbol(html)
+        obtenido = extraer_precio_rapido(html)
+        if obtenido is not None and obtenido != esperado:
+            print(f"{os.path.basename(ruta)}: DIFERENCIA árbol={esperado!r} escáner={obtenido!r}")
+
+        t_arbol = medir(comparer._extraer_precio_arbol, html, repeticiones)
+        t_escaner = medir(extraer_precio_rapido, html, repeticiones)
+        t_snapshot = medir(lambda h: comparer.snapshot_scraping_individual(h, codigo="BENCH"), html, repeticiones)
+        print(
+            f"{os.path.basename(ruta):<18} {len(html) / 1024:>7.0f} {t_arbol:>11.2f} {t_escaner:>13.3f} "
+            f"{t_snapshot:>14.2f} {t_arbol / t_snapshot:>11.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Simulación del limitador adaptativo contra un servidor local que aplica throttling.
+
+El servidor responde con el HTML de Almacenamiento/plantilla2.html mientras no se
+supere LIMITE_POR_SEGUNDO peticiones por segundo; por encima responde 429 (con
+Retry-After) o una página de bloqueo. Reporta el tiempo total, los bloqueos
+recibidos y las URLs con precio, junto al tiempo estimado del esquema anterior
+(lotes de 3 con pausas de 5 a 20 s).
+Uso: python benchmarks/bench_limitador.py [num_urls] [limite_por_segundo]
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(RAIZ)
+from modulos import Extraccion_front, Limitador_tasa
+
+with open(os.path.join(RAIZ, "Almacenamiento", "plantilla2.html"), 'rb') as f:
+    PAGINA_PRECIO = f.read()
+PAGINA_BLOQUEO = b"<html><body>Our systems have detected unusual traffic from your computer network.</body></html>"
+
+
+def crear_servidor(limite_por_segundo: int) -> ThreadingHTTPServer:
+    marcas = deque()
+    lock = threading.Lock()
+    contadores = {"ok": 0, "429": 0, "bloqueo": 0}
+
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            ahora = time.monotonic()
+            with lock:
+                while marcas and ahora - marcas[0] > 1:
+                    marcas.popleft()
+                marcas.append(ahora)
+                excedido = len(marcas) > limite_por_segundo
+                tipo = ("429" if contadores["429"] <= contadores["bloqueo"] else "bloqueo") if excedido else "ok"
+                contadores[tipo] += 1
+
+            if tipo == "429":
+                self.send_response(429)
+                self.send_header("Retry-After", "2")
+                cuerpo = b""
+            else:
+                self.send_response(200)
+                cuerpo = PAGINA_PRECIO if tipo == "ok" else PAGINA_BLOQUEO
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+    servidor.contadores = contadores
+    return servidor
+
+
+async def correr(urls: list) -> tuple:
+    limitador = Limitador_tasa.LimitadorAdaptativo()
+    con_precio = 0
+    async for _, html in Extraccion_front.stream_html_multiple_urls(urls, limitador):
+        con_precio += Extraccion_front.SELECTOR_PRECIO in html
+    return con_precio, limitador
+
+
+def main():
+    num_urls = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    limite = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    # Pausas cortas para que la simulación no dure minutos
+    Limitador_tasa.PAUSA_BLOQUEO = 2.0
+    Extraccion_front.BACKOFF_BASE = 0.5
+
+    servidor = crear_servidor(limite)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{servidor.server_port}/finance/quote/C{i:03d}-USD" for i in range(num_urls)]
+
+    inicio = time.perf_counter()
+    con_precio, limitador = asyncio.run(correr(urls))
+    duracion = time.perf_counter() - inicio
+    servidor.shutdown()
+    Extraccion_front.close_session()
+
+    estimado_anterior = (-(-num_urls // 3) - 1) * 12.5
+    print(f"URLs: {num_urls} | Límite del servidor: {limite} req/s")
+    print(f"Tiempo adaptativo: {duracion:.1f}s (esquema anterior estimado: {estimado_anterior:.0f}s)")
+    print(f"Con precio: {con_precio}/{num_urls}")
+    print(f"Respuestas del servidor: {servidor.contadores}")
+    print(f"Tasa final: {limitador.tasa:.2f} req/s, concurrencia final: {int(limitador.concurrencia)}")
+
+
+if __name__ == "__main__":
+    main()
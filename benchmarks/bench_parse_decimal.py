@@ -0,0 +1,156 @@
+"""
+Benchmark y comprobación de propiedades de ContentComparer._parse_decimal.
+
+Compara la implementación anterior (regex + replace en cada llamada, copiada abajo)
+con normalizar_numero sobre los precios reales de Almacenamiento/divisas.db con el
+formato de hl=es, con y sin la memoización (lru_cache) de cadenas repetidas.
+Antes de medir verifica con entradas aleatorias (semilla fija) que:
+  - cualquier Decimal formateado en es/en, con separadores de miles, NBSP,
+    símbolos de moneda o notación científica vuelve a su valor exacto;
+  - en toda entrada que la versión anterior interpretaba sin ambigüedad el
+    resultado es el mismo.
+Sale con código 1 si alguna propiedad falla.
+Uso: python benchmarks/bench_parse_decimal.py [repeticiones] [casos_aleatorios]
+"""
+import logging
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(RAIZ)
+from modulos.Comparacion_front import ContentComparer, normalizar_numero
+
+SIMBOLOS = ["", "$", "US$ ", "€", " EUR", "¥", "£ ", " $"]
+
+
+def parse_decimal_anterior(numero_str: str) -> Decimal:
+    """Implementación previa de ContentComparer._parse_decimal (sin logging)."""
+    cleaned_str = re.sub(r'[^\d.,]', '', numero_str)
+    if not cleaned_str:
+        return Decimal('0')
+    if ',' in cleaned_str and '.' not in cleaned_str:
+        cleaned_str = cleaned_str.replace(',', '.')
+    elif ',' in cleaned_str and '.' in cleaned_str:
+        if cleaned_str.rfind(',') < cleaned_str.rfind('.'):
+            cleaned_str = cleaned_str.replace(',', '')
+        else:
+            cleaned_str = cleaned_str.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(cleaned_str)
+    except InvalidOperation:
+        return Decimal('0')
+
+
+def formatear(valor: Decimal, idioma: str, agrupar: bool, separador_miles: str = None) -> str:
+    """Escribe valor (positivo) con las convenciones de idioma."""
+    entero, _, fraccion = format(valor, 'f').partition('.')
+    if agrupar:
+        miles = separador_miles or ('.' if idioma == "es" else ',')
+        grupos = []
+        while len(entero) > 3:
+            grupos.insert(0, entero[-3:])
+            entero = entero[:-3]
+        entero = miles.join([entero] + grupos)
+    decimal = ',' if idioma == "es" else '.'
+    return entero + (decimal + fraccion if fraccion else "")
+
+
+def decimal_aleatorio(rng: random.Random) -> Decimal:
+    digitos = rng.randint(1, 12)
+    escala = rng.randint(0, 10)
+    return Decimal(rng.randint(1, 10 ** digitos - 1)).scaleb(-escala)
+
+
+def comprobar_propiedades(casos: int) -> int:
+    rng = random.Random(20240601)
+    fallos = []
+
+    for _ in range(casos):
+        valor = decimal_aleatorio(rng)
+        idioma = rng.choice(["es", "en"])
+        separador = rng.choice([None, " ", " ", " "])
+        # Con un único separador seguido de tres dígitos la cadena es ambigua: la resuelve el idioma
+        texto = formatear(valor, idioma, agrupar=rng.random() < 0.7, separador_miles=separador)
+        texto = rng.choice(SIMBOLOS[:4]) + texto + rng.choice(["", " ", SIMBOLOS[4]])
+        obtenido = normalizar_numero(texto, idioma)
+        if obtenido != valor:
+            fallos.append(("ida y vuelta", texto, idioma, valor, obtenido))
+
+        # Notación científica con mantisa en el formato del idioma
+        mantisa = Decimal(rng.randint(1, 999)).scaleb(-2)
+        exponente = rng.randint(-12, 6)
+        texto = formatear(mantisa, idioma, agrupar=False) + rng.choice("eE") + str(exponente)
+        if normalizar_numero(texto, idioma) != mantisa.scaleb(exponente):
+            fallos.append(("científica", texto, idioma, mantisa.scaleb(exponente), normalizar_numero(texto, idioma)))
+
+    # Equivalencia con la versión anterior donde no había ambigüedad
+    alfabeto = "0123456789" * 3 + ".,  $€ "
+    for _ in range(casos):
+        texto = "".join(rng.choice(alfabeto) for _ in range(rng.randint(0, 14)))
+        limpio = re.sub(r'[^\d.,]', '', texto)
+        comas, puntos = limpio.count(','), limpio.count('.')
+        if (comas > 1 or puntos > 1) and not (comas and puntos):
+            continue  # la versión anterior los leía como 0 (p. ej. "1.234.567")
+        anterior = parse_decimal_anterior(texto)
+        nuevo = normalizar_numero(texto, None)
+        if (nuevo if nuevo is not None else Decimal('0')) != anterior:
+            fallos.append(("equivalencia", texto, None, anterior, nuevo))
+        # En "es" solo cambia el caso ambiguo de un único punto seguido de tres dígitos ("1.234")
+        if not (puntos == 1 and not comas and len(limpio.rpartition('.')[2]) == 3):
+            nuevo = ContentComparer()._parse_decimal(texto)
+            if nuevo != anterior:
+                fallos.append(("equivalencia", texto, "es", anterior, nuevo))
+
+    for tipo, texto, idioma, esperado, obtenido in fallos[:10]:
+        print(f"  FALLO {tipo}: {texto!r} ({idioma}) -> {obtenido}, esperado {esperado}")
+    print(f"Propiedades: {casos * 3} casos, {len(fallos)} fallos")
+    return len(fallos)
+
+
+def medir(nombre: str, funcion, precios: list, repeticiones: int, referencia: float = None) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for precio in precios:
+            funcion(precio)
+    por_precio = (time.perf_counter() - inicio) / (repeticiones * len(precios))
+    mejora = f"  x{referencia / por_precio:.1f}" if referencia else ""
+    print(f"  {nombre:<44} {por_precio * 1e9:>8.0f} ns/precio{mejora}")
+    return por_precio
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    casos = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    # Las entradas aleatorias inválidas registran errores esperables
+    logging.getLogger("modulos.Comparacion_front").setLevel(logging.CRITICAL)
+    if comprobar_propiedades(casos):
+        sys.exit(1)
+
+    with sqlite3.connect(os.path.join(RAIZ, "Almacenamiento", "divisas.db")) as conn:
+        valores = [Decimal(v) for (v,) in conn.execute('SELECT valor_actual FROM divisas')]
+    # Como los muestra Google Finance con hl=es
+    precios = [formatear(v, "es", agrupar=True) for v in valores]
+    rng = random.Random(7)
+    unicos = [formatear(decimal_aleatorio(rng), "es", agrupar=True) for _ in range(len(precios) * repeticiones)]
+
+    comparer = ContentComparer()
+    print(f"\n{len(precios)} precios reales x {repeticiones} repeticiones")
+    base = medir("anterior (regex + replace)", parse_decimal_anterior, precios, repeticiones)
+    medir("_parse_decimal (memoizado, cadenas repetidas)", comparer._parse_decimal, precios, repeticiones, base)
+    medir("normalizar_numero sin caché", normalizar_numero.__wrapped__, precios, repeticiones, base)
+
+    print(f"\n{len(unicos)} precios distintos (sin aciertos de caché)")
+    base = medir("anterior (regex + replace)", parse_decimal_anterior, unicos, 1)
+    normalizar_numero.cache_clear()
+    medir("_parse_decimal", comparer._parse_decimal, unicos, 1, base)
+    print(f"  caché: {normalizar_numero.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Benchmark de extremo a extremo sin tocar Google Finance.
+
+Levanta un servidor HTTP local que responde cada /finance/quote/{COD}-USD con una
+página del corpus: benchmarks/corpus/{COD}-USD.html si existe (se graba con --grabar)
+o, si no, Almacenamiento/plantilla2.html con el precio reemplazado por el valor de la
+divisa en Almacenamiento/divisas.db. La sesión compartida de Extraccion_front se
+redirige a ese servidor y main() corre completo (descarga, parseo, escritura en la BD
+y exportados) dos veces en un directorio temporal: en frío y con la caché de descargas
+ya poblada, solo con el proveedor google_finance. Después mide por separado _parse_decimal, snapshot_scraping_individual,
+upsert_divisa y export_to_json.
+Reporta throughput, tiempo por operación y memoria (pico de tracemalloc por
+micro-benchmark y RSS máximo del proceso).
+
+Uso: python benchmarks/bench_pipeline.py [--divisas N] [--serial] [--realista] [--grabar]
+  --serial    parsea en el proceso principal (MODO_PARSEO=serial)
+  --realista  conserva el ritmo por defecto del limitador (mide también las esperas)
+  --grabar    descarga las páginas reales de Google Finance a benchmarks/corpus/ y sale
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from decimal import Decimal
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DIR_CORPUS = os.path.join(RAIZ, "benchmarks", "corpus")
+sys.path.append(RAIZ)
+
+PLANTILLA_PRECIO = os.path.join(RAIZ, "Almacenamiento", "plantilla2.html")
+PLANTILLA_SIN_PRECIO = os.path.join(RAIZ, "Almacenamiento", "plantilla.html")
+MARCA_PRECIO = b'<div class="YMlKec fxKbKc">0,6278</div>'
+
+
+def valores_origen() -> dict:
+    """{ "EUR": Decimal("1.08"), ... } desde la base del repositorio (sin USD)."""
+    with sqlite3.connect(os.path.join(RAIZ, "Almacenamiento", "divisas.db")) as conn:
+        filas = conn.execute('SELECT codigo, valor_actual FROM divisas').fetchall()
+    return {codigo.replace("-USD", ""): Decimal(valor) for codigo, valor in filas if codigo != "USD-USD"}
+
+
+def precio_es(valor: Decimal) -> bytes:
+    """Precio como lo muestra Google Finance con hl=es (coma decimal)."""
+    return format(valor, 'f').replace('.', ',').encode('ascii')
+
+
+class Corpus:
+    """Páginas por código: grabadas en DIR_CORPUS o sintetizadas desde plantilla2.html."""
+
+    def __init__(self, valores: dict):
+        self.valores = valores
+        with open(PLANTILLA_PRECIO, 'rb') as f:
+            plantilla = f.read()
+        inicio = plantilla.index(MARCA_PRECIO)
+        self._prefijo = plantilla[:inicio] + b'<div class="YMlKec fxKbKc">'
+        self._sufijo = b'</div>' + plantilla[inicio + len(MARCA_PRECIO):]
+        self.grabadas = set()
+        if os.path.isdir(DIR_CORPUS):
+            self.grabadas = {n[:-len("-USD.html")] for n in os.listdir(DIR_CORPUS) if n.endswith("-USD.html")}
+
+    def partes(self, codigo: str):
+        if codigo in self.grabadas:
+            with open(os.path.join(DIR_CORPUS, f"{codigo}-USD.html"), 'rb') as f:
+                return [f.read()]
+        if codigo in self.valores:
+            return [self._prefijo, precio_es(self.valores[codigo]), self._sufijo]
+        return None
+
+
+def crear_servidor(corpus: Corpus) -> ThreadingHTTPServer:
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            # /finance/quote/EUR-USD
+            codigo = urlsplit(self.path).path.rsplit("/", 1)[-1].split("-")[0]
+            partes = corpus.partes(codigo)
+            if partes is None:
+                self.send_response(404)
+                partes = [b""]
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(sum(len(p) for p in partes)))
+            self.end_headers()
+            for parte in partes:
+                self.wfile.write(parte)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+
+
+def redirigir_sesion(base: str):
+    """Monta en la sesión compartida un adaptador que envía las URLs de Google al servidor local."""
+    from requests.adapters import HTTPAdapter
+    from modulos import Extraccion_front
+
+    class AdaptadorCorpus(HTTPAdapter):
+        def send(self, request, **kwargs):
+            partes = urlsplit(request.url)
+            request.url = base + partes.path + ("?" + partes.query if partes.query else "")
+            return super().send(request, **kwargs)
+
+    Extraccion_front.get_session().mount("https://www.google.com/", AdaptadorCorpus(
+        pool_connections=Extraccion_front.POOL_CONEXIONES, pool_maxsize=Extraccion_front.POOL_MAXSIZE))
+
+
+def rss_max_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def correr_main(main_mod, etiqueta: str, valores: dict):
+    inicio = time.perf_counter()
+    asyncio.run(main_mod.main())
+    duracion = time.perf_counter() - inicio
+
+    with open("datos_mapa.json", encoding="utf-8") as f:
+        publicado = json.load(f)
+    publicado.pop("secuencia", None)
+    errores = sum(1 for codigo, valor in valores.items() if Decimal(publicado.get(codigo, "-1")) != valor)
+    with open(main_mod.RUTA_REPORTE, encoding="utf-8") as f:
+        reporte = json.load(f)
+
+    print(f"\n== main() {etiqueta}: {duracion:.2f}s, {len(valores) / duracion:.1f} divisas/s, "
+          f"{len(publicado)} publicadas, {errores} valores distintos al origen")
+    for nombre, datos in reporte["histogramas"].items():
+        print(f"   {nombre:<42} n={datos['conteo']:<5} total={datos['total_s']:>8.3f}s  p95<={datos['p95_s']}")
+    for nombre, valor in reporte["contadores"].items():
+        print(f"   {nombre:<42} {valor:,.3f}" if isinstance(valor, float) else f"   {nombre:<42} {valor:,}")
+
+
+def medir(nombre: str, funcion, repeticiones: int, unidad_bytes: int = 0):
+    """Tiempo por operación y throughput; después el pico de memoria de una tanda corta."""
+    funcion()  # calentamiento
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    por_op = (time.perf_counter() - inicio) / repeticiones
+
+    tracemalloc.start()
+    for _ in range(max(1, repeticiones // 10)):
+        funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    extra = f"  {unidad_bytes / por_op / 1e6:>8.1f} MB/s" if unidad_bytes else ""
+    print(f"   {nombre:<44} {por_op * 1e6:>10.1f} µs/op {1 / por_op:>10.0f} op/s  pico {pico / 1024:>8.1f} KiB{extra}")
+
+
+def micro_benchmarks(directorio: str, valores: dict, repeticiones: int):
+    from modulos.Actualizacion_bd import DatabaseManager
+    from modulos.Comparacion_front import ContentComparer
+
+    print("\n== Micro-benchmarks")
+    comparer = ContentComparer()
+    precios = [precio_es(v).decode() for v in valores.values()]
+    precios += ["1.234,56", "12.345.678,9", "0,000123", "1,08"]
+
+    def parsear_todos():
+        for precio in precios:
+            comparer._parse_decimal(precio)
+    medir(f"_parse_decimal ({len(precios)} precios)", parsear_todos, repeticiones)
+
+    with open(PLANTILLA_PRECIO, encoding="utf-8") as f:
+        con_precio = f.read()
+    with open(PLANTILLA_SIN_PRECIO, encoding="utf-8") as f:
+        sin_precio = f.read()
+    medir("snapshot_scraping_individual (con precio)",
+          lambda: comparer.snapshot_scraping_individual(con_precio, "EUR"), max(1, repeticiones // 4), len(con_precio))
+    logging.getLogger("modulos.Comparacion_front").setLevel(logging.ERROR)
+    medir("snapshot_scraping_individual (sin precio)",
+          lambda: comparer.snapshot_scraping_individual(sin_precio, "EUR"), max(1, repeticiones // 20), len(sin_precio))
+
+    db = DatabaseManager(os.path.join(directorio, "micro.db"))
+    items = list(valores.items())
+    contador = iter(range(10 ** 9))
+
+    def upsert_uno():
+        codigo, valor = items[next(contador) % len(items)]
+        db.upsert_divisa(f"{codigo}-USD", valor, "USD")
+    medir("upsert_divisa (una transacción por fila)", upsert_uno, repeticiones)
+
+    lote = [{"codigo": f"{codigo}-USD", "valor_actual": valor, "valor_comparacion": "USD"} for codigo, valor in items]
+    medir(f"upsert_many ({len(lote)} filas, una transacción)", lambda: db.upsert_many(lote), max(1, repeticiones // 10))
+
+    ruta = os.path.join(directorio, "micro.json")
+    medir("export_to_json (lista indentada)", lambda: db.export_to_json(ruta), max(1, repeticiones // 10))
+    medir("export_to_json (mapa compacto)",
+          lambda: db.export_to_json(ruta, formato="mapa", compacto=True), max(1, repeticiones // 10))
+
+
+def grabar_corpus(codigos: list):
+    """Descarga las páginas reales (toca Google Finance: usar con moderación)."""
+    from modulos.Extraccion_front import extract_html_multiple_urls
+    os.makedirs(DIR_CORPUS, exist_ok=True)
+    urls = {f"https://www.google.com/finance/quote/{codigo}-USD?hl=es": codigo for codigo in codigos}
+    paginas = asyncio.run(extract_html_multiple_urls(list(urls)))
+    for url, html in paginas.items():
+        with open(os.path.join(DIR_CORPUS, f"{urls[url]}-USD.html"), 'w', encoding='utf-8') as f:
+            f.write(html)
+    print(f"{len(paginas)} páginas grabadas en {DIR_CORPUS}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--divisas", type=int, default=None, help="cantidad de divisas a consultar (por defecto todas)")
+    parser.add_argument("--repeticiones", type=int, default=200)
+    parser.add_argument("--serial", action="store_true")
+    parser.add_argument("--realista", action="store_true")
+    parser.add_argument("--grabar", action="store_true")
+    args = parser.parse_args()
+
+    if args.serial:
+        os.environ["MODO_PARSEO"] = "serial"
+    # Solo el proveedor de páginas individuales: las fuentes masivas no tienen corpus local
+    os.environ["PROVEEDORES"] = "google_finance"
+    import main as main_mod
+    from modulos import Limitador_tasa
+    logging.getLogger().setLevel(logging.WARNING)
+
+    valores = valores_origen()
+    codigos = sorted(c for c in main_mod.DIVISAS_SOPORTADAS if c in valores)[:args.divisas]
+    if args.grabar:
+        grabar_corpus(codigos)
+        return
+    valores = {codigo: valores[codigo] for codigo in codigos}
+
+    if not args.realista:
+        # Sin throttling que simular: el limitador arranca y se queda en su máximo
+        Limitador_tasa.TASA_MAXIMA = Limitador_tasa.CAPACIDAD_BUCKET = 10_000
+        Limitador_tasa.LimitadorAdaptativo.__init__.__defaults__ = (10_000, Limitador_tasa.CONCURRENCIA_MAXIMA)
+
+    corpus = Corpus(valores)
+    servidor = crear_servidor(corpus)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    redirigir_sesion(f"http://127.0.0.1:{servidor.server_port}")
+
+    # main() escribe en rutas relativas: todo queda en el directorio temporal
+    main_mod.DIVISAS_SOPORTADAS = codigos + ["USD"]
+    directorio = tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.makedirs(os.path.join(directorio, "Almacenamiento"))
+    anterior = os.getcwd()
+    os.chdir(directorio)
+    try:
+        print(f"Corpus: {len(codigos)} divisas ({len(corpus.grabadas & set(codigos))} grabadas, el resto sintetizadas), "
+              f"parseo {main_mod.MODO_PARSEO}, limitador {'por defecto' if args.realista else 'sin límite'}")
+        correr_main(main_mod, "en frío", valores)
+        correr_main(main_mod, "con caché de descargas", valores)
+        micro_benchmarks(directorio, valores, args.repeticiones)
+    finally:
+        os.chdir(anterior)
+        servidor.shutdown()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    rss = rss_max_mb()
+    if rss is not None:
+        print(f"\nRSS máximo del proceso: {rss:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
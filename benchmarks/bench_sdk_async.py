@@ -0,0 +1,84 @@
+"""
+Benchmark del SDK asíncrono (ClienteDivisasAsync) bajo carga concurrente.
+
+Levanta un servidor local que sirve datos.json con una latencia artificial y lanza
+N corrutinas concurrentes pidiendo conversiones, primero con la caché fría y luego
+con la tabla ya vencida (revalidación). Reporta descargas reales y latencias p50/p99.
+Uso: python benchmarks/bench_sdk_async.py [concurrencia] [latencia_ms]
+"""
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(os.path.join(RAIZ, 'SDKs', 'python'))
+from API_consultas import ClienteDivisasAsync
+
+with open(os.path.join(RAIZ, "datos.json"), 'rb') as f:
+    DATOS = f.read()
+
+
+def crear_servidor(latencia: float) -> ThreadingHTTPServer:
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latencia)
+            self.server.descargas += 1
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(DATOS)))
+            self.end_headers()
+            self.wfile.write(DATOS)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+    servidor.descargas = 0
+    return servidor
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+async def ronda(cliente: ClienteDivisasAsync, codigos: list, concurrencia: int) -> list:
+    async def llamada():
+        inicio = time.perf_counter()
+        await cliente.convertir(random.choice(codigos), random.choice(codigos), 100)
+        return (time.perf_counter() - inicio) * 1000
+
+    return await asyncio.gather(*(llamada() for _ in range(concurrencia)))
+
+
+async def correr(url: str, concurrencia: int, servidor) -> None:
+    cliente = ClienteDivisasAsync(url, ttl=3600)
+    codigos = await cliente.disponibles()
+    servidor.descargas = 0
+    for nombre in ("vencida", "vigente"):
+        if nombre == "vencida":
+            cliente.cliente._vence = 0.0
+        latencias = await ronda(cliente, codigos, concurrencia)
+        print(
+            f"Tabla {nombre:<8} | {concurrencia} llamadas | descargas: {servidor.descargas} | "
+            f"p50 {percentil(latencias, 0.5):.2f} ms | p99 {percentil(latencias, 0.99):.2f} ms"
+        )
+        servidor.descargas = 0
+
+
+def main():
+    concurrencia = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    latencia = (int(sys.argv[2]) if len(sys.argv) > 2 else 100) / 1000
+    servidor = crear_servidor(latencia)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    asyncio.run(correr(f"http://127.0.0.1:{servidor.server_port}/datos.json", concurrencia, servidor))
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Prueba de carga del servidor de tasas (modulos/Servidor_api.py).
+
+Levanta el servidor en un proceso aparte sobre Almacenamiento/divisas.db y abre N
+conexiones keep-alive que piden rutas mezcladas (/rate, /rates, /currencies)
+durante unos segundos. Reporta peticiones por segundo y latencias p50/p99.
+Uso: python benchmarks/bench_servidor_api.py [conexiones] [segundos]
+"""
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CODIGOS = ["EUR", "CLP", "JPY", "GBP", "MXN", "BRL", "ARS", "CNY", "CAD", "AUD", "USD"]
+
+
+def ruta_aleatoria() -> str:
+    sorteo = random.random()
+    if sorteo < 0.8:
+        return f"/rate/{random.choice(CODIGOS)}/{random.choice(CODIGOS)}"
+    if sorteo < 0.95:
+        return f"/rates?base={random.choice(CODIGOS)}"
+    return "/currencies"
+
+
+async def cliente(puerto: int, hasta: float, latencias: list):
+    reader, writer = await asyncio.open_connection("127.0.0.1", puerto)
+    while time.perf_counter() < hasta:
+        inicio = time.perf_counter()
+        writer.write(f"GET {ruta_aleatoria()} HTTP/1.1\r\nHost: localhost\r\nAccept-Encoding: gzip\r\n\r\n".encode())
+        cabecera = await reader.readuntil(b"\r\n\r\n")
+        largo = int(cabecera.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+        await reader.readexactly(largo)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    writer.close()
+
+
+async def carga(puerto: int, conexiones: int, segundos: float) -> list:
+    latencias = []
+    hasta = time.perf_counter() + segundos
+    await asyncio.gather(*(cliente(puerto, hasta, latencias) for _ in range(conexiones)))
+    return latencias
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    conexiones = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    segundos = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    puerto = puerto_libre()
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "modulos.Servidor_api", "--puerto", str(puerto)],
+        cwd=RAIZ, stdout=subprocess.DEVNULL
+    )
+    try:
+        for _ in range(50):
+            try:
+                socket.create_connection(("127.0.0.1", puerto), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        latencias = sorted(asyncio.run(carga(puerto, conexiones, segundos)))
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+    print(f"Conexiones: {conexiones} | Duración: {segundos:.0f}s | Peticiones: {len(latencias)}")
+    print(f"Throughput: {len(latencias) / segundos:.0f} req/s")
+    print(f"Latencia p50: {latencias[len(latencias) // 2]:.2f} ms | p99: {latencias[int(len(latencias) * 0.99)]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark y comprobación de GuardiaAnomalias.validar.
+
+Sobre una copia temporal de Almacenamiento/divisas.db simula corridas horarias con
+ruido de mercado (precios con 4 decimales, como Google Finance) para calentar las
+estadísticas y verifica que:
+  - ninguna corrida limpia pone divisas en cuarentena;
+  - un precio ajeno (p. ej. el % de variación), un salto de escala, una divisa
+    anclada que rompe su paridad y un ancla contradicha por sus ancladas sí van a
+    cuarentena con su motivo;
+  - un salto evaluado en corridas que no se publican (sin confirmar) no se acepta
+    como nuevo nivel.
+Después mide el costo por corrida con las divisas reales y con N sintéticas.
+Sale con código 1 si alguna comprobación falla.
+Uso: python benchmarks/bench_validacion.py [corridas] [divisas_sinteticas]
+"""
+import itertools
+import logging
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(RAIZ)
+from modulos.Actualizacion_bd import DatabaseManager
+from modulos.Validacion_divisas import GuardiaAnomalias, PARIDADES_FIJAS, CONFIRMACIONES_CAMBIO
+
+CUATRO_DECIMALES = Decimal("0.0001")
+
+
+def mover(valores: dict, rng: random.Random) -> dict:
+    """Un paso de ±0,2 % en las divisas flotantes; las ancladas siguen a su ancla."""
+    nuevos = {
+        codigo: valor * (1 + Decimal(rng.uniform(-0.002, 0.002)))
+        for codigo, valor in valores.items() if codigo not in PARIDADES_FIJAS
+    }
+    for codigo, (ancla, paridad) in PARIDADES_FIJAS.items():
+        if codigo in valores:
+            nuevos[codigo] = (Decimal(1) if ancla == "USD" else nuevos.get(ancla, valores[codigo] * paridad)) / paridad
+    return nuevos
+
+
+def publicar(valores: dict) -> dict:
+    return {codigo: max(valor.quantize(CUATRO_DECIMALES), CUATRO_DECIMALES) for codigo, valor in valores.items()}
+
+
+def main():
+    corridas = int(sys.argv[1]) if len(sys.argv) > 1 else 48
+    sinteticas = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    logging.getLogger("modulos").setLevel(logging.ERROR)
+    rng = random.Random(3)
+
+    directorio = tempfile.mkdtemp(prefix="bench_validacion_")
+    try:
+        ruta = os.path.join(directorio, "divisas.db")
+        shutil.copy(os.path.join(RAIZ, "Almacenamiento", "divisas.db"), ruta)
+        reales = DatabaseManager(ruta).valores_actuales()
+        reales.pop("USD", None)
+        guardia = GuardiaAnomalias(ruta)
+
+        fallos = []
+        ahora = int(time.time())
+        mercado, publicado = dict(reales), dict(reales)
+        for corrida in range(corridas):
+            mercado = mover(mercado, rng)
+            nuevas = publicar(mercado)
+            _, cuarentena = guardia.validar(nuevas, publicado, ahora + corrida * 3600)
+            if cuarentena:
+                fallos.append(f"corrida limpia {corrida}: {cuarentena}")
+            publicado = nuevas
+        ahora += corridas * 3600
+
+        casos = {
+            "JPY": ("porcentaje de variación en vez del precio", Decimal("0.52")),
+            "MXN": ("escala equivocada (x100)", publicado["MXN"] * 100),
+            "BAM": ("paridad rota con EUR", publicado["BAM"] * Decimal("1.1")),
+        }
+        erroneas = dict(publicado)
+        for codigo, (_, valor) in casos.items():
+            erroneas[codigo] = valor
+        _, cuarentena = guardia.validar(erroneas, publicado, ahora)
+        for codigo, (descripcion, _) in casos.items():
+            print(f"  {codigo:<4} {descripcion:<44} -> {cuarentena.get(codigo, 'ACEPTADO')}")
+            if codigo not in cuarentena:
+                fallos.append(f"{codigo} ({descripcion}) no fue a cuarentena")
+        if set(cuarentena) - set(casos):
+            fallos.append(f"cuarentena inesperada: {set(cuarentena) - set(casos)}")
+
+        # EUR desplazado dentro del salto tolerado pero contradicho por todas sus ancladas
+        erroneas = dict(publicado)
+        erroneas["EUR"] = publicado["EUR"] * Decimal("1.05")
+        _, cuarentena = GuardiaAnomalias(os.path.join(directorio, "sin_historia.db")).validar(erroneas, {})
+        print(f"  EUR  {'ancla contradicha por sus ancladas':<44} -> {cuarentena.get('EUR', 'ACEPTADO')}")
+        if set(cuarentena) != {"EUR"}:
+            fallos.append(f"ancla contradicha: cuarentena {cuarentena}")
+
+        # Corridas abortadas (evaluadas sin confirmar) no hacen avanzar las confirmaciones
+        saltada = dict(publicado)
+        saltada["MXN"] = publicado["MXN"] * 100
+        abortadas = GuardiaAnomalias(os.path.join(directorio, "abortadas.db"))
+        for _ in range(CONFIRMACIONES_CAMBIO + 1):
+            evaluacion = abortadas.evaluar(saltada, publicado, ahora)
+        print(f"  MXN  {'salto repetido en corridas sin publicar':<44} -> {evaluacion.cuarentena.get('MXN', 'ACEPTADO')}")
+        if "MXN" not in evaluacion.cuarentena:
+            fallos.append("un salto de corridas no publicadas se confirmó como nuevo nivel")
+
+        for fallo in fallos:
+            print(f"  FALLO {fallo}")
+        print(f"Comprobaciones: {corridas} corridas limpias y {len(casos) + 2} anomalías, {len(fallos)} fallos\n")
+        if fallos:
+            sys.exit(1)
+
+        for nombre, valores in (
+            (f"{len(reales)} divisas reales", reales),
+            (f"{sinteticas} divisas sintéticas", {
+                "".join(letras): rng.choice(list(reales.values()))
+                for letras in itertools.islice(itertools.product(string.ascii_uppercase, repeat=3), sinteticas)
+            }),
+        ):
+            previas = dict(valores)
+            repeticiones = 20
+            segundos = 0.0
+            for i in range(repeticiones):
+                nuevas = publicar(mover(previas, rng))
+                inicio = time.perf_counter()
+                guardia.validar(nuevas, previas, ahora + (i + 1) * 3600)
+                segundos += time.perf_counter() - inicio
+                previas = nuevas
+            por_corrida = segundos / repeticiones
+            print(f"  validar con {nombre:<26} {por_corrida * 1000:>8.2f} ms/corrida  "
+                  f"{por_corrida / len(valores) * 1e6:>6.2f} µs/divisa")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
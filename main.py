@@ -1,11 +1,23 @@
+import argparse
 import asyncio
 import logging
 import os
 import sys
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
 from decimal import Decimal
-from modulos.Actualizacion_bd import DatabaseManager
-from modulos.Extraccion_front import extract_html_multiple_urls
+from typing import Callable
+from modulos.Actualizacion_bd import DatabaseManager, ANTIGUEDAD_DESACTUALIZADA
+from modulos.Cache_fetch import FetchCache
+from modulos.Extraccion_front import stream_html_multiple_urls, close_session
 from modulos.Comparacion_front import ContentComparer
+from modulos.Limitador_tasa import LimitadorAdaptativo
+from modulos.Metricas import METRICAS, escribir_reporte, servir_prometheus
+from modulos.Planificador import Planificador
+from modulos.Proveedores import MotorCotizaciones, crear_proveedores, PROVEEDORES
+from modulos.Registro_divisas import RegistroDisponibilidad
+from modulos.Validacion_divisas import GuardiaAnomalias
 from modulos.divisas_list import DIVISAS_SOPORTADAS
 
 # Configurar logging
@@ -16,137 +28,447 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# --- Configuración de la etapa de parseo ---
+# "procesos" reparte el parseo en un ProcessPoolExecutor, "serial" lo hace en este hilo
+MODO_PARSEO = os.environ.get("MODO_PARSEO", "procesos")
+# Número de procesos del pool (None = os.cpu_count())
+PARSEO_WORKERS = int(os.environ["PARSEO_WORKERS"]) if os.environ.get("PARSEO_WORKERS") else None
+# Páginas enviadas a cada proceso por tarea
+PARSEO_CHUNKSIZE = int(os.environ.get("PARSEO_CHUNKSIZE", "8"))
+# Segundos máximos de espera por los lotes pendientes al terminar las descargas;
+# los que no terminan a tiempo se parsean en modo serial
+TIMEOUT_PARSEO = float(os.environ.get("TIMEOUT_PARSEO", "120"))
 
-def actualizar_divisas_soportadas(divisas_exitosas: set):
+# --- Configuración del modo daemon (python main.py --daemon) ---
+# Divisas más consultadas: se refrescan cada INTERVALO_PRINCIPALES segundos
+DIVISAS_PRINCIPALES = ["EUR", "JPY", "GBP", "CNY", "CAD", "AUD", "CHF", "MXN", "BRL", "CLP", "ARS", "COP"]
+INTERVALO_PRINCIPALES = float(os.environ.get("INTERVALO_PRINCIPALES", "300"))
+# Cada INTERVALO_COMPLETO segundos se refrescan todas (equivale a una corrida de main.py)
+INTERVALO_COMPLETO = float(os.environ.get("INTERVALO_COMPLETO", "3600"))
+
+# Reporte JSON de la última corrida (tiempos por etapa, bytes, esperas, bloqueos)
+RUTA_REPORTE = "reporte_corrida.json"
+
+# Mínimo de divisas válidas de una corrida completa (menos indica bloqueo de las fuentes)
+MINIMO_DIVISAS_VALIDAS = 10
+
+# Comparador propio de cada proceso del pool (lo crea _inicializar_worker)
+_comparer_worker = None
+
+
+def _inicializar_worker():
     """
-    Reescribe modulos/divisas_list.py eliminando las divisas que NO se pudieron
-    extraer en esta ejecución (no devolvieron datos válidos desde Google Finance).
-    Solo actúa si el porcentaje de éxito es >= 50% del total de divisas soportadas,
-    para evitar degradar la lista por bloqueos temporales de Google Finance.
+    Inicializador de cada proceso del pool: crea su comparador y reinicia el registro
+    de métricas heredado con fork (sus valores ya se cuentan en el principal y su
+    lock pudo quedar tomado por otro hilo).
     """
-    divisas_actuales = set(DIVISAS_SOPORTADAS)
-    total_esperadas = len(divisas_actuales)
-    exitosas_sin_usd = divisas_exitosas - {"USD"}
-
-    # Umbral de seguridad: solo limpiar la lista si al menos el 50% tuvo éxito
-    if len(exitosas_sin_usd) < total_esperadas * 0.5:
-        logger.warning(
-            f"Solo {len(exitosas_sin_usd)}/{total_esperadas} divisas se extrajeron exitosamente "
-            f"({len(exitosas_sin_usd)/total_esperadas*100:.1f}%). "
-            f"Umbral mínimo (50%) no alcanzado. Se conserva divisas_list.py sin cambios."
-        )
-        return
+    global _comparer_worker
+    METRICAS.reiniciar()
+    _comparer_worker = ContentComparer()
+
+
+def _crear_pool_parseo() -> ProcessPoolExecutor:
+    """Pool de procesos para el parseo, con PARSEO_WORKERS procesos inicializados por _inicializar_worker."""
+    return ProcessPoolExecutor(max_workers=PARSEO_WORKERS, initializer=_inicializar_worker)
+
+
+def _descartar_pool(executor: ProcessPoolExecutor):
+    """Cierra un pool propio sin esperar a los procesos colgados (los termina)."""
+    # ProcessPoolExecutor no expone sus procesos (y shutdown los olvida); sin terminarlos,
+    # la salida del intérprete los esperaría
+    procesos = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for proceso in procesos:
+        proceso.terminate()
+
+
+def _parsear_lote(paginas: list) -> tuple:
+    """
+    Parsea un lote de páginas [(codigo, html), ...] dentro de un proceso del pool.
+    Retorna ([(codigo, divisa_data), ...], segundos de parseo, métricas del proceso).
+    """
+    return (*_parsear_lote_con(_comparer_worker, paginas), METRICAS.drenar())
 
-    divisas_removidas = divisas_actuales - divisas_exitosas - {"USD"}  # USD es manual
 
-    if not divisas_removidas:
-        logger.info("Todas las divisas se extrajeron exitosamente. No se eliminaron divisas de la lista.")
-        return
+def _parsear_lote_con(comparer: ContentComparer, paginas: list) -> tuple:
+    inicio = time.perf_counter()
+    resultados = [
+        (codigo_divisa, comparer.snapshot_scraping_individual(html_crudo, codigo=codigo_divisa))
+        for codigo_divisa, html_crudo in paginas
+    ]
+    return resultados, time.perf_counter() - inicio
 
-    logger.warning(f"Eliminando {len(divisas_removidas)} divisas no disponibles: {sorted(divisas_removidas)}")
 
-    divisas_nuevas = sorted(divisas_exitosas | {"USD"})
+async def extraer_y_parsear(urls_a_consultar: dict, comparer: ContentComparer, modo: str = MODO_PARSEO,
+                            cache: FetchCache = None, executor: ProcessPoolExecutor = None,
+                            limitador: LimitadorAdaptativo = None, al_colgarse: Callable[[], None] = None) -> list:
+    """
+    Descarga y parsea en streaming: cada HTML se parsea en cuanto llega y se libera,
+    así el parseo se solapa con las descargas y la memoria no depende del número
+    de divisas.
+    En modo "procesos" las páginas se envían al ProcessPoolExecutor en lotes de
+    PARSEO_CHUNKSIZE; si el pool no puede crearse o falla, o un lote no termina en
+    TIMEOUT_PARSEO segundos, ese trabajo se parsea en modo serial.
+    Con caché, las páginas que respondieron 304 o cuya región de precio no cambió
+    reutilizan el valor guardado sin parsearse.
+    executor y limitador permiten reutilizar el pool y el ritmo aprendido entre
+    corridas (modo daemon); el executor recibido no se cierra aquí: si un lote suyo
+    no termina a tiempo se llama a al_colgarse para que su dueño lo reemplace.
+    Retorna [(codigo, divisa_data), ...].
+    """
+    inicio = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    resultados = []
+    segundos_parseo = 0.0
+
+    executor_propio = executor is None
+    if modo == "procesos" and executor is None:
+        try:
+            executor = _crear_pool_parseo()
+        except Exception as e:
+            logger.warning(f"No se pudo crear el pool de procesos ({e}). Se parsea en modo serial.")
+    if executor is None:
+        modo = "serial"
+    pool_colgado = False
+
+    pendientes = []  # [(lote, futuro)] se conserva el lote hasta que termine por si hay que reintentar en serie
+    buffer = []
+    huellas = {}  # {codigo: (url, huella)} de las páginas que sí se parsean, para actualizar la caché
+
+    def recoger(lote: list, futuro) -> None:
+        nonlocal segundos_parseo
+        try:
+            if futuro.cancelled():
+                raise TimeoutError(f"sin terminar tras {TIMEOUT_PARSEO:.0f}s")
+            parciales, segundos, metricas_worker = futuro.result()
+            METRICAS.fusionar(metricas_worker)
+        except Exception as e:
+            logger.warning(f"Fallo el parseo en el pool ({e}). Se reintenta el lote en modo serial.")
+            parciales, segundos = _parsear_lote_con(comparer, lote)
+        resultados.extend(parciales)
+        segundos_parseo += segundos
+
+    def enviar(lote: list) -> None:
+        nonlocal segundos_parseo
+        if executor is not None:
+            pendientes.append((lote, loop.run_in_executor(executor, _parsear_lote, lote)))
+        else:
+            parciales, segundos = _parsear_lote_con(comparer, lote)
+            resultados.extend(parciales)
+            segundos_parseo += segundos
+
+    try:
+        async for url, html_crudo in stream_html_multiple_urls(list(urls_a_consultar.keys()), limitador, cache):
+            codigo_divisa = urls_a_consultar[url]
+            if cache is not None:
+                if html_crudo is None:
+                    resultados.append((codigo_divisa, cache.resultado_no_modificado(url)))
+                    continue
+                huella, divisa_data = cache.resultado_por_huella(url, html_crudo)
+                if divisa_data is not None:
+                    resultados.append((codigo_divisa, divisa_data))
+                    continue
+                huellas[codigo_divisa] = (url, huella)
 
-    # Reconstruir el archivo divisas_list.py
-    ruta = os.path.join(os.path.dirname(__file__), "modulos", "divisas_list.py")
-    lineas = ["# Lista de todas las divisas para consultar su valor contra el USD en Google Finance.\n"]
-    lineas.append("DIVISAS_SOPORTADAS = [\n")
-    # Escribir en filas de 12 por linea para mejor legibilidad
-    chunk = 12
-    for i in range(0, len(divisas_nuevas), chunk):
-        fila = divisas_nuevas[i:i+chunk]
-        lineas.append("    " + ", ".join(f'"{d}"' for d in fila) + ("," if i + chunk < len(divisas_nuevas) else "") + "\n")
-    lineas.append("]\n")
+            buffer.append((codigo_divisa, html_crudo))
+            del html_crudo
+            if executor is None or len(buffer) >= PARSEO_CHUNKSIZE:
+                enviar(buffer)
+                buffer = []
+            # Recoger lotes ya parseados para liberar su HTML
+            listos = [p for p in pendientes if p[1].done()]
+            pendientes = [p for p in pendientes if not p[1].done()]
+            for lote, futuro in listos:
+                recoger(lote, futuro)
+
+        if buffer:
+            enviar(buffer)
+        if pendientes:
+            _, sin_terminar = await asyncio.wait([futuro for _, futuro in pendientes], timeout=TIMEOUT_PARSEO)
+            if sin_terminar:
+                pool_colgado = True
+                logger.warning(f"{len(sin_terminar)} lotes sin terminar tras {TIMEOUT_PARSEO:.0f}s en el pool.")
+                for futuro in sin_terminar:
+                    futuro.cancel()
+        for lote, futuro in pendientes:
+            recoger(lote, futuro)
+    finally:
+        if executor is not None and executor_propio:
+            if pool_colgado:
+                _descartar_pool(executor)
+            else:
+                executor.shutdown()
+        elif pool_colgado and al_colgarse is not None:
+            al_colgarse()
+
+    if cache is not None:
+        for codigo_divisa, divisa_data in resultados:
+            if divisa_data and codigo_divisa in huellas:
+                cache.guardar_resultado(*huellas[codigo_divisa], divisa_data)
+        cache.guardar()
+        cache.log_estadisticas()
+
+    METRICAS.observar("etapa_segundos", time.perf_counter() - inicio, etapa="extraccion_parseo")
+    logger.info(
+        f"Extracción y parseo de {len(resultados)} páginas en modo {modo}: "
+        f"{time.perf_counter() - inicio:.2f}s totales, {segundos_parseo:.2f}s de parseo"
+    )
+    return resultados
+
+
+class Orquestador:
+    """
+    Estado que se conserva entre corridas: base de datos, registro de disponibilidad,
+    comparador, caché de descargas, ritmo aprendido del limitador y salud de los
+    proveedores de cotizaciones (y en modo daemon también el pool de parseo).
+    main() lo usa para una sola corrida y el modo daemon para todas.
+    """
 
-    with open(ruta, "w", encoding="utf-8") as f:
-        f.writelines(lineas)
+    def __init__(self, executor: ProcessPoolExecutor = None, proveedores: str = PROVEEDORES):
+        self.db_manager = DatabaseManager()
+        self.registro = RegistroDisponibilidad(self.db_manager.db_path)
+        self.guardia = GuardiaAnomalias(self.db_manager.db_path)
+        self.cuarentena = {}  # {codigo: motivo} de la última corrida
+        self.comparer = ContentComparer()
+        self.cache = FetchCache()
+        self.limitador = LimitadorAdaptativo()
+        self.executor = executor
+        # Google Finance descarga y parsea con el pipeline en streaming de este módulo
+        self.motor = MotorCotizaciones(crear_proveedores(proveedores, self._descargar_google, self.comparer))
 
-    logger.info(f"divisas_list.py actualizado con {len(divisas_nuevas)} divisas disponibles.")
+    async def _descargar_google(self, urls_a_consultar: dict) -> list:
+        return await extraer_y_parsear(urls_a_consultar, self.comparer, cache=self.cache,
+                                       executor=self.executor, limitador=self.limitador,
+                                       al_colgarse=self._reponer_pool)
 
+    def _reponer_pool(self):
+        """Reemplaza el pool de parseo compartido tras un lote colgado (si no, cada corrida esperaría TIMEOUT_PARSEO)."""
+        logger.warning("Se reemplaza el pool de parseo: un proceso quedó colgado.")
+        _descartar_pool(self.executor)
+        try:
+            self.executor = _crear_pool_parseo()
+        except Exception as e:
+            logger.warning(f"No se pudo recrear el pool de procesos ({e}). Se parsea en modo serial.")
+            self.executor = None
 
-async def main():
+    async def actualizar(self, divisas, completa: bool = True, sondeo: bool = False) -> bool:
+        """
+        Extrae, guarda y publica las divisas indicadas. Una corrida completa reemplaza
+        la tabla; una parcial fusiona sus divisas con las filas existentes (el resto
+        conserva su fecha_actualizacion y queda marcado como desactualizado al superar
+        ANTIGUEDAD_DESACTUALIZADA) y solo re-exporta si algo cambió.
+        Las divisas que el registro de disponibilidad tiene en espera no se consultan,
+        salvo en un sondeo (corrida parcial de divisas muertas cuya espera venció).
+        Retorna False si se abortó.
+        Al terminar (aun si se abortó) escribe RUTA_REPORTE con las métricas de la corrida.
+        """
+        desde = METRICAS.instantanea()
+        self.cuarentena = {}
+        fecha_inicio = datetime.now(timezone.utc)
+        inicio = time.perf_counter()
+        resultado = "error"
+        try:
+            resultado = "ok" if await self._actualizar(divisas, completa, sondeo) else "abortada"
+            return resultado == "ok"
+        finally:
+            try:
+                escribir_reporte(RUTA_REPORTE, {
+                    "inicio": fecha_inicio.isoformat(timespec="seconds"),
+                    "duracion_s": round(time.perf_counter() - inicio, 3),
+                    "tipo": "completa" if completa else "sondeo" if sondeo else "parcial",
+                    "divisas_solicitadas": len(divisas),
+                    "resultado": resultado,
+                    "cuarentena": self.cuarentena,
+                    **METRICAS.reporte(desde)
+                })
+            except Exception as e:
+                logger.error(f"No se pudo escribir el reporte de la corrida: {e}")
+
+    async def _actualizar(self, divisas, completa: bool, sondeo: bool) -> bool:
+        db_manager, comparer = self.db_manager, self.comparer
+        if not sondeo:
+            divisas = self.registro.a_consultar(divisas)
+        logger.info(f"=== Preparando {len(divisas)} divisas para extracción ===")
+
+        divisas = sorted(set(divisas) - {"USD"})
+        if not divisas:
+            logger.info("No hay divisas para consultar en esta corrida.")
+            return True
+
+        # A y B. El motor elige la fuente más barata que cubre las divisas (una respuesta
+        # masiva en vez de una página por divisa) y recurre a las demás para lo que falte
+        resultados_parseo = await self.motor.obtener(divisas)
+
+        if not resultados_parseo:
+            logger.error(f"No se obtuvieron cotizaciones de ningún proveedor. Abortando.")
+            return False
+
+        divisas_exitosas = set(resultados_parseo)  # Guardamos los códigos que sí tuvieron datos
+        self.registro.registrar(divisas, divisas_exitosas, sondeo=sondeo)
+
+        # Guardia de anomalías: los valores sospechosos no se publican y conservan su último valor bueno
+        # (su estado se guarda recién con la corrida publicada: una abortada no confirma saltos)
+        evaluacion = self.guardia.evaluar(
+            {codigo: datos["valor_actual"] for codigo, datos in resultados_parseo.items()},
+            db_manager.valores_actuales()
+        )
+        self.cuarentena = evaluacion.cuarentena
+        divisas_extraidas = [resultados_parseo[codigo] for codigo in evaluacion.aceptadas]
+        METRICAS.contar("divisas_validas_total", len(divisas_extraidas))
+        if sondeo and not divisas_extraidas:
+            logger.info("Ninguna de las divisas sondeadas volvió a tener precio.")
+            return True
+
+        # Validar que hay suficientes divisas antes de continuar
+        # (un número bajo indica bloqueo o caída de las fuentes)
+        minimo = MINIMO_DIVISAS_VALIDAS if completa else 1
+        if len(divisas_extraidas) < minimo:
+            logger.error(
+                f"Solo se extrajeron {len(divisas_extraidas)} divisas válidas (mínimo requerido: {minimo}). "
+                f"Posible bloqueo de las fuentes. Se aborta para no sobrescribir datos.json con datos incompletos."
+            )
+            return False
+
+        # Añadimos USD manualmente como referencia base (valor 1:1)
+        divisas_extraidas.append({
+            "codigo": "USD-USD",
+            "valor_comparacion": "USD",
+            "valor_actual": Decimal('1.0')
+        })
+        divisas_exitosas.add("USD")
+
+        logger.info(f"Guardando {len(divisas_extraidas)} registros en la base de datos...")
+
+        # C. Reemplazar la tabla con los datos frescos en una sola transacción
+        # (evitar acumulacion de datos obsoletos sin dejar la tabla vacía a los lectores).
+        # Una corrida parcial solo actualiza sus divisas y conserva el resto.
+        cambios = db_manager.upsert_many([
+            {
+                "codigo": divisa["codigo"], # e.g. "EUR-USD"
+                "valor_actual": divisa["valor_actual"],
+                "valor_comparacion": divisa["valor_comparacion"],
+                # Todas las fuentes entregan el valor en USD de una unidad: el relativo es directo.
+                "total_calculado": comparer.calculate_relative_value(divisa["valor_actual"], Decimal('1.0'))
+            }
+            for divisa in divisas_extraidas
+        ], reemplazar=completa, historial=True, conservar=[f"{codigo}-USD" for codigo in self.cuarentena])
+        self.guardia.confirmar(evaluacion)
+        cambios += db_manager.marcar_desactualizadas()
+        db_manager.aplicar_retencion()
+
+        # Una corrida parcial sin cambios de valor ni de frescura deja los exportados como están
+        if not completa and not cambios:
+            logger.info("Ninguna divisa cambió de valor ni de frescura: no se vuelve a exportar.")
+            METRICAS.contar("exportaciones_omitidas_total")
+            return True
+
+        # 3. Exportar resultados al JSON
+        logger.info("Exportando datos a datos.json...")
+        db_manager.export_to_json("datos.json", compacto=True, comprimir=True)
+        # El mapa lleva la secuencia del delta para servir de base a los clientes de deltas
+        secuencia = db_manager.export_delta("datos_delta.json")
+        db_manager.export_to_json("datos_mapa.json", formato="mapa", compacto=True, comprimir=True, secuencia=secuencia)
+        db_manager.export_binario("datos.bin")
+        db_manager.export_parquet()
+        return True
+
+
+async def main(divisas: list = None, principales: bool = False, desactualizadas: bool = False):
+    """
+    Una corrida completa, o parcial si se indica un subconjunto: las divisas dadas,
+    las principales (DIVISAS_PRINCIPALES) y/o las desactualizadas de la tabla.
+    """
     logger.info("Iniciando orquestación de la API de Divisas...")
-    
+
     # 1. Inicializar DB y Comparador
-    db_manager = DatabaseManager()
-    comparer = ContentComparer()
-
-    logger.info(f"=== Preparando {len(DIVISAS_SOPORTADAS)} divisas para extracción ===")
-    
-    # Generar URLs a consultar (Ej: https://www.google.com/finance/quote/EUR-USD?hl=es)
-    # Evitamos USD-USD
-    urls_a_consultar = {}
-    for divisa in set(DIVISAS_SOPORTADAS):
-        if divisa == "USD": 
-            continue
-        url = f"https://www.google.com/finance/quote/{divisa}-USD?hl=es"
-        urls_a_consultar[url] = divisa
-
-    urls_list = list(urls_a_consultar.keys())
-    
-    # A. Extraer multi-URLs (Esto devolverá un diccionario {url: html_content})
-    resultados_html = await extract_html_multiple_urls(urls_list)
-    
-    if not resultados_html:
-        logger.error(f"No se obtuvieron resultados de la extracción de URLs. Abortando.")
-        return
-        
-    divisas_extraidas = []
-    divisas_exitosas = set()  # Guardamos los códigos que sí tuvieron datos
-    
-    # B. Comparar / Parsear usando clase Decimal
-    for url, html_crudo in resultados_html.items():
-        codigo_divisa = urls_a_consultar[url]
-        divisa_data = comparer.snapshot_scraping_individual(html_crudo, codigo=codigo_divisa)
-        if divisa_data:
-            divisas_extraidas.append(divisa_data)
-            divisas_exitosas.add(codigo_divisa)
-
-    # Validar que hay suficientes divisas antes de continuar
-    # (un número bajo indica bloqueo de Google Finance)
-    MINIMO_DIVISAS_VALIDAS = 10
-    if len(divisas_extraidas) < MINIMO_DIVISAS_VALIDAS:
-        logger.error(
-            f"Solo se extrajeron {len(divisas_extraidas)} divisas válidas (mínimo requerido: {MINIMO_DIVISAS_VALIDAS}). "
-            f"Posible bloqueo de Google Finance. Se aborta para no sobrescribir datos.json con datos incompletos."
-        )
-        return
-
-    # Añadimos USD manualmente como referencia base (valor 1:1)
-    divisas_extraidas.append({
-        "codigo": "USD-USD",
-        "valor_comparacion": "USD",
-        "valor_actual": Decimal('1.0')
-    })
-    divisas_exitosas.add("USD")
-        
-    logger.info(f"Guardando {len(divisas_extraidas)} registros en la base de datos...")
-    
-    # C. Limpiar tabla y guardar datos frescos (evitar acumulacion de datos obsoletos)
-    db_manager.limpiar_tabla()
-    for divisa in divisas_extraidas:
-        codigo_db = divisa["codigo"] # e.g. "EUR-USD"
-        comparacion = divisa["valor_comparacion"]
-        valor_actual = divisa["valor_actual"]
-        
-        # Para Google Finance individual, el precio es el relativo directo.
-        total_calc = comparer.calculate_relative_value(valor_actual, Decimal('1.0'))
-        
-        db_manager.upsert_divisa(
-            codigo=codigo_db,
-            valor_actual=valor_actual,
-            valor_comparacion=comparacion,
-            total_calculado=total_calc
-        )
-    
-    # 3. Exportar resultados al JSON
-    logger.info("Exportando datos a datos.json...")
-    db_manager.export_to_json("datos.json")
+    orquestador = Orquestador()
+    completa = not (divisas or principales or desactualizadas)
+    if completa:
+        seleccion = DIVISAS_SOPORTADAS
+    else:
+        seleccion = list(divisas or [])
+        if principales:
+            seleccion += DIVISAS_PRINCIPALES
+        if desactualizadas:
+            seleccion += orquestador.db_manager.divisas_desactualizadas()
+        seleccion = [d for d in dict.fromkeys(seleccion) if d in DIVISAS_SOPORTADAS]
+        logger.info(f"Corrida parcial de {len(seleccion)} divisas: {seleccion}")
+    if await orquestador.actualizar(seleccion, completa=completa):
+        logger.info("Proceso completado exitosamente.")
+
+
+async def main_daemon(puerto_metricas: int = None):
+    """
+    Modo daemon: un solo proceso que mantiene caliente la sesión HTTP, el pool de
+    parseo, la caché y la base de datos, y refresca las divisas principales cada
+    INTERVALO_PRINCIPALES segundos y todas cada INTERVALO_COMPLETO. Las divisas
+    muertas se re-sondean cuando vence su espera en el registro de disponibilidad.
+    Se detiene de forma ordenada con Ctrl+C o SIGTERM al terminar la corrida en curso.
+    Con puerto_metricas expone las métricas acumuladas en formato Prometheus.
+    """
+    executor = None
+    if MODO_PARSEO == "procesos":
+        try:
+            executor = _crear_pool_parseo()
+        except Exception as e:
+            logger.warning(f"No se pudo crear el pool de procesos ({e}). Se parsea en modo serial.")
+
+    orquestador = Orquestador(executor)
+    principales = [d for d in DIVISAS_PRINCIPALES if d in DIVISAS_SOPORTADAS]
+    planificador = Planificador()
+    planificador.agregar("completa", INTERVALO_COMPLETO, lambda: orquestador.actualizar(DIVISAS_SOPORTADAS))
+    # Junto a las principales se refrescan las filas que quedaron desactualizadas
+    planificador.agregar(
+        "principales",
+        INTERVALO_PRINCIPALES,
+        lambda: orquestador.actualizar(
+            list(dict.fromkeys(principales + orquestador.db_manager.divisas_desactualizadas())), completa=False
+        ),
+        inmediata=False
+    )
+    # El próximo sondeo lo decide el registro (como máximo se espera una corrida completa)
+    registro = orquestador.registro
+
+    def espera_sondeo() -> float:
+        segundos = registro.segundos_hasta_proximo_sondeo()
+        return INTERVALO_COMPLETO if segundos is None else min(INTERVALO_COMPLETO, segundos)
+
+    planificador.agregar(
+        "sondeo",
+        espera_sondeo,
+        lambda: orquestador.actualizar(registro.sondeos_vencidos(), completa=False, sondeo=True),
+        inmediata=False
+    )
+    servidor_metricas = await servir_prometheus(puerto=puerto_metricas) if puerto_metricas else None
+    try:
+        await planificador.ejecutar()
+    finally:
+        if servidor_metricas is not None:
+            servidor_metricas.close()
+        # El orquestador pudo haber reemplazado el pool durante la ejecución
+        if orquestador.executor is not None:
+            orquestador.executor.shutdown()
+        close_session()
+    logger.info(f"Daemon detenido tras {planificador.ejecuciones} corridas.")
 
-    # 4. Remover divisas no disponibles de la lista de soportadas
-    actualizar_divisas_soportadas(divisas_exitosas)
-    
-    logger.info("Proceso completado exitosamente.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Actualiza las tasas de cambio desde los proveedores configurados en PROVEEDORES.")
+    parser.add_argument("--daemon", action="store_true",
+                        help="se queda en ejecución y refresca las divisas periódicamente")
+    parser.add_argument("--metricas-puerto", type=int, default=None,
+                        help="con --daemon, puerto donde exponer /metrics en formato Prometheus")
+    parcial = parser.add_argument_group("corrida parcial", "fusiona solo estas divisas con la tabla existente")
+    parcial.add_argument("--divisas", type=lambda texto: [d.strip().upper() for d in texto.split(",") if d.strip()],
+                         default=None, metavar="EUR,JPY,...", help="divisas a refrescar")
+    parcial.add_argument("--principales", action="store_true", help="refresca DIVISAS_PRINCIPALES")
+    parcial.add_argument("--desactualizadas", action="store_true",
+                         help=f"refresca las filas sin actualizar hace más de {ANTIGUEDAD_DESACTUALIZADA}s")
+    args = parser.parse_args()
+    try:
+        if args.daemon:
+            asyncio.run(main_daemon(args.metricas_puerto))
+        else:
+            asyncio.run(main(args.divisas, args.principales, args.desactualizadas))
+    except KeyboardInterrupt:
+        logger.info("Interrumpido por el usuario.")
@@ -1,3 +1,6 @@
+import importlib.util
+import os
+import threading
 import requests
 from decimal import Decimal
 
@@ -6,19 +9,33 @@ URL_DATOS_GITHUB = "https://LucielDOD.github.io/API-Divisas/datos.json"
 # Puedes reemplazar la URL de arriba con tu raw URL si Pages tarda en actualizarse:
 # "https://raw.githubusercontent.com/LucielDOD/API-Divisas/main/datos.json"
 
+# Reutilizamos el cliente con caché del SDK de Python (SDKs/python/API_consultas.py).
+# Se carga por ruta porque ambos archivos se llaman igual.
+_ruta_sdk = os.path.join(os.path.dirname(__file__), "..", "SDKs", "python", "API_consultas.py")
+_spec = importlib.util.spec_from_file_location("sdk_api_consultas", _ruta_sdk)
+sdk_api_consultas = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(sdk_api_consultas)
+ClienteDivisas = sdk_api_consultas.ClienteDivisas
+
+_clientes = {}
+_clientes_lock = threading.Lock()
+
+
+def obtener_cliente(url_origen: str = URL_DATOS_GITHUB) -> ClienteDivisas:
+    """Un ClienteDivisas compartido por cada URL de origen."""
+    with _clientes_lock:
+        if url_origen not in _clientes:
+            _clientes[url_origen] = ClienteDivisas(url_origen)
+        return _clientes[url_origen]
+
+
 def Solicitar_Divisas_Disponibles(url_origen: str = URL_DATOS_GITHUB) -> list:
     """
     Obtiene la lista de códigos de divisas disponibles leyendo el JSON remoto.
     """
     try:
-        response = requests.get(url_origen)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Extraer códigos, removiendo el sufijo '-USD' (Ej: 'EUR-USD' -> 'EUR')
-        codigos = [d["codigo"].replace("-USD", "") for d in data]
-        # Remover duplicados y ordenar
-        return sorted(list(set(codigos)))
+        # Usa la tabla en memoria del cliente (solo descarga si venció)
+        return obtener_cliente(url_origen).divisas_disponibles()
     except Exception as e:
         print(f"Error al obtener divisas disponibles: {e}")
         return []
@@ -35,28 +52,9 @@ def Solicitar_Valor_Divisa(divisa_1: str, divisa_2: str) -> Decimal:
     divisa_2 = divisa_2.upper()
 
     try:
-        # Descarga los precios de github
-        response = requests.get(url_origen)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Mapeamos los datos { "EUR": Decimal("1.08"), ... }
-        valores_en_usd = { 
-            d["codigo"].replace("-USD", ""): Decimal(str(d["valor_actual"])) 
-            for d in data 
-        }
-        
-        if divisa_1 not in valores_en_usd:
-            raise ValueError(f"La divisa base '{divisa_1}' no se encuentra en el origen de datos.")
-        if divisa_2 not in valores_en_usd:
-            raise ValueError(f"La divisa objetivo '{divisa_2}' no se encuentra en el origen de datos.")
-            
-        valor_1 = valores_en_usd[divisa_1]
-        valor_2 = valores_en_usd[divisa_2]
-        
+        # Usa la tabla en memoria del cliente (solo descarga si venció)
         # (Divisa 1 a USD) / (Divisa 2 a USD)
-        resultado = valor_1 / valor_2
-        return resultado
+        return obtener_cliente(url_origen).valor_divisa(divisa_1, divisa_2)
 
     except requests.exceptions.RequestException as e:
         print(f"Error de red al consultar los datos: {e}")
@@ -1,14 +1,141 @@
 import sqlite3
 import json
+import os
+import gzip
+import struct
+import tempfile
+import time
 import logging
-from decimal import Decimal
-from typing import List, Dict
+from contextlib import contextmanager, closing
+from decimal import Decimal, localcontext
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+from modulos.Metricas import METRICAS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 logger = logging.getLogger(__name__)
 
+# PRAGMAs de las conexiones de escritura por lotes: WAL permite que los lectores sigan
+# viendo la versión anterior mientras se escribe, y synchronous=NORMAL deja un solo fsync por commit
+PRAGMAS_ESCRITURA = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+)
+
+# --- Retención del historial ---
+# Se conserva un valor por hora durante estos días y uno por día para lo anterior
+RETENCION_HORARIA_DIAS = 30
+# Base propia del historial (junto a divisas.db y fuera de git, como cache_fetch.db):
+# divisas.db se commitea en cada corrida y no debe crecer con el historial. En el
+# workflow horario se conserva entre corridas con actions/cache (update_data.yml)
+NOMBRE_DB_HISTORIAL = "historial.db"
+# Tablas que antes vivían en divisas.db y se migran a la base del historial
+TABLAS_HISTORIAL = ("corridas", "historial", "marcas_exportacion")
+
+# --- Frescura de las filas ---
+# Segundos sin actualizarse a partir de los cuales una fila se marca como desactualizada
+# (solo ocurre con corridas parciales: una corrida completa reemplaza la tabla entera)
+ANTIGUEDAD_DESACTUALIZADA = 2 * 3600
+
+# Historial: el valor se guarda como entero (mantisa) + exponente para ser exacto y compacto.
+# WITHOUT ROWID con clave (codigo, timestamp) deja las filas ordenadas por divisa y fecha,
+# así las consultas por rango y "a fecha" son búsquedas directas aun con millones de filas.
+ESQUEMA_HISTORIAL = '''
+CREATE TABLE IF NOT EXISTS corridas (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS historial (
+    codigo TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    run_id INTEGER NOT NULL,
+    mantisa INTEGER NOT NULL,
+    exponente INTEGER NOT NULL,
+    PRIMARY KEY (codigo, timestamp)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_historial_timestamp ON historial (timestamp);
+'''
+
+# Publicación por deltas: "publicado" guarda la última tabla publicada y "deltas" los
+# cambios de cada publicación (valor NULL = divisa eliminada), numerados por secuencia.
+ESQUEMA_DELTAS = '''
+CREATE TABLE IF NOT EXISTS publicaciones (
+    secuencia INTEGER PRIMARY KEY,
+    timestamp INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS publicado (
+    codigo TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS deltas (
+    secuencia INTEGER NOT NULL,
+    codigo TEXT NOT NULL,
+    valor TEXT,
+    PRIMARY KEY (secuencia, codigo)
+) WITHOUT ROWID;
+'''
+# Publicaciones incluidas en datos_delta.json: un cliente atrasado hasta esta
+# cantidad de corridas se pone al día sin descargar la tabla completa
+VENTANA_DELTAS = 24
+
+# --- Exportación Parquet del historial (requiere pyarrow) ---
+# Directorio con una partición por día (fecha=AAAA-MM-DD/) para análisis con pandas/pyarrow
+DIRECTORIO_PARQUET = "historial_parquet"
+# Columna valor como decimal128 exacto: 38 dígitos, ESCALA_PARQUET de ellos decimales
+PRECISION_PARQUET = 38
+ESCALA_PARQUET = 20
+COMPRESION_PARQUET = "zstd"
+# Última fila del historial exportada a cada destino, para agregar solo lo nuevo en cada corrida
+ESQUEMA_EXPORTACIONES = '''
+CREATE TABLE IF NOT EXISTS marcas_exportacion (
+    destino TEXT PRIMARY KEY,
+    hasta INTEGER NOT NULL
+) WITHOUT ROWID;
+'''
+
+# Snapshot binario (datos.bin) para lectores con mmap, little-endian:
+# cabecera de 32 bytes: magic, versión, ancho de código, N, timestamp, generación (+4 de relleno),
+# luego N códigos ASCII de ANCHO_CODIGO bytes ordenados y N valores float64 (valor en USD)
+MAGIC_SNAPSHOT = b"DIVB"
+VERSION_SNAPSHOT = 1
+ANCHO_CODIGO = 8
+CABECERA_SNAPSHOT = struct.Struct("<4sHHIqQ4x")
+
+
+def decimal_a_compacto(valor: Decimal) -> Tuple[int, int]:
+    """
+    Convierte un Decimal en (mantisa, exponente) enteros.
+    Es exacto hasta 18 dígitos significativos (lo que cabe en un INTEGER de SQLite);
+    por encima se redondea a 18.
+    """
+    with localcontext() as ctx:
+        ctx.prec = 18
+        valor = +valor
+    signo, digitos, exponente = valor.normalize().as_tuple()
+    mantisa = int(''.join(map(str, digitos))) if digitos else 0
+    return (-mantisa if signo else mantisa), exponente
+
+
+def compacto_a_decimal(mantisa: int, exponente: int) -> Decimal:
+    """Inverso de decimal_a_compacto."""
+    return Decimal(mantisa).scaleb(exponente)
+
 class DatabaseManager:
-    def __init__(self, db_path: str = "Almacenamiento/divisas.db"):
+    def __init__(self, db_path: str = "Almacenamiento/divisas.db", historial_path: str = None):
         self.db_path = db_path
+        # Por defecto NOMBRE_DB_HISTORIAL en el mismo directorio que divisas.db
+        self.historial_path = historial_path or os.path.join(os.path.dirname(db_path), NOMBRE_DB_HISTORIAL)
         self._init_db()
 
     def _init_db(self):
@@ -19,19 +146,52 @@ class DatabaseManager:
             valor_actual TEXT NOT NULL,
             valor_comparacion TEXT,
             total_calculado TEXT,
-            fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP
+            fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+            desactualizada INTEGER NOT NULL DEFAULT 0
         )
         '''
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute(query)
+                # Bases creadas antes de la marca de frescura
+                columnas = {fila[1] for fila in cursor.execute('PRAGMA table_info(divisas)')}
+                if "desactualizada" not in columnas:
+                    cursor.execute('ALTER TABLE divisas ADD COLUMN desactualizada INTEGER NOT NULL DEFAULT 0')
+                cursor.executescript(ESQUEMA_DELTAS)
                 conn.commit()
+            with sqlite3.connect(self.historial_path) as conn:
+                conn.executescript(ESQUEMA_HISTORIAL)
+                conn.executescript(ESQUEMA_EXPORTACIONES)
+                conn.commit()
+            self._migrar_historial()
             logger.info("Base de datos inicializada correctamente.")
         except Exception as e:
             logger.error(f"Error inicializando la base de datos: {e}")
             raise
 
+    def _migrar_historial(self):
+        """Mueve a la base del historial las tablas TABLAS_HISTORIAL que queden en divisas.db
+        (bases creadas cuando el historial vivía ahí) y compacta divisas.db."""
+        with closing(sqlite3.connect(self.db_path, isolation_level=None)) as conn:
+            existentes = {nombre for (nombre,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            tablas = [tabla for tabla in TABLAS_HISTORIAL if tabla in existentes]
+            if not tablas:
+                return
+            conn.execute("ATTACH DATABASE ? AS destino", (self.historial_path,))
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for tabla in tablas:
+                    conn.execute(f"INSERT OR IGNORE INTO destino.{tabla} SELECT * FROM main.{tabla}")
+                    conn.execute(f"DROP TABLE main.{tabla}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("DETACH DATABASE destino")
+            conn.execute("VACUUM")
+        logger.info(f"Tablas {', '.join(tablas)} migradas de {self.db_path} a {self.historial_path}.")
+
     def limpiar_tabla(self):
         """Borra todos los registros de la tabla divisas antes de una nueva actualización.
         Esto garantiza que datos.json solo contenga las divisas actualmente disponibles,
@@ -46,18 +206,19 @@ class DatabaseManager:
             logger.error(f"Error limpiando la tabla divisas: {e}")
             raise
 
-    def upsert_divisa(self, codigo: str, valor_actual: Decimal, valor_comparacion: str = "", total_calculado: Decimal = None):
-        """Inserta o actualiza una divisa en la base de datos conservando precisión decimal como TEXT."""
-        query = '''
-        INSERT INTO divisas (codigo, valor_actual, valor_comparacion, total_calculado, fecha_actualizacion)
-        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    QUERY_UPSERT = '''
+        INSERT INTO divisas (codigo, valor_actual, valor_comparacion, total_calculado, fecha_actualizacion, desactualizada)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, 0)
         ON CONFLICT(codigo) DO UPDATE SET
             valor_actual = excluded.valor_actual,
             valor_comparacion = excluded.valor_comparacion,
             total_calculado = excluded.total_calculado,
             fecha_actualizacion = CURRENT_TIMESTAMP
         '''
-        
+
+    @staticmethod
+    def _parametros_upsert(codigo: str, valor_actual: Decimal, valor_comparacion: str = "", total_calculado: Decimal = None) -> tuple:
+        """Parámetros del upsert con los decimales guardados como TEXT."""
         # Guardar como cadena (TEXT) para mantener la precisión decimal intacta
         val_act_str = f"{valor_actual:.16f}".rstrip('0').rstrip('.') if valor_actual is not None else None
         
@@ -67,39 +228,529 @@ class DatabaseManager:
         else:
              total_calc_str = val_act_str
 
+        return (codigo, val_act_str, valor_comparacion, total_calc_str)
+
+    def upsert_divisa(self, codigo: str, valor_actual: Decimal, valor_comparacion: str = "", total_calculado: Decimal = None):
+        """Inserta o actualiza una divisa en la base de datos conservando precisión decimal como TEXT."""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
-                cursor.execute(query, (codigo, val_act_str, valor_comparacion, total_calc_str))
+                cursor.execute(self.QUERY_UPSERT, self._parametros_upsert(codigo, valor_actual, valor_comparacion, total_calculado))
                 conn.commit()
             logger.debug(f"Divisa {codigo} guardada exitosamente.")
         except Exception as e:
             logger.error(f"Error guardando la divisa {codigo}: {e}")
             raise
 
-    def export_to_json(self, output_path: str = "datos.json"):
-        """Exporta la tabla completa a un archivo JSON para ser leída por GitHub Pages."""
-        query = 'SELECT codigo, valor_actual, valor_comparacion, total_calculado, fecha_actualizacion FROM divisas'
-        data = []
+    @contextmanager
+    def sesion_lote(self, db_path: str = None) -> Iterator[sqlite3.Connection]:
+        """
+        Conexión única con una transacción explícita (BEGIN IMMEDIATE ... COMMIT).
+        Todo lo ejecutado dentro del bloque se confirma de una vez con un solo fsync,
+        o se revierte completo si ocurre un error. db_path permite abrirla sobre la
+        base del historial (por defecto, divisas.db).
+        """
+        with closing(sqlite3.connect(db_path or self.db_path, isolation_level=None)) as conn:
+            for pragma in PRAGMAS_ESCRITURA:
+                conn.execute(pragma)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            # Volcar el WAL al archivo principal para que la base quede completa por sí sola
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def upsert_many(self, divisas: List[Dict], reemplazar: bool = False, historial: bool = False,
+                    conservar: Iterable[str] = ()) -> int:
+        """
+        Inserta o actualiza varias divisas en una sola transacción.
+        Cada elemento tiene las claves de upsert_divisa (codigo, valor_actual,
+        valor_comparacion y opcionalmente total_calculado).
+        Con reemplazar=True la tabla se vacía dentro de la misma transacción, así los
+        lectores nunca ven la tabla vacía: ven la versión anterior o la nueva completa;
+        las filas de `conservar` (códigos como "EUR-USD") se mantienen intactas.
+        Sin reemplazar, las divisas se fusionan con las filas existentes y el resto se conserva.
+        Con historial=True los valores se registran además como una nueva corrida del historial
+        (en su base, con una transacción propia una vez confirmada la de divisas).
+        Retorna cuántas filas cambiaron de valor (nuevas, modificadas o eliminadas al reemplazar).
+        """
+        parametros = [
+            self._parametros_upsert(d["codigo"], d["valor_actual"], d.get("valor_comparacion", ""), d.get("total_calculado"))
+            for d in divisas
+        ]
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                cursor.execute(query)
-                rows = cursor.fetchall()
-
-                for row in rows:
-                    data.append({
-                        "codigo": row["codigo"],
-                        "valor_actual": row["valor_actual"],
-                        "valor_comparacion": row["valor_comparacion"],
-                        "total_calculado": row["total_calculado"],
-                        "fecha_actualizacion": row["fecha_actualizacion"]
-                    })
-
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
-            logger.info(f"Datos exportados a {output_path} exitosamente. Total registros: {len(data)}")
+            with METRICAS.cronometro("bd_segundos", operacion="upsert_many"), self.sesion_lote() as conn:
+                previos = dict(conn.execute('SELECT codigo, valor_actual FROM divisas'))
+                cambios = sum(1 for codigo, valor, *_ in parametros if previos.get(codigo) != valor)
+                if reemplazar:
+                    mantener = {codigo for codigo, *_ in parametros} | set(conservar)
+                    eliminadas = [(codigo,) for codigo in previos if codigo not in mantener]
+                    cambios += len(eliminadas)
+                    conn.executemany('DELETE FROM divisas WHERE codigo = ?', eliminadas)
+                conn.executemany(self.QUERY_UPSERT, parametros)
+            if historial:
+                self.registrar_historial(divisas)
+            logger.info(
+                f"{len(parametros)} divisas guardadas en una transacción{' (tabla reemplazada)' if reemplazar else ''}; "
+                f"{cambios} cambiaron de valor."
+            )
+            return cambios
+        except Exception as e:
+            logger.error(f"Error guardando el lote de divisas: {e}")
+            raise
+
+    def valores_actuales(self) -> Dict[str, Decimal]:
+        """Valores publicados en la tabla divisas: {codigo sin -USD: valor}."""
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            return {
+                codigo.replace("-USD", ""): Decimal(valor)
+                for codigo, valor in conn.execute('SELECT codigo, valor_actual FROM divisas')
+            }
+
+    def marcar_desactualizadas(self, antiguedad: int = ANTIGUEDAD_DESACTUALIZADA, ahora: int = None) -> int:
+        """
+        Marca (desactualizada = 1) las filas sin actualizarse hace más de `antiguedad`
+        segundos y desmarca las demás. Los upserts no tocan la marca de las filas
+        existentes, así la marca guardada es la última exportada y los cambios de
+        frescura se detectan aquí. Retorna cuántas filas cambiaron de marca.
+        """
+        ahora = int(time.time()) if ahora is None else ahora
+        try:
+            with self.sesion_lote() as conn:
+                cambios = conn.execute('''
+                    UPDATE divisas SET desactualizada = NOT desactualizada
+                    WHERE desactualizada != (fecha_actualizacion < datetime(?, 'unixepoch'))
+                ''', (ahora - antiguedad,)).rowcount
+                total = conn.execute('SELECT COUNT(*) FROM divisas WHERE desactualizada').fetchone()[0]
+            METRICAS.fijar("divisas_desactualizadas", total)
+            if total:
+                logger.info(f"{total} divisas sin actualizar hace más de {antiguedad}s quedan marcadas como desactualizadas.")
+            return cambios
+        except Exception as e:
+            logger.error(f"Error marcando las divisas desactualizadas: {e}")
+            raise
+
+    def divisas_desactualizadas(self, antiguedad: int = ANTIGUEDAD_DESACTUALIZADA, ahora: int = None) -> List[str]:
+        """Códigos (sin -USD) de las filas sin actualizarse hace más de `antiguedad` segundos."""
+        ahora = int(time.time()) if ahora is None else ahora
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            return [codigo.replace("-USD", "") for (codigo,) in conn.execute(
+                "SELECT codigo FROM divisas WHERE fecha_actualizacion < datetime(?, 'unixepoch') ORDER BY codigo",
+                (ahora - antiguedad,)
+            )]
+
+    def _insertar_historial(self, conn: sqlite3.Connection, divisas: List[Dict], timestamp: int = None) -> int:
+        """Registra una corrida y sus valores en el historial. Retorna el run_id."""
+        timestamp = int(time.time()) if timestamp is None else timestamp
+        run_id = conn.execute('INSERT INTO corridas (timestamp) VALUES (?)', (timestamp,)).lastrowid
+        conn.executemany(
+            'INSERT OR REPLACE INTO historial (codigo, timestamp, run_id, mantisa, exponente) VALUES (?, ?, ?, ?, ?)',
+            [(d["codigo"], timestamp, run_id, *decimal_a_compacto(d["valor_actual"])) for d in divisas]
+        )
+        return run_id
+
+    def registrar_historial(self, divisas: List[Dict], timestamp: int = None) -> int:
+        """Registra una corrida en el historial en su propia transacción. Retorna el run_id."""
+        try:
+            with self.sesion_lote(self.historial_path) as conn:
+                run_id = self._insertar_historial(conn, divisas, timestamp)
+            logger.info(f"Corrida {run_id} registrada en el historial ({len(divisas)} valores).")
+            return run_id
+        except Exception as e:
+            logger.error(f"Error registrando el historial: {e}")
+            raise
+
+    def aplicar_retencion(self, ahora: int = None):
+        """
+        Reduce la resolución del historial: conserva el último valor de cada hora
+        durante RETENCION_HORARIA_DIAS y el último de cada día para lo anterior.
+        Solo compacta horas y días ya cerrados.
+        """
+        ahora = int(time.time()) if ahora is None else ahora
+        inicio_hora = ahora - ahora % 3600
+        limite_diario = ahora - RETENCION_HORARIA_DIAS * 86400
+        limite_diario -= limite_diario % 86400
+        # Se borra cada fila que tenga otra posterior de la misma divisa dentro de su periodo
+        # (búsqueda por la clave primaria, sin agrupar toda la tabla)
+        query = '''
+        DELETE FROM historial
+        WHERE timestamp >= :desde AND timestamp < :hasta
+          AND EXISTS (
+              SELECT 1 FROM historial AS posterior
+              WHERE posterior.codigo = historial.codigo
+                AND posterior.timestamp > historial.timestamp
+                AND posterior.timestamp < MIN((historial.timestamp / :periodo + 1) * :periodo, :hasta)
+          )
+        '''
+        try:
+            with METRICAS.cronometro("bd_segundos", operacion="retencion"), self.sesion_lote(self.historial_path) as conn:
+                horarios = conn.execute(query, {"desde": limite_diario, "hasta": inicio_hora, "periodo": 3600}).rowcount
+                diarios = conn.execute(query, {"desde": 0, "hasta": limite_diario, "periodo": 86400}).rowcount
+                conn.execute('DELETE FROM corridas WHERE run_id NOT IN (SELECT DISTINCT run_id FROM historial)')
+            logger.info(f"Retención del historial aplicada: {horarios} valores horarios y {diarios} diarios compactados.")
+        except Exception as e:
+            logger.error(f"Error aplicando la retención del historial: {e}")
+            raise
+
+    def historial_rango(self, codigo: str, desde: int, hasta: int) -> List[Tuple[int, Decimal]]:
+        """Valores [(timestamp, valor)] de una divisa entre dos timestamps (inclusive), en orden cronológico."""
+        query = '''
+        SELECT timestamp, mantisa, exponente FROM historial
+        WHERE codigo = ? AND timestamp BETWEEN ? AND ?
+        ORDER BY timestamp
+        '''
+        with closing(sqlite3.connect(self.historial_path)) as conn:
+            rows = conn.execute(query, (codigo, desde, hasta)).fetchall()
+        return [(ts, compacto_a_decimal(m, e)) for ts, m, e in rows]
+
+    def historial_a_fecha(self, codigo: str, timestamp: int) -> Optional[Tuple[int, Decimal]]:
+        """Último valor (timestamp, valor) de una divisa vigente en el timestamp dado."""
+        query = '''
+        SELECT timestamp, mantisa, exponente FROM historial
+        WHERE codigo = ? AND timestamp <= ?
+        ORDER BY timestamp DESC LIMIT 1
+        '''
+        with closing(sqlite3.connect(self.historial_path)) as conn:
+            row = conn.execute(query, (codigo, timestamp)).fetchone()
+        return (row[0], compacto_a_decimal(row[1], row[2])) if row else None
+
+    def tabla_a_fecha(self, timestamp: int) -> Dict[str, Tuple[int, Decimal]]:
+        """Último valor de cada divisa vigente en el timestamp dado: {codigo: (timestamp, valor)}."""
+        # Recorre los códigos distintos saltando por la clave primaria en vez de leer toda la tabla
+        query = '''
+        WITH RECURSIVE codigos(codigo) AS (
+            SELECT MIN(codigo) FROM historial
+            UNION ALL
+            SELECT (SELECT MIN(codigo) FROM historial WHERE codigo > codigos.codigo)
+            FROM codigos WHERE codigos.codigo IS NOT NULL
+        )
+        SELECT h.codigo, h.timestamp, h.mantisa, h.exponente
+        FROM codigos c JOIN historial h ON h.codigo = c.codigo
+        WHERE h.timestamp = (SELECT MAX(timestamp) FROM historial WHERE codigo = c.codigo AND timestamp <= ?)
+        '''
+        with closing(sqlite3.connect(self.historial_path)) as conn:
+            rows = conn.execute(query, (timestamp,)).fetchall()
+        return {codigo: (ts, compacto_a_decimal(m, e)) for codigo, ts, m, e in rows}
+
+    def export_to_json(self, output_path: str = "datos.json", formato: str = "lista",
+                       compacto: bool = False, comprimir: bool = False, secuencia: int = None):
+        """
+        Exporta la tabla completa a un archivo JSON para ser leída por GitHub Pages.
+        formato="lista" escribe la lista de registros de siempre (con la marca desactualizada
+        de cada fila); formato="mapa" escribe
+        {"EUR": "1.08", ...} para que los SDKs busquen por código directamente.
+        Con secuencia (la que retorna export_delta) el mapa incluye "secuencia": N, así
+        un cliente de deltas obtiene la tabla base y su secuencia en una sola descarga.
+        Las filas se escriben una a una desde el cursor (sin armar la lista en memoria)
+        en un archivo temporal que reemplaza al destino de forma atómica.
+        Con compacto=True se omiten indentación y espacios; con comprimir=True se
+        generan también los hermanos .gz (y .br si está instalado brotli).
+        """
+        if formato not in ("lista", "mapa"):
+            raise ValueError(f"Formato de exportación desconocido: {formato}")
+        query = 'SELECT codigo, valor_actual, valor_comparacion, total_calculado, fecha_actualizacion, desactualizada FROM divisas'
+        try:
+            with METRICAS.cronometro("export_segundos", formato=formato):
+                with closing(sqlite3.connect(self.db_path)) as conn:
+                    conn.row_factory = sqlite3.Row
+                    cursor = conn.execute(query)
+                    with _escritura_atomica(output_path, 'w', encoding='utf-8') as f:
+                        if formato == "lista":
+                            total = _escribir_lista_json(f, cursor, compacto)
+                        else:
+                            total = _escribir_mapa_json(f, cursor, compacto, secuencia)
+
+                if comprimir:
+                    _escribir_comprimidos(output_path)
+            METRICAS.fijar("export_bytes", os.path.getsize(output_path), archivo=os.path.basename(output_path))
+            logger.info(f"Datos exportados a {output_path} exitosamente ({formato}). Total registros: {total}")
         except Exception as e:
             logger.error(f"Error exportando a JSON: {e}")
             raise
+
+    def export_delta(self, output_path: str = "datos_delta.json", ventana: int = VENTANA_DELTAS) -> int:
+        """
+        Compara la tabla divisas con la última publicada y, si hubo cambios, registra una
+        nueva publicación con solo las divisas que cambiaron. Escribe output_path con la
+        secuencia vigente y los deltas de las últimas `ventana` publicaciones:
+        {"secuencia": N, "deltas": [{"secuencia": k, "timestamp": t, "cambios": {"EUR": "1.08"}, "eliminadas": []}, ...]}
+        Los valores son absolutos, así que aplicar un delta dos veces no altera la tabla.
+        Retorna la secuencia vigente.
+        """
+        try:
+            with METRICAS.cronometro("export_segundos", formato="delta"), self.sesion_lote() as conn:
+                actual = {
+                    codigo.replace("-USD", ""): valor
+                    for codigo, valor in conn.execute('SELECT codigo, valor_actual FROM divisas')
+                }
+                publicado = dict(conn.execute('SELECT codigo, valor FROM publicado'))
+                cambios = [(codigo, valor) for codigo, valor in actual.items() if publicado.get(codigo) != valor]
+                cambios += [(codigo, None) for codigo in publicado if codigo not in actual]
+
+                secuencia = conn.execute('SELECT COALESCE(MAX(secuencia), 0) FROM publicaciones').fetchone()[0]
+                if cambios:
+                    secuencia = conn.execute(
+                        'INSERT INTO publicaciones (timestamp) VALUES (?)', (int(time.time()),)
+                    ).lastrowid
+                    conn.executemany(
+                        'INSERT INTO deltas (secuencia, codigo, valor) VALUES (?, ?, ?)',
+                        [(secuencia, codigo, valor) for codigo, valor in cambios]
+                    )
+                    conn.execute('DELETE FROM publicado')
+                    conn.executemany('INSERT INTO publicado (codigo, valor) VALUES (?, ?)', actual.items())
+                    conn.execute('DELETE FROM deltas WHERE secuencia <= ?', (secuencia - ventana,))
+                    conn.execute('DELETE FROM publicaciones WHERE secuencia <= ?', (secuencia - ventana,))
+
+                filas = conn.execute('''
+                    SELECT p.secuencia, p.timestamp, d.codigo, d.valor
+                    FROM publicaciones p JOIN deltas d ON d.secuencia = p.secuencia
+                    ORDER BY p.secuencia, d.codigo
+                ''').fetchall()
+
+            deltas = {}
+            for sec, timestamp, codigo, valor in filas:
+                delta = deltas.setdefault(sec, {"secuencia": sec, "timestamp": timestamp, "cambios": {}, "eliminadas": []})
+                if valor is None:
+                    delta["eliminadas"].append(codigo)
+                else:
+                    delta["cambios"][codigo] = valor
+
+            with _escritura_atomica(output_path, 'w', encoding='utf-8') as f:
+                json.dump({"secuencia": secuencia, "deltas": list(deltas.values())}, f,
+                          ensure_ascii=False, separators=(',', ':'))
+            METRICAS.fijar("export_bytes", os.path.getsize(output_path), archivo=os.path.basename(output_path))
+            logger.info(f"Delta {secuencia} publicado en {output_path}: {len(cambios)} divisas cambiaron.")
+            return secuencia
+        except Exception as e:
+            logger.error(f"Error exportando el delta: {e}")
+            raise
+
+    def export_binario(self, output_path: str = "datos.bin") -> int:
+        """
+        Publica el snapshot binario de tamaño fijo (ver CABECERA_SNAPSHOT) para lectores
+        que lo mapean con mmap sin parsear JSON. La generación se incrementa en cada
+        publicación y el archivo se reemplaza de forma atómica. Si no puede reemplazarse
+        (en Windows, mientras un lector lo tiene mapeado) se conserva el publicado y la
+        corrida sigue con las demás exportaciones. Retorna la generación publicada.
+        """
+        try:
+            inicio = time.perf_counter()
+            with closing(sqlite3.connect(self.db_path)) as conn:
+                filas = conn.execute('SELECT codigo, valor_actual FROM divisas').fetchall()
+            valores = sorted((codigo.replace("-USD", ""), float(valor)) for codigo, valor in filas)
+            generacion = _generacion_snapshot(output_path) + 1
+
+            try:
+                with _escritura_atomica(output_path, 'wb') as f:
+                    f.write(CABECERA_SNAPSHOT.pack(MAGIC_SNAPSHOT, VERSION_SNAPSHOT, ANCHO_CODIGO,
+                                                   len(valores), int(time.time()), generacion))
+                    f.write(b"".join(codigo.encode('ascii')[:ANCHO_CODIGO].ljust(ANCHO_CODIGO, b"\0") for codigo, _ in valores))
+                    f.write(struct.pack(f"<{len(valores)}d", *(valor for _, valor in valores)))
+            except OSError as e:
+                logger.error(f"No se pudo publicar el snapshot binario {output_path} ({e}); "
+                             f"se conserva la generación {generacion - 1}.")
+                METRICAS.contar("export_fallidos_total", formato="binario")
+                return generacion - 1
+            METRICAS.observar("export_segundos", time.perf_counter() - inicio, formato="binario")
+            METRICAS.fijar("export_bytes", os.path.getsize(output_path), archivo=os.path.basename(output_path))
+            logger.info(f"Snapshot binario {output_path} publicado (generación {generacion}, {len(valores)} divisas).")
+            return generacion
+        except Exception as e:
+            logger.error(f"Error exportando el snapshot binario: {e}")
+            raise
+
+    def export_parquet(self, directorio: str = DIRECTORIO_PARQUET) -> int:
+        """
+        Agrega a `directorio` las filas del historial posteriores a la última exportación,
+        en Parquet particionado por día (directorio/fecha=AAAA-MM-DD/) con columnas
+        codigo (diccionario), timestamp (UTC) y valor (decimal128 exacto).
+        Cada corrida escribe un archivo parte-<timestamp>.parquet en su partición y los
+        días ya cerrados se compactan en un único dia.parquet. El directorio se lee con
+        pyarrow.parquet.read_table(directorio, columns=[...], filters=[...]) o pandas.read_parquet.
+        Conserva todo lo exportado aunque la retención compacte después el historial.
+        Requiere pyarrow: si no está instalado no hace nada. Retorna las filas agregadas.
+        """
+        if pq is None:
+            logger.info("pyarrow no está instalado: se omite la exportación Parquet del historial.")
+            return 0
+        destino = os.path.normpath(directorio)
+        try:
+            with METRICAS.cronometro("export_segundos", formato="parquet"):
+                with closing(sqlite3.connect(self.historial_path)) as conn:
+                    marca = conn.execute(
+                        'SELECT hasta FROM marcas_exportacion WHERE destino = ?', (destino,)
+                    ).fetchone()
+                    filas = conn.execute('''
+                        SELECT codigo, timestamp, mantisa, exponente FROM historial
+                        WHERE timestamp > ? ORDER BY timestamp, codigo
+                    ''', (marca[0] if marca else -1,)).fetchall()
+
+                por_dia = {}
+                for codigo, timestamp, mantisa, exponente in filas:
+                    dia = time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+                    por_dia.setdefault(dia, []).append((codigo, timestamp, compacto_a_decimal(mantisa, exponente)))
+                for dia, filas_dia in por_dia.items():
+                    particion = os.path.join(destino, f"fecha={dia}")
+                    os.makedirs(particion, exist_ok=True)
+                    # El nombre depende de la primera fila: si la marca no llegó a guardarse,
+                    # la corrida siguiente reescribe el mismo archivo en vez de duplicarlo
+                    _escribir_parquet(os.path.join(particion, f"parte-{filas_dia[0][1]}.parquet"), filas_dia)
+                compactados = _compactar_parquet(destino, time.strftime("%Y-%m-%d", time.gmtime()))
+
+                if filas:
+                    with self.sesion_lote(self.historial_path) as conn:
+                        conn.execute('''
+                            INSERT INTO marcas_exportacion (destino, hasta) VALUES (?, ?)
+                            ON CONFLICT(destino) DO UPDATE SET hasta = excluded.hasta
+                        ''', (destino, filas[-1][1]))
+            METRICAS.contar("parquet_filas_total", len(filas))
+            logger.info(
+                f"Historial Parquet en {destino}: {len(filas)} filas agregadas en {len(por_dia)} particiones"
+                f"{f', {compactados} días compactados' if compactados else ''}."
+            )
+            return len(filas)
+        except Exception as e:
+            logger.error(f"Error exportando el historial a Parquet: {e}")
+            raise
+
+
+def _escribir_parquet(ruta: str, filas: List[Tuple[str, int, Decimal]]):
+    """Escribe [(codigo, timestamp, valor), ...] ordenadas por código y fecha (mejores estadísticas por columna)."""
+    filas = sorted(filas)
+    with localcontext() as ctx:
+        ctx.prec = PRECISION_PARQUET
+        cuanto = Decimal(1).scaleb(-ESCALA_PARQUET)
+        valores = [valor.quantize(cuanto) for _, _, valor in filas]
+    tabla = pa.table({
+        "codigo": pa.array([codigo for codigo, _, _ in filas], pa.string()).dictionary_encode(),
+        "timestamp": pa.array([timestamp for _, timestamp, _ in filas], pa.timestamp("s", tz="UTC")),
+        "valor": pa.array(valores, pa.decimal128(PRECISION_PARQUET, ESCALA_PARQUET)),
+    })
+    with _escritura_atomica(ruta, 'wb') as f:
+        pq.write_table(tabla, f, compression=COMPRESION_PARQUET)
+
+
+def _segundos_epoch(columna) -> List[int]:
+    """Timestamps de una columna leída de Parquet (que los guarda en milisegundos) como segundos epoch."""
+    return columna.cast(pa.timestamp("s", tz="UTC")).cast(pa.int64()).to_pylist()
+
+
+def _compactar_parquet(destino: str, hoy: str) -> int:
+    """
+    Une en dia.parquet los archivos por corrida de las particiones anteriores a `hoy`.
+    Las filas repetidas (codigo, timestamp) se escriben una sola vez, así una compactación
+    interrumpida se completa sin duplicar en la siguiente. Retorna los días compactados.
+    """
+    compactados = 0
+    if not os.path.isdir(destino):
+        return 0
+    for nombre in sorted(os.listdir(destino)):
+        if not nombre.startswith("fecha=") or nombre[len("fecha="):] >= hoy:
+            continue
+        particion = os.path.join(destino, nombre)
+        partes = sorted(n for n in os.listdir(particion) if n.startswith("parte-") and n.endswith(".parquet"))
+        if not partes:
+            continue
+        archivos = partes + (["dia.parquet"] if os.path.exists(os.path.join(particion, "dia.parquet")) else [])
+        filas = {}
+        for archivo in archivos:
+            tabla = pq.read_table(os.path.join(particion, archivo), columns=["codigo", "timestamp", "valor"])
+            filas.update(zip(
+                zip(tabla.column("codigo").to_pylist(), _segundos_epoch(tabla.column("timestamp"))),
+                tabla.column("valor").to_pylist()
+            ))
+        _escribir_parquet(os.path.join(particion, "dia.parquet"),
+                          [(codigo, timestamp, valor) for (codigo, timestamp), valor in filas.items()])
+        for parte in partes:
+            os.remove(os.path.join(particion, parte))
+        compactados += 1
+    return compactados
+
+
+def _generacion_snapshot(ruta: str) -> int:
+    """Generación del snapshot binario publicado en ruta (0 si no existe o no es válido)."""
+    try:
+        with open(ruta, 'rb') as f:
+            magic, _, _, _, _, generacion = CABECERA_SNAPSHOT.unpack(f.read(CABECERA_SNAPSHOT.size))
+        return generacion if magic == MAGIC_SNAPSHOT else 0
+    except (OSError, struct.error):
+        return 0
+
+
+@contextmanager
+def _escritura_atomica(ruta: str, modo: str, **kwargs):
+    """Escribe en un temporal del mismo directorio y lo renombra sobre ruta al terminar."""
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    fd, temporal = tempfile.mkstemp(prefix=".tmp_", dir=directorio)
+    try:
+        with os.fdopen(fd, modo, **kwargs) as f:
+            yield f
+        # mkstemp crea el archivo con permisos 0600; los exportados deben ser legibles
+        os.chmod(temporal, 0o644)
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _escribir_lista_json(f, filas, compacto: bool) -> int:
+    """Escribe [ {...}, ... ] fila a fila con el mismo texto que json.dump(indent=4) cuando no es compacto."""
+    total = 0
+    f.write("[")
+    for row in filas:
+        registro = {
+            "codigo": row["codigo"],
+            "valor_actual": row["valor_actual"],
+            "valor_comparacion": row["valor_comparacion"],
+            "total_calculado": row["total_calculado"],
+            "fecha_actualizacion": row["fecha_actualizacion"],
+            "desactualizada": bool(row["desactualizada"])
+        }
+        if compacto:
+            f.write(("," if total else "") + json.dumps(registro, ensure_ascii=False, separators=(',', ':')))
+        else:
+            texto = json.dumps(registro, indent=4, ensure_ascii=False).replace("\n", "\n    ")
+            f.write((",\n    " if total else "\n    ") + texto)
+        total += 1
+    f.write("]" if compacto or not total else "\n]")
+    return total
+
+
+def _escribir_mapa_json(f, filas, compacto: bool, secuencia: int = None) -> int:
+    """Escribe {"EUR": "1.08", ...} fila a fila (código sin el sufijo -USD), precedido de
+    "secuencia": N si se indica. Retorna la cantidad de divisas escritas."""
+    separador = "," if compacto else ",\n    "
+    dos_puntos = ":" if compacto else ": "
+    escritas = 0
+
+    def escribir(clave: str, valor: str):
+        nonlocal escritas
+        f.write((separador if escritas else "" if compacto else "\n    ") + clave + dos_puntos + valor)
+        escritas += 1
+
+    f.write("{")
+    if secuencia is not None:
+        escribir('"secuencia"', str(int(secuencia)))
+    total = 0
+    for row in filas:
+        escribir(json.dumps(row["codigo"].replace("-USD", ""), ensure_ascii=False),
+                 json.dumps(row["valor_actual"], ensure_ascii=False))
+        total += 1
+    f.write("}" if compacto or not escritas else "\n}")
+    return total
+
+
+def _escribir_comprimidos(ruta: str):
+    """Genera ruta.gz (y ruta.br si brotli está disponible) a partir del archivo ya exportado."""
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    # mtime=0 deja el .gz idéntico entre corridas si el contenido no cambió
+    with _escritura_atomica(ruta + ".gz", 'wb') as f:
+        f.write(gzip.compress(contenido, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with _escritura_atomica(ruta + ".br", 'wb') as f:
+            f.write(brotli.compress(contenido, quality=11))
@@ -0,0 +1,202 @@
+import sqlite3
+import hashlib
+import threading
+import time
+import logging
+from decimal import Decimal
+from typing import Optional, Tuple
+from modulos.Comparacion_front import CLASE_PRECIO
+from modulos.Metricas import METRICAS
+
+logger = logging.getLogger(__name__)
+
+# --- Configuración de la caché de descargas ---
+# Antigüedad máxima (segundos) de una entrada antes de dejar de usarla
+TTL_CACHE = 24 * 3600
+# Entradas máximas en disco; se desalojan las usadas hace más tiempo
+MAX_ENTRADAS_CACHE = 1000
+# Caracteres tomados desde la clase del precio para calcular la huella de la región
+LONGITUD_REGION = 256
+
+
+def huella_region_precio(html: str) -> Optional[str]:
+    """Hash de la región del HTML que contiene el precio (None si no aparece la clase)."""
+    pos = html.find(CLASE_PRECIO)
+    if pos == -1:
+        return None
+    region = html[pos:pos + LONGITUD_REGION].encode('utf-8')
+    return hashlib.blake2b(region, digest_size=16).hexdigest()
+
+
+class FetchCache:
+    """
+    Caché en disco (SQLite) de las descargas por URL.
+    Guarda los validadores HTTP (ETag / Last-Modified) para pedir las páginas de forma
+    condicional y la huella de la región del precio junto al valor ya parseado, de modo
+    que una página sin cambios (304 o misma huella) no se vuelve a parsear.
+    Las entradas se cargan en memoria al crear el objeto y se escriben con guardar().
+    """
+
+    def __init__(self, db_path: str = "Almacenamiento/cache_fetch.db",
+                 ttl: float = TTL_CACHE, max_entradas: int = MAX_ENTRADAS_CACHE):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._entradas = {}
+        self.aciertos_304 = 0
+        self.aciertos_huella = 0
+        self.fallos = 0
+        self._init_db()
+        self._cargar()
+
+    def _init_db(self):
+        query = '''
+        CREATE TABLE IF NOT EXISTS cache_fetch (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            huella TEXT,
+            codigo TEXT,
+            valor_comparacion TEXT,
+            valor_actual TEXT,
+            guardado REAL NOT NULL,
+            ultimo_uso REAL NOT NULL
+        )
+        '''
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(query)
+        except Exception as e:
+            logger.error(f"Error inicializando la caché de descargas: {e}")
+            raise
+
+    def _cargar(self):
+        limite = time.time() - self.ttl
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            for row in conn.execute('SELECT * FROM cache_fetch WHERE guardado >= ?', (limite,)):
+                self._entradas[row["url"]] = dict(row)
+
+    def _vigente(self, url: str) -> Optional[dict]:
+        entrada = self._entradas.get(url)
+        if entrada and entrada["guardado"] >= time.time() - self.ttl:
+            return entrada
+        return None
+
+    @staticmethod
+    def _aplicar_validadores(entrada: dict):
+        """Pasa los validadores de la última respuesta 200 a la entrada."""
+        if "etag_nuevo" in entrada or "last_modified_nuevo" in entrada:
+            entrada["etag"] = entrada.pop("etag_nuevo", None)
+            entrada["last_modified"] = entrada.pop("last_modified_nuevo", None)
+
+    @staticmethod
+    def _divisa_data(entrada: dict) -> Optional[dict]:
+        if not entrada.get("valor_actual"):
+            return None
+        return {
+            "codigo": entrada["codigo"],
+            "valor_comparacion": entrada["valor_comparacion"],
+            "valor_actual": Decimal(entrada["valor_actual"])
+        }
+
+    def cabeceras_condicionales(self, url: str) -> dict:
+        """Cabeceras If-None-Match / If-Modified-Since para una URL con valor en caché."""
+        with self._lock:
+            entrada = self._vigente(url)
+        if not entrada or not entrada.get("valor_actual"):
+            return {}
+        cabeceras = {}
+        if entrada.get("etag"):
+            cabeceras["If-None-Match"] = entrada["etag"]
+        if entrada.get("last_modified"):
+            cabeceras["If-Modified-Since"] = entrada["last_modified"]
+        return cabeceras
+
+    def registrar_validadores(self, url: str, etag: Optional[str], last_modified: Optional[str]):
+        """Recuerda los validadores de la última respuesta 200 (se persisten con guardar_resultado)."""
+        with self._lock:
+            entrada = self._entradas.setdefault(url, {"url": url, "guardado": 0.0, "ultimo_uso": 0.0})
+            entrada["etag_nuevo"] = etag
+            entrada["last_modified_nuevo"] = last_modified
+
+    def resultado_no_modificado(self, url: str) -> Optional[dict]:
+        """Valor en caché para una URL que respondió 304."""
+        with self._lock:
+            entrada = self._vigente(url)
+            if entrada is None:
+                self.fallos += 1
+                METRICAS.contar("cache_consultas_total", resultado="fallo")
+                return None
+            self.aciertos_304 += 1
+            METRICAS.contar("cache_consultas_total", resultado="acierto_304")
+            entrada["ultimo_uso"] = time.time()
+            return self._divisa_data(entrada)
+
+    def resultado_por_huella(self, url: str, html: str) -> Tuple[Optional[str], Optional[dict]]:
+        """
+        Calcula la huella de la región del precio y, si coincide con la guardada,
+        retorna también el valor en caché para evitar el parseo.
+        """
+        huella = huella_region_precio(html)
+        with self._lock:
+            entrada = self._vigente(url)
+            if huella is not None and entrada is not None and entrada.get("huella") == huella:
+                datos = self._divisa_data(entrada)
+                if datos is not None:
+                    self.aciertos_huella += 1
+                    METRICAS.contar("cache_consultas_total", resultado="acierto_huella")
+                    self._aplicar_validadores(entrada)
+                    entrada["ultimo_uso"] = time.time()
+                    return huella, datos
+            self.fallos += 1
+            METRICAS.contar("cache_consultas_total", resultado="fallo")
+            return huella, None
+
+    def guardar_resultado(self, url: str, huella: Optional[str], divisa_data: dict):
+        """Actualiza en memoria la entrada de una URL recién parseada."""
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.setdefault(url, {"url": url})
+            entrada["etag"] = entrada["last_modified"] = None
+            self._aplicar_validadores(entrada)
+            entrada.update({
+                "huella": huella,
+                "codigo": divisa_data["codigo"],
+                "valor_comparacion": divisa_data["valor_comparacion"],
+                "valor_actual": str(divisa_data["valor_actual"]),
+                "guardado": ahora,
+                "ultimo_uso": ahora
+            })
+
+    def guardar(self):
+        """Persiste las entradas, borra las vencidas y desaloja las menos usadas por encima del límite."""
+        columnas = ("url", "etag", "last_modified", "huella", "codigo",
+                    "valor_comparacion", "valor_actual", "guardado", "ultimo_uso")
+        with self._lock:
+            filas = [
+                tuple(entrada.get(c) for c in columnas)
+                for entrada in self._entradas.values() if entrada.get("valor_actual")
+            ]
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany(
+                    f'INSERT OR REPLACE INTO cache_fetch ({", ".join(columnas)}) VALUES ({", ".join("?" * len(columnas))})',
+                    filas
+                )
+                conn.execute('DELETE FROM cache_fetch WHERE guardado < ?', (time.time() - self.ttl,))
+                conn.execute(
+                    'DELETE FROM cache_fetch WHERE url NOT IN '
+                    '(SELECT url FROM cache_fetch ORDER BY ultimo_uso DESC LIMIT ?)',
+                    (self.max_entradas,)
+                )
+        except Exception as e:
+            logger.error(f"Error guardando la caché de descargas: {e}")
+
+    def log_estadisticas(self):
+        total = self.aciertos_304 + self.aciertos_huella + self.fallos
+        logger.info(
+            f"Caché de descargas: {self.aciertos_304} aciertos por 304, {self.aciertos_huella} por huella, "
+            f"{self.fallos} fallos ({(total - self.fallos) / total * 100 if total else 0:.1f}% de aciertos)."
+        )
@@ -1,27 +1,210 @@
 import re
+import mmap
+from functools import lru_cache
 from decimal import Decimal, InvalidOperation
+from html.parser import HTMLParser
 from bs4 import BeautifulSoup
 import logging
-from typing import List, Dict
+from typing import List, Dict, Optional, Union
+from modulos.Metricas import METRICAS
 
 logger = logging.getLogger(__name__)
 
+# Clase CSS que Google Finance usa para el precio actual principal
+CLASE_PRECIO = 'YMlKec fxKbKc'
+# Tamaño de los trozos con los que se alimenta el escáner dirigido
+TAMANO_TROZO_ESCANER = 4096
+# Atributos class de un documento HTML (para la comparación estructural)
+PATRON_CLASES = re.compile(rb'class="([^"]*)"')
+
+# --- Normalización de precios ---
+# Idioma en que se piden las páginas (las URLs usan hl=es): coma decimal y punto de miles.
+# None conserva la regla genérica: un único separador siempre es el decimal.
+IDIOMA_PRECIOS = "es"
+# Cadenas de precio distintas recordadas ya convertidas (se repiten entre corridas)
+TAMANO_CACHE_NUMEROS = 4096
+# Notación científica al final de la cifra ("1,23E-5"); exige dígitos a ambos lados
+# para no confundirse con letras de un código o símbolo de moneda ("1,08 EUR")
+PATRON_EXPONENTE = re.compile(r'(?<=\d)[eE]([-+]?\d+)(?!\d)')
+# Todo lo que no es dígito ni separador: símbolos de moneda, espacios, NBSP, signos
+PATRON_NO_NUMERICO = re.compile(r'[^\d.,]')
+
+
+class _FinDeEscaneo(Exception):
+    """Señal interna para cortar el parseo en cuanto se cierra el div del precio."""
+
+
+class _PrecioParser(HTMLParser):
+    """
+    Parser por eventos que solo lee el div del precio.
+    Se alimenta desde el '<' del candidato y aborta al cerrar el div (o si el
+    primer tag no es el div buscado), sin construir ningún árbol.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.encontrado = False
+        self.profundidad = 0
+        self.partes = []
+
+    def handle_starttag(self, tag, attrs):
+        if self.profundidad == 0:
+            if tag == 'div' and dict(attrs).get('class') == CLASE_PRECIO:
+                self.encontrado = True
+                self.profundidad = 1
+                return
+            raise _FinDeEscaneo()
+        if tag == 'div':
+            self.profundidad += 1
+
+    def handle_endtag(self, tag):
+        if self.profundidad and tag == 'div':
+            self.profundidad -= 1
+            if self.profundidad == 0:
+                raise _FinDeEscaneo()
+
+    def handle_data(self, data):
+        if self.profundidad:
+            self.partes.append(data)
+
+
+def extraer_precio_rapido(html: str) -> Optional[str]:
+    """
+    Busca el texto del primer div de precio sin parsear el documento completo.
+    Localiza la clase con str.find y solo pasa por HTMLParser, en trozos, el
+    fragmento que empieza en ese tag. Retorna None si no hay coincidencia.
+    """
+    pos = html.find(CLASE_PRECIO)
+    while pos != -1:
+        inicio = html.rfind('<', 0, pos)
+        if inicio != -1 and html.startswith('<div', inicio):
+            parser = _PrecioParser()
+            try:
+                for offset in range(inicio, len(html), TAMANO_TROZO_ESCANER):
+                    parser.feed(html[offset:offset + TAMANO_TROZO_ESCANER])
+            except _FinDeEscaneo:
+                pass
+            if parser.encontrado:
+                return ''.join(parser.partes)
+        pos = html.find(CLASE_PRECIO, pos + len(CLASE_PRECIO))
+    return None
+
+
+@lru_cache(maxsize=4)
+def _load_template(template_path: str, usar_mmap: bool = False) -> Union[str, mmap.mmap]:
+    """
+    Carga (una sola vez por proceso) el HTML de la plantilla de referencia.
+    Con usar_mmap retorna un mmap de solo lectura en vez de copiar el archivo a memoria.
+    """
+    try:
+        if usar_mmap:
+            with open(template_path, 'rb') as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(template_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        logger.warning(f"La plantilla {template_path} no fue encontrada.")
+        return ""
+    except Exception as e:
+        logger.error(f"Error cargando la plantilla: {e}")
+        return ""
+
+
+def _extraer_clases(html: Union[str, bytes, mmap.mmap]) -> frozenset:
+    """Conjunto de clases CSS usadas en un documento."""
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+    clases = set()
+    for atributo in PATRON_CLASES.findall(html):
+        clases.update(atributo.split())
+    return frozenset(clases)
+
+
+@lru_cache(maxsize=TAMANO_CACHE_NUMEROS)
+def normalizar_numero(texto: str, idioma: Optional[str] = IDIOMA_PRECIOS) -> Optional[Decimal]:
+    """
+    Convierte un precio tal como aparece en la página a Decimal (None si no es un número).
+    Con ambos separadores, el último es el decimal ("1.234,56" y "1,234.56"); un mismo
+    separador repetido es de miles ("1.234.567"). Un único separador seguido de
+    exactamente tres dígitos se interpreta según el idioma ("1.234" es 1234 en "es");
+    en cualquier otro caso es el decimal. Ignora símbolos, espacios y NBSP, y acepta
+    exponente ("1,2E-7"). Los resultados se memorizan por (texto, idioma).
+    """
+    # Camino rápido: el formato habitual de Google Finance con hl=es ("0,6278", "1.234,5", "17").
+    # Con coma presente los puntos previos son de miles para cualquier idioma (el último separador es el decimal)
+    entero, coma, decimales = texto.partition(',')
+    if coma:
+        entero = entero.replace('.', '')
+    if entero.isascii() and entero.isdigit() and (not coma or (decimales.isascii() and decimales.isdigit())):
+        if not coma or idioma != "en" or len(decimales) != 3 or texto.find('.') != -1:
+            return Decimal(f"{entero}.{decimales}" if coma else entero)
+
+    exponente = ""
+    coincidencia = PATRON_EXPONENTE.search(texto) if 'e' in texto or 'E' in texto else None
+    if coincidencia:
+        exponente = "E" + coincidencia.group(1)
+        texto = texto[:coincidencia.start()]
+    limpio = PATRON_NO_NUMERICO.sub('', texto)
+    if not limpio:
+        return None
+
+    comas, puntos = limpio.count(','), limpio.count('.')
+    if comas and puntos:
+        # Formato US (1,234.56) vs Formato EU (1.234,56)
+        if limpio.rfind(',') < limpio.rfind('.'):
+            limpio = limpio.replace(',', '')
+        else:
+            limpio = limpio.replace('.', '').replace(',', '.')
+    elif comas or puntos:
+        separador = ',' if comas else '.'
+        miles = '.' if idioma == "es" else ',' if idioma == "en" else None
+        parte_entera, _, fraccion = limpio.rpartition(separador)
+        if comas + puntos > 1 or (separador == miles and len(fraccion) == 3 and parte_entera.strip('0')):
+            limpio = limpio.replace(separador, '')
+        else:
+            limpio = limpio.replace(',', '.')
+
+    try:
+        return Decimal(limpio + exponente)
+    except InvalidOperation:
+        return None
+
+
+@lru_cache(maxsize=4)
+def _clases_plantilla(template_path: str, usar_mmap: bool = False) -> frozenset:
+    return _extraer_clases(_load_template(template_path, usar_mmap))
+
+
 class ContentComparer:
-    def __init__(self, template_path: str = "Almacenamiento/plantilla.html"):
+    def __init__(self, template_path: str = "Almacenamiento/plantilla.html",
+                 modo_estructural: bool = False, usar_mmap: bool = False,
+                 idioma: Optional[str] = IDIOMA_PRECIOS):
+        """
+        La plantilla no se lee al construir el objeto: solo se carga (y se cachea
+        a nivel de proceso) cuando se usa la comparación estructural.
+        idioma ("es", "en" o None) decide cómo leer los precios (ver normalizar_numero).
+        """
         self.template_path = template_path
-        self._template_content = self._load_template()
-
-    def _load_template(self) -> str:
-        """Carga el HTML de la plantilla de referencia."""
-        try:
-            with open(self.template_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except FileNotFoundError:
-            logger.warning(f"La plantilla {self.template_path} no fue encontrada.")
-            return ""
-        except Exception as e:
-            logger.error(f"Error cargando la plantilla: {e}")
-            return ""
+        self.modo_estructural = modo_estructural
+        self.usar_mmap = usar_mmap
+        self.idioma = idioma
+
+    @property
+    def template_content(self) -> Union[str, mmap.mmap]:
+        """HTML de la plantilla de referencia, cargado bajo demanda."""
+        return _load_template(self.template_path, self.usar_mmap)
+
+    def comparar_estructura(self, html_obtenido: str) -> float:
+        """
+        Similitud (0 a 1) entre las clases CSS de la página y las de la plantilla.
+        Un valor bajo sugiere una página de bloqueo o un cambio de maquetación.
+        """
+        clases_plantilla = _clases_plantilla(self.template_path, self.usar_mmap)
+        clases_pagina = _extraer_clases(html_obtenido)
+        union = clases_plantilla | clases_pagina
+        if not union:
+            return 0.0
+        return len(clases_plantilla & clases_pagina) / len(union)
 
     def snapshot_scraping_individual(self, html_obtenido: str, codigo: str) -> dict:
         """
@@ -33,17 +216,24 @@ class ContentComparer:
             "valor_actual": Decimal("1.1826")
         }
         """
+        with METRICAS.cronometro("parseo_segundos"):
+            return self._snapshot_scraping(html_obtenido, codigo)
+
+    def _snapshot_scraping(self, html_obtenido: str, codigo: str) -> dict:
         if not html_obtenido:
             logger.warning(f"HTML obtenido está vacío para {codigo}.")
             return None
 
-        soup = BeautifulSoup(html_obtenido, 'html.parser')
-        
-        # Google Finance usa esta clase para el precio actual principal
-        price_div = soup.find('div', class_='YMlKec fxKbKc')
-        
-        if price_div:
-            valor_str = price_div.text
+        # Primero el escáner dirigido; el árbol completo solo si no encuentra nada
+        # y el HTML contiene ambas clases (sin ellas BeautifulSoup tampoco las hallaría)
+        valor_str = extraer_precio_rapido(html_obtenido)
+        if valor_str is None and all(clase in html_obtenido for clase in CLASE_PRECIO.split()):
+            valor_str = self._extraer_precio_arbol(html_obtenido)
+            METRICAS.contar("parseo_paginas_total", ruta="arbol")
+        else:
+            METRICAS.contar("parseo_paginas_total", ruta="rapida" if valor_str is not None else "sin_precio")
+
+        if valor_str is not None:
             valor_decimal = self._parse_decimal(valor_str)
             
             if valor_decimal > Decimal('0'):
@@ -53,31 +243,27 @@ class ContentComparer:
                     "valor_actual": valor_decimal
                 }
                 
-        logger.warning(f"No se pudo encontrar el precio para {codigo}-USD.")
+        if self.modo_estructural:
+            similitud = self.comparar_estructura(html_obtenido)
+            logger.warning(f"No se pudo encontrar el precio para {codigo}-USD (similitud con plantilla: {similitud:.2f}).")
+        else:
+            logger.warning(f"No se pudo encontrar el precio para {codigo}-USD.")
         return None
 
+    def _extraer_precio_arbol(self, html_obtenido: str) -> Optional[str]:
+        """Extracción de respaldo construyendo el árbol completo con BeautifulSoup."""
+        soup = BeautifulSoup(html_obtenido, 'html.parser')
+        price_div = soup.find('div', class_=CLASE_PRECIO)
+        return price_div.text if price_div else None
+
     def _parse_decimal(self, numero_str: str) -> Decimal:
         """Normaliza y convierte una cadena a Decimal de forma segura."""
-        # Limpiar caracteres indeseados que no sean dígitos, puntos o comas
-        cleaned_str = re.sub(r'[^\d.,]', '', numero_str)
-        
-        if not cleaned_str:
-            return Decimal('0')
-
-        if ',' in cleaned_str and '.' not in cleaned_str:
-             cleaned_str = cleaned_str.replace(',', '.')
-        elif ',' in cleaned_str and '.' in cleaned_str:
-             # Formato US (1,234.56) vs Formato EU (1.234,56)
-             if cleaned_str.rfind(',') < cleaned_str.rfind('.'):
-                 cleaned_str = cleaned_str.replace(',', '')
-             else:
-                 cleaned_str = cleaned_str.replace('.', '').replace(',', '.')
-
-        try:
-            return Decimal(cleaned_str)
-        except InvalidOperation:
-            logger.error(f"No se pudo convertir '{cleaned_str}' (original: '{numero_str}') a Decimal.")
+        valor = normalizar_numero(numero_str, self.idioma)
+        if valor is None:
+            if PATRON_NO_NUMERICO.sub('', numero_str):
+                logger.error(f"No se pudo convertir '{numero_str}' a Decimal.")
             return Decimal('0')
+        return valor
 
     def calculate_relative_value(self, valor_actual: Decimal, factor: Decimal = Decimal('1')) -> Decimal:
         """Aplica un factor de corrección si es necesario preservando alta precisión."""
@@ -1,34 +1,192 @@
 import asyncio
 import random
+import threading
+import time
 import requests
 import logging
+from http.cookiejar import DefaultCookiePolicy
+from typing import AsyncIterator, NamedTuple, Optional
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from modulos.Cache_fetch import FetchCache
+from modulos.Limitador_tasa import LimitadorAdaptativo, CONCURRENCIA_MAXIMA, EXITO, SIN_PRECIO, BLOQUEO, ERROR
+from modulos.Metricas import METRICAS
 
 logger = logging.getLogger(__name__)
 
 # --- Configuración anti-detección (Requests) ---
-# Tamaño de cada lote de URLs a procesar consecutivamente
-BATCH_SIZE = 3
-# Rango de delay (en segundos) entre lotes para simular pausa humana
-DELAY_ENTRE_LOTES_MIN = 5
-DELAY_ENTRE_LOTES_MAX = 20
+# El ritmo de las peticiones lo decide modulos/Limitador_tasa.py (token bucket + AIMD)
+# Reintentos por URL ante bloqueo, 429 o error de red
+MAX_REINTENTOS = 3
+# Base (segundos) del backoff exponencial con jitter entre reintentos de una URL
+BACKOFF_BASE = 4.0
+# Timeout de cada petición
+TIMEOUT_PETICION = 15
 # Selector CSS del precio en Google Finance (para detectar bloqueos)
 SELECTOR_PRECIO = 'YMlKec fxKbKc'
+# Señales de la página de bloqueo de Google ("unusual traffic")
+MARCADORES_BLOQUEO = ('/sorry/', 'unusual traffic', 'tráfico inusual')
 # Headers base para que la petición de requests sea más natural
 # NOTA: No usamos User-Agent de navegador porque Google Finance nos enviaría 
 # la versión JavaScript (React) que oculta el precio. Usando el User-Agent por
 # defecto de Requests (o vacío), Google nos envía el HTML estático con el precio.
 HEADERS = {}
 
+# --- Pool de conexiones HTTP ---
+# Número de hosts distintos que mantienen su propio pool de conexiones
+POOL_CONEXIONES = 4
+# Conexiones keep-alive reutilizables por host
+POOL_MAXSIZE = 10
+# Peticiones simultáneas máximas contra un mismo host (el techo de concurrencia del limitador)
+MAX_CONCURRENCIA_POR_HOST = CONCURRENCIA_MAXIMA
+
+_session = None
+_session_lock = threading.Lock()
+_semaforos_host = {}
+
+
+def get_session() -> requests.Session:
+    """
+    Sesión de requests compartida (keep-alive) para no pagar un handshake TCP+TLS por URL.
+    No guarda cookies entre peticiones para que cada una se comporte igual que un
+    requests.get suelto, y anuncia compresión (gzip/deflate y br si está disponible).
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONEXIONES, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+            _session = session
+        return _session
+
+
+def close_session():
+    """Cierra la sesión compartida y sus conexiones abiertas."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def _semaforo_host(url: str) -> threading.BoundedSemaphore:
+    """Semáforo que limita las peticiones simultáneas por host."""
+    host = urlsplit(url).netloc
+    with _session_lock:
+        if host not in _semaforos_host:
+            _semaforos_host[host] = threading.BoundedSemaphore(MAX_CONCURRENCIA_POR_HOST)
+        return _semaforos_host[host]
+
+
+class ResultadoFetch(NamedTuple):
+    html: str
+    estado: str
+    retry_after: Optional[float] = None
+    no_modificado: bool = False
+
+
+def _bytes_recibidos(response: requests.Response) -> int:
+    """
+    Bytes del cuerpo tal como llegaron por la red (comprimidos con gzip/br), no el
+    tamaño descomprimido de response.content. Requiere haber leído el cuerpo antes.
+    """
+    try:
+        return response.raw.tell()
+    except Exception:
+        return int(response.headers.get("Content-Length") or len(response.content))
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    """Segundos indicados en la cabecera Retry-After (solo formato numérico)."""
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _fetch_url_detallado(url: str, cache: FetchCache = None) -> ResultadoFetch:
+    """
+    Descarga el HTML con la sesión compartida y clasifica la respuesta para el limitador.
+    Con caché, la petición es condicional y un 304 se marca como no_modificado.
+    """
+    try:
+        headers = {**HEADERS, **cache.cabeceras_condicionales(url)} if cache else HEADERS
+        with _semaforo_host(url), METRICAS.cronometro("fetch_segundos"):
+            response = get_session().get(url, headers=headers, timeout=TIMEOUT_PETICION)
+        METRICAS.contar("fetch_bytes_total", _bytes_recibidos(response))
+        if response.status_code == 304:
+            return ResultadoFetch("", EXITO, no_modificado=True)
+        if response.status_code == 429:
+            logger.warning(f"HTTP 429 en {url}")
+            return ResultadoFetch("", BLOQUEO, _retry_after(response))
+        response.raise_for_status()
+        html = response.text
+        if cache:
+            cache.registrar_validadores(url, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    except requests.HTTPError as e:
+        logger.error(f"Error procesando {url}: {e}")
+        estado = ERROR if e.response is not None and e.response.status_code >= 500 else SIN_PRECIO
+        return ResultadoFetch("", estado)
+    except Exception as e:
+        logger.error(f"Error procesando {url}: {e}")
+        return ResultadoFetch("", ERROR)
+
+    if SELECTOR_PRECIO in html:
+        return ResultadoFetch(html, EXITO)
+    if '/sorry/' in response.url or any(marcador in html for marcador in MARCADORES_BLOQUEO):
+        return ResultadoFetch(html, BLOQUEO)
+    return ResultadoFetch(html, SIN_PRECIO)
+
 
 def _fetch_url_sync(url: str) -> str:
-    """Función síncrona para descargar el HTML usando requests."""
+    """Función síncrona para descargar el HTML usando la sesión compartida de requests."""
+    return _fetch_url_detallado(url).html
+
+
+def descargar_texto(url: str) -> Optional[str]:
+    """
+    Descarga genérica con la sesión compartida (p. ej. las APIs JSON de los
+    proveedores masivos), sin la clasificación propia de Google Finance.
+    Retorna None si la petición falla.
+    """
     try:
-        response = requests.get(url, headers=HEADERS, timeout=15)
+        with _semaforo_host(url), METRICAS.cronometro("fetch_segundos"):
+            response = get_session().get(url, headers=HEADERS, timeout=TIMEOUT_PETICION)
+        METRICAS.contar("fetch_bytes_total", _bytes_recibidos(response))
         response.raise_for_status()
         return response.text
     except Exception as e:
         logger.error(f"Error procesando {url}: {e}")
-        return ""
+        return None
+
+
+async def _descargar_con_reintentos(url: str, limitador: LimitadorAdaptativo, cache: FetchCache = None) -> Optional[str]:
+    """
+    Descarga una URL respetando el limitador y reintenta ante bloqueo, 429 o error
+    de red con backoff exponencial y jitter completo.
+    Retorna None si la página no cambió (304) respecto a la caché.
+    """
+    for intento in range(MAX_REINTENTOS + 1):
+        await limitador.adquirir()
+        resultado = await asyncio.to_thread(_fetch_url_detallado, url, cache)
+        limitador.registrar(resultado.estado, resultado.retry_after)
+        METRICAS.contar("fetch_respuestas_total", estado="no_modificado" if resultado.no_modificado else resultado.estado)
+
+        if resultado.no_modificado:
+            return None
+        if resultado.estado in (EXITO, SIN_PRECIO) or intento == MAX_REINTENTOS:
+            return resultado.html
+
+        espera = random.uniform(0, BACKOFF_BASE * 2 ** intento)
+        logger.warning(f"  [{resultado.estado}] {url}: reintento {intento + 1}/{MAX_REINTENTOS} en {espera:.1f}s")
+        METRICAS.contar("fetch_reintentos_total")
+        METRICAS.contar("espera_segundos_total", espera, motivo="backoff")
+        await asyncio.sleep(espera)
 
 
 async def extract_html_from_url(url: str) -> str:
@@ -40,42 +198,71 @@ async def extract_html_from_url(url: str) -> str:
     return html_content
 
 
-async def extract_html_multiple_urls(urls: list[str]) -> dict[str, str]:
-    """Extrae el HTML de múltiples URLs usando peticiones HTTP directas (Requests).
-    
-    Es mucho más rápido que Playwright y evita que Google Finance oculte el 
-    div del precio por detección de navegador Headless.
+async def stream_html_multiple_urls(urls: list[str], limitador: LimitadorAdaptativo = None,
+                                    cache: FetchCache = None) -> AsyncIterator[tuple[str, Optional[str]]]:
+    """Extrae el HTML de múltiples URLs y entrega cada (url, html) en cuanto termina su descarga.
+
+    El ritmo lo marca un LimitadorAdaptativo: sube mientras las páginas traen precio
+    y frena ante bloqueos, así una corrida sin throttling no paga pausas fijas.
+    Al ser un generador asíncrono, el consumidor puede parsear y liberar cada HTML
+    mientras siguen las descargas, por lo que la memoria no crece con el número
+    de URLs. Las URLs que fallan no se entregan.
+    Con caché las peticiones son condicionales y las páginas sin cambios (304) se
+    entregan como (url, None) para que el consumidor use el valor guardado.
     """
-    results = {}
+    limitador = limitador or LimitadorAdaptativo()
     total = len(urls)
-    
-    # Dividir la lista en lotes de BATCH_SIZE
-    lotes = [urls[i:i + BATCH_SIZE] for i in range(0, total, BATCH_SIZE)]
-    total_lotes = len(lotes)
-
-    urls_procesadas = 0
-    for num_lote, lote in enumerate(lotes, start=1):
-        logger.info(f"--- [Lote {num_lote}/{total_lotes}] Iniciando ({len(lote)} URLs) ---")
+    pendientes = asyncio.Queue()
+    for url in urls:
+        pendientes.put_nowait(url)
+    # Cola acotada: si el consumidor se atrasa, las descargas esperan en vez de acumular HTML
+    terminados = asyncio.Queue(maxsize=CONCURRENCIA_MAXIMA)
 
-        # Lanzamos las peticiones del lote en paralelo usando hilos
-        tareas = [asyncio.to_thread(_fetch_url_sync, url) for url in lote]
-        htmls = await asyncio.gather(*tareas)
+    async def trabajador():
+        while not pendientes.empty():
+            url = pendientes.get_nowait()
+            try:
+                html_content = await _descargar_con_reintentos(url, limitador, cache)
+            except Exception as e:
+                # Siempre se entrega un resultado: el consumidor espera exactamente uno por URL
+                logger.error(f"Error descargando {url}: {e}")
+                html_content = ""
+            await terminados.put((url, html_content))
 
-        for url, html_content in zip(lote, htmls):
-            urls_procesadas += 1
-            if html_content:
+    trabajadores = [asyncio.create_task(trabajador()) for _ in range(min(CONCURRENCIA_MAXIMA, total))]
+    inicio = time.monotonic()
+    urls_exitosas = 0
+    try:
+        for urls_procesadas in range(1, total + 1):
+            url, html_content = await terminados.get()
+            logger.info(f"  [{urls_procesadas}/{total}] Extraído: {url} (tasa {limitador.tasa:.2f} req/s)")
+            if html_content is None:
+                urls_exitosas += 1
+                yield url, None
+            elif html_content:
                 # Detectar si Google devolvió una página sin precio (posible bloqueo)
                 if SELECTOR_PRECIO not in html_content:
                     logger.warning(f"  [Posible bloqueo] No se encontró clase de precio en: {url}")
-                results[url] = html_content
-            
-            logger.info(f"  [{urls_procesadas}/{total}] Extraído: {url}")
-
-        # Pausa entre lotes (excepto después del último)
-        if num_lote < total_lotes:
-            delay = random.uniform(DELAY_ENTRE_LOTES_MIN, DELAY_ENTRE_LOTES_MAX)
-            logger.info(f"--- [Lote {num_lote}/{total_lotes}] Esperando {delay:.1f}s antes del siguiente lote... ---")
-            await asyncio.sleep(delay)
-
-    logger.info(f"Extracción finalizada. {len(results)}/{total} URLs procesadas exitosamente.")
-    return results
+                urls_exitosas += 1
+                yield url, html_content
+            del html_content
+    finally:
+        for tarea in trabajadores:
+            tarea.cancel()
+        await asyncio.gather(*trabajadores, return_exceptions=True)
+
+    logger.info(
+        f"Extracción finalizada. {urls_exitosas}/{total} URLs procesadas exitosamente "
+        f"en {time.monotonic() - inicio:.1f}s ({limitador.bloqueos} bloqueos)."
+    )
+
+
+async def extract_html_multiple_urls(urls: list[str]) -> dict[str, str]:
+    """Extrae el HTML de múltiples URLs usando peticiones HTTP directas (Requests).
+    
+    Es mucho más rápido que Playwright y evita que Google Finance oculte el 
+    div del precio por detección de navegador Headless.
+    Acumula todo en un diccionario; para procesar a medida que llegan usar
+    stream_html_multiple_urls.
+    """
+    return {url: html_content async for url, html_content in stream_html_multiple_urls(urls)}
@@ -0,0 +1,106 @@
+import asyncio
+import random
+import time
+import logging
+from typing import Optional
+from modulos.Metricas import METRICAS
+
+logger = logging.getLogger(__name__)
+
+# --- Configuración del limitador adaptativo (token bucket + AIMD) ---
+# Peticiones por segundo al arrancar y límites de la tasa
+TASA_INICIAL = 0.5
+TASA_MINIMA = 0.05
+TASA_MAXIMA = 4.0
+# Tokens acumulables (ráfaga máxima)
+CAPACIDAD_BUCKET = 3
+# Peticiones simultáneas al arrancar y límites. Se arranca con una y sube de a
+# INCREMENTO_CONCURRENCIA por página con precio. El máximo es también el tope por host de
+# Extraccion_front (MAX_CONCURRENCIA_POR_HOST): las páginas van todas al mismo host y un
+# techo mayor solo dejaría peticiones esperando el semáforo con el token ya gastado
+CONCURRENCIA_INICIAL = 1
+CONCURRENCIA_MAXIMA = 3
+# Aumento aditivo por cada página con precio
+INCREMENTO_TASA = 0.1
+INCREMENTO_CONCURRENCIA = 0.25
+# Reducción multiplicativa ante bloqueo, 429 o timeout
+FACTOR_REDUCCION = 0.5
+# Pausa global tras un bloqueo si el servidor no envía Retry-After
+PAUSA_BLOQUEO = 20.0
+# Variación aleatoria (fracción) sobre cada espera para no seguir un patrón fijo
+JITTER = 0.3
+# Intervalo de sondeo cuando se espera a que se libere un hueco de concurrencia
+INTERVALO_SONDEO = 0.05
+
+# Estados de una descarga
+EXITO = "exito"            # la página contiene el precio
+SIN_PRECIO = "sin_precio"  # respuesta válida pero sin precio (divisa sin cotización)
+BLOQUEO = "bloqueo"        # página de bloqueo o HTTP 429
+ERROR = "error"            # timeout, error de red o HTTP de servidor
+
+
+class LimitadorAdaptativo:
+    """
+    Controla cuándo puede salir cada petición combinando un token bucket (tasa)
+    con un límite de concurrencia. Ambos suben de forma aditiva mientras las
+    páginas traen precio y bajan a la mitad ante un bloqueo, 429 o timeout (AIMD).
+    """
+
+    def __init__(self, tasa_inicial: float = TASA_INICIAL, concurrencia_inicial: int = CONCURRENCIA_INICIAL):
+        self.tasa = tasa_inicial
+        self.concurrencia = float(concurrencia_inicial)
+        self._tokens = 1.0
+        self._ultimo_relleno = time.monotonic()
+        self._en_vuelo = 0
+        self._pausa_hasta = 0.0
+        self.bloqueos = 0
+
+    def _rellenar(self, ahora: float):
+        if ahora > self._ultimo_relleno:
+            self._tokens = min(CAPACIDAD_BUCKET, self._tokens + (ahora - self._ultimo_relleno) * self.tasa)
+            self._ultimo_relleno = ahora
+
+    async def adquirir(self):
+        """Espera hasta que haya un token y un hueco de concurrencia libre."""
+        while True:
+            ahora = time.monotonic()
+            self._rellenar(ahora)
+            if ahora < self._pausa_hasta:
+                espera = self._pausa_hasta - ahora
+            elif self._en_vuelo >= int(self.concurrencia):
+                espera = INTERVALO_SONDEO
+            elif self._tokens >= 1:
+                self._tokens -= 1
+                self._en_vuelo += 1
+                return
+            else:
+                espera = (1 - self._tokens) / self.tasa * random.uniform(1, 1 + JITTER)
+            METRICAS.contar("espera_segundos_total", espera, motivo="limitador")
+            await asyncio.sleep(espera)
+
+    def registrar(self, estado: str, retry_after: Optional[float] = None):
+        """Libera el hueco ocupado y ajusta tasa y concurrencia según el resultado."""
+        self._en_vuelo -= 1
+        ahora = time.monotonic()
+
+        if estado == EXITO:
+            self.tasa = min(TASA_MAXIMA, self.tasa + INCREMENTO_TASA)
+            self.concurrencia = min(CONCURRENCIA_MAXIMA, self.concurrencia + INCREMENTO_CONCURRENCIA)
+        elif estado in (BLOQUEO, ERROR):
+            # Una sola reducción por episodio: las respuestas que llegan durante la pausa no vuelven a reducir
+            if ahora >= self._pausa_hasta:
+                self.tasa = max(TASA_MINIMA, self.tasa * FACTOR_REDUCCION)
+                self.concurrencia = max(1.0, self.concurrencia * FACTOR_REDUCCION)
+                self._tokens = 0.0
+                pausa = retry_after if retry_after is not None else PAUSA_BLOQUEO if estado == BLOQUEO else 1 / self.tasa
+                self._pausa_hasta = ahora + pausa * random.uniform(1, 1 + JITTER)
+                # El bucket vuelve a llenarse recién al terminar la pausa
+                self._ultimo_relleno = self._pausa_hasta
+                logger.warning(
+                    f"[Limitador] {estado}: tasa reducida a {self.tasa:.2f} req/s, "
+                    f"concurrencia {int(self.concurrencia)}, pausa de {self._pausa_hasta - ahora:.1f}s."
+                )
+            if estado == BLOQUEO:
+                self.bloqueos += 1
+        METRICAS.fijar("limitador_tasa", self.tasa)
+        METRICAS.fijar("limitador_concurrencia", int(self.concurrencia))
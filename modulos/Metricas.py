@@ -0,0 +1,225 @@
+import asyncio
+import bisect
+import json
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- Configuración de las métricas ---
+# Límites superiores (segundos) de los buckets de los histogramas de duración
+BUCKETS_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Prefijo de los nombres expuestos en formato Prometheus
+PREFIJO_PROMETHEUS = "divisas_"
+
+Clave = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _clave(nombre: str, etiquetas: dict) -> Clave:
+    return nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+class Metricas:
+    """
+    Registro de métricas del pipeline: contadores, valores instantáneos (gauges) e
+    histogramas de duración con buckets fijos. Es seguro entre hilos (las descargas
+    corren en asyncio.to_thread) y acumula desde que arranca el proceso; el reporte
+    de una corrida se obtiene restando una instantánea tomada al inicio.
+    Los procesos del pool de parseo tienen su propio registro (reiniciado al arrancar
+    cada proceso), que se vacía con drenar() y se suma al principal con fusionar().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores: Dict[Clave, float] = {}
+        self._gauges: Dict[Clave, float] = {}
+        self._histogramas: Dict[Clave, list] = {}  # [conteo, suma, conteos por bucket (+Inf al final)]
+
+    def reiniciar(self):
+        """
+        Deja el registro vacío con un lock nuevo, sin tomar el anterior. Para el
+        inicializador de los procesos del pool: con fork heredan el lock tal como
+        estaba en el principal, posiblemente tomado por un hilo que no existe en el hijo.
+        """
+        self._lock = threading.Lock()
+        self._contadores, self._gauges, self._histogramas = {}, {}, {}
+
+    def contar(self, nombre: str, valor: float = 1, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def fijar(self, nombre: str, valor: float, **etiquetas):
+        with self._lock:
+            self._gauges[_clave(nombre, etiquetas)] = valor
+
+    def observar(self, nombre: str, segundos: float, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = [0, 0.0, [0] * (len(BUCKETS_SEGUNDOS) + 1)]
+            histograma[0] += 1
+            histograma[1] += segundos
+            histograma[2][bisect.bisect_left(BUCKETS_SEGUNDOS, segundos)] += 1
+
+    @contextmanager
+    def cronometro(self, nombre: str, **etiquetas) -> Iterator[None]:
+        """Observa en el histograma `nombre` la duración del bloque."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+    def instantanea(self) -> dict:
+        """Copia del estado actual (serializable con pickle, para drenar/fusionar y reportes)."""
+        with self._lock:
+            return {
+                "contadores": dict(self._contadores),
+                "gauges": dict(self._gauges),
+                "histogramas": {k: [h[0], h[1], list(h[2])] for k, h in self._histogramas.items()},
+            }
+
+    def drenar(self) -> dict:
+        """Retorna el estado acumulado y deja el registro vacío."""
+        with self._lock:
+            estado = {"contadores": self._contadores, "gauges": self._gauges, "histogramas": self._histogramas}
+            self._contadores, self._gauges, self._histogramas = {}, {}, {}
+        return estado
+
+    def fusionar(self, estado: dict):
+        """Suma al registro el estado drenado de otro proceso."""
+        with self._lock:
+            for clave, valor in estado["contadores"].items():
+                self._contadores[clave] = self._contadores.get(clave, 0) + valor
+            self._gauges.update(estado["gauges"])
+            for clave, (conteo, suma, buckets) in estado["histogramas"].items():
+                histograma = self._histogramas.setdefault(clave, [0, 0.0, [0] * (len(BUCKETS_SEGUNDOS) + 1)])
+                histograma[0] += conteo
+                histograma[1] += suma
+                histograma[2] = [a + b for a, b in zip(histograma[2], buckets)]
+
+    def reporte(self, desde: Optional[dict] = None) -> dict:
+        """
+        Resumen legible (para el JSON de la corrida) de lo acumulado desde la instantánea
+        `desde` (o desde el arranque). Los percentiles se estiman con los buckets.
+        """
+        actual = self.instantanea()
+        desde = desde or {"contadores": {}, "gauges": {}, "histogramas": {}}
+
+        contadores = {}
+        for clave, valor in sorted(actual["contadores"].items()):
+            diferencia = valor - desde["contadores"].get(clave, 0)
+            if diferencia:
+                contadores[_nombre_reporte(clave)] = diferencia
+
+        histogramas = {}
+        for clave, (conteo, suma, buckets) in sorted(actual["histogramas"].items()):
+            previo = desde["histogramas"].get(clave, [0, 0.0, [0] * len(buckets)])
+            conteo -= previo[0]
+            if not conteo:
+                continue
+            suma -= previo[1]
+            buckets = [a - b for a, b in zip(buckets, previo[2])]
+            histogramas[_nombre_reporte(clave)] = {
+                "conteo": conteo,
+                "total_s": round(suma, 6),
+                "media_s": round(suma / conteo, 6),
+                "p50_s": _percentil(buckets, conteo, 0.50),
+                "p95_s": _percentil(buckets, conteo, 0.95),
+            }
+
+        gauges = {_nombre_reporte(clave): valor for clave, valor in sorted(actual["gauges"].items())}
+        return {"contadores": contadores, "gauges": gauges, "histogramas": histogramas}
+
+    def texto_prometheus(self) -> str:
+        """Estado acumulado en el formato de texto de Prometheus (versión 0.0.4)."""
+        actual = self.instantanea()
+        lineas = []
+        tipos_emitidos = set()
+
+        def tipo(nombre: str, clase: str):
+            if nombre not in tipos_emitidos:
+                tipos_emitidos.add(nombre)
+                lineas.append(f"# TYPE {PREFIJO_PROMETHEUS}{nombre} {clase}")
+
+        for (nombre, etiquetas), valor in sorted(actual["contadores"].items()):
+            tipo(nombre, "counter")
+            lineas.append(f"{PREFIJO_PROMETHEUS}{nombre}{_etiquetas_prometheus(etiquetas)} {valor}")
+        for (nombre, etiquetas), valor in sorted(actual["gauges"].items()):
+            tipo(nombre, "gauge")
+            lineas.append(f"{PREFIJO_PROMETHEUS}{nombre}{_etiquetas_prometheus(etiquetas)} {valor}")
+        for (nombre, etiquetas), (conteo, suma, buckets) in sorted(actual["histogramas"].items()):
+            tipo(nombre, "histogram")
+            acumulado = 0
+            for limite, cantidad in zip(BUCKETS_SEGUNDOS + ("+Inf",), buckets):
+                acumulado += cantidad
+                le = _etiquetas_prometheus(etiquetas + (("le", str(limite)),))
+                lineas.append(f"{PREFIJO_PROMETHEUS}{nombre}_bucket{le} {acumulado}")
+            lineas.append(f"{PREFIJO_PROMETHEUS}{nombre}_sum{_etiquetas_prometheus(etiquetas)} {suma}")
+            lineas.append(f"{PREFIJO_PROMETHEUS}{nombre}_count{_etiquetas_prometheus(etiquetas)} {conteo}")
+        return "\n".join(lineas) + "\n"
+
+
+def _nombre_reporte(clave: Clave) -> str:
+    nombre, etiquetas = clave
+    return nombre + ("{" + ",".join(f"{k}={v}" for k, v in etiquetas) + "}" if etiquetas else "")
+
+
+def _etiquetas_prometheus(etiquetas: tuple) -> str:
+    if not etiquetas:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in etiquetas) + "}"
+
+
+def _percentil(buckets: list, conteo: int, fraccion: float) -> Optional[float]:
+    """Límite superior del bucket donde cae el percentil (None si cae en +Inf)."""
+    objetivo = conteo * fraccion
+    acumulado = 0
+    for limite, cantidad in zip(BUCKETS_SEGUNDOS, buckets):
+        acumulado += cantidad
+        if acumulado >= objetivo:
+            return limite
+    return None
+
+
+# Registro compartido por todos los módulos del proceso
+METRICAS = Metricas()
+
+
+def escribir_reporte(ruta: str, reporte: dict):
+    """Escribe el reporte JSON de una corrida reemplazando el anterior de forma atómica."""
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, indent=4, ensure_ascii=False)
+    os.replace(temporal, ruta)
+    logger.info(f"Reporte de la corrida escrito en {ruta}.")
+
+
+async def servir_prometheus(host: str = "127.0.0.1", puerto: int = 9108, metricas: Metricas = METRICAS):
+    """
+    Expone metricas.texto_prometheus() por HTTP (cualquier ruta, p. ej. /metrics)
+    para el modo daemon. Retorna el asyncio.Server ya escuchando.
+    """
+    async def atender(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            cuerpo = metricas.texto_prometheus().encode('utf-8')
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                + f"Content-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n".encode('latin-1') + cuerpo
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    servidor = await asyncio.start_server(atender, host, puerto)
+    logger.info(f"Métricas Prometheus en http://{host}:{servidor.sockets[0].getsockname()[1]}/metrics")
+    return servidor
@@ -0,0 +1,100 @@
+import asyncio
+import heapq
+import itertools
+import signal
+import time
+import logging
+from typing import Awaitable, Callable, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+class Planificador:
+    """
+    Planificador de tareas periódicas para el modo daemon.
+    Cada tarea tiene su propio intervalo y se ejecutan de a una (comparten la base
+    de datos, los exportados y el límite de peticiones a Google Finance); si dos
+    vencen a la vez, sale primero la que venció antes. Un error en una tarea se
+    registra y no detiene al resto.
+    detener() (o SIGINT/SIGTERM) deja terminar la tarea en curso y luego sale.
+    """
+
+    def __init__(self):
+        self._cola: List[Tuple[float, int, str, Union[float, Callable[[], float]], Callable[[], Awaitable]]] = []
+        self._orden = itertools.count()
+        self._detener = None
+        self.ejecuciones = 0
+
+    def agregar(self, nombre: str, intervalo: Union[float, Callable[[], float]],
+                funcion: Callable[[], Awaitable], inmediata: bool = True):
+        """
+        Programa funcion (una corrutina sin argumentos) cada `intervalo` segundos.
+        intervalo puede ser una función: se consulta después de cada ejecución y
+        su resultado se cuenta desde ese momento (p. ej. el próximo sondeo pendiente).
+        """
+        proxima = time.monotonic() + (0 if inmediata else _segundos(intervalo))
+        heapq.heappush(self._cola, (proxima, next(self._orden), nombre, intervalo, funcion))
+
+    def reprogramar(self, nombre: str, proxima_en: float):
+        """Adelanta o atrasa la próxima ejecución de una tarea (segundos desde ahora)."""
+        for i, (_, orden, tarea, intervalo, funcion) in enumerate(self._cola):
+            if tarea == nombre:
+                self._cola[i] = (time.monotonic() + proxima_en, orden, tarea, intervalo, funcion)
+                heapq.heapify(self._cola)
+                return
+        raise KeyError(nombre)
+
+    def detener(self):
+        """Pide la salida ordenada: no se inician más tareas."""
+        if self._detener is not None:
+            self._detener.set()
+
+    def _instalar_senales(self, loop: asyncio.AbstractEventLoop):
+        for senal in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(senal, self.detener)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Windows no admite add_signal_handler: ahí se sale con Ctrl+C (KeyboardInterrupt)
+                pass
+
+    async def ejecutar(self):
+        """Corre las tareas hasta que se llame a detener()."""
+        self._detener = asyncio.Event()
+        self._instalar_senales(asyncio.get_running_loop())
+        logger.info(f"Planificador iniciado con {len(self._cola)} tareas.")
+
+        while self._cola and not self._detener.is_set():
+            proxima, _, nombre, intervalo, funcion = self._cola[0]
+            espera = proxima - time.monotonic()
+            if espera > 0:
+                try:
+                    await asyncio.wait_for(self._detener.wait(), espera)
+                    break
+                except asyncio.TimeoutError:
+                    continue  # la cola pudo reprogramarse mientras se esperaba
+
+            heapq.heappop(self._cola)
+            inicio = time.monotonic()
+            logger.info(f"[Planificador] Ejecutando '{nombre}'...")
+            try:
+                await funcion()
+            except Exception as e:
+                logger.exception(f"[Planificador] La tarea '{nombre}' falló: {e}")
+            duracion = time.monotonic() - inicio
+            self.ejecuciones += 1
+            # Sin ráfagas de recuperación: si la tarea tardó más que su intervalo, la siguiente sale al terminar
+            if callable(intervalo):
+                siguiente = time.monotonic() + intervalo()
+            else:
+                siguiente = max(proxima + intervalo, time.monotonic())
+            heapq.heappush(self._cola, (siguiente, next(self._orden), nombre, intervalo, funcion))
+            logger.info(
+                f"[Planificador] '{nombre}' terminó en {duracion:.1f}s; "
+                f"próxima en {siguiente - time.monotonic():.0f}s."
+            )
+
+        logger.info("Planificador detenido.")
+
+
+def _segundos(intervalo: Union[float, Callable[[], float]]) -> float:
+    return intervalo() if callable(intervalo) else intervalo
@@ -0,0 +1,298 @@
+import asyncio
+import json
+import os
+import time
+import logging
+from abc import ABC, abstractmethod
+from decimal import Decimal, InvalidOperation, localcontext
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from modulos.Comparacion_front import ContentComparer
+from modulos.Extraccion_front import descargar_texto
+from modulos.Metricas import METRICAS
+
+logger = logging.getLogger(__name__)
+
+# --- Configuración de los proveedores de cotizaciones ---
+# Proveedores habilitados (separados por coma); a igual costo se prefiere el primero.
+# Por defecto solo Google Finance: las fuentes masivas se actualizan una vez al día y
+# open.er-api.com exige atribución pública, así que se habilitan explícitamente
+# (p. ej. PROVEEDORES=open_er_api,frankfurter,google_finance).
+PROVEEDORES = os.environ.get("PROVEEDORES", "google_finance")
+# Peso de la salud anterior en la media móvil de cada proveedor (el resto es la última corrida)
+SUAVIZADO_SALUD = 0.7
+# Salud por debajo de la cual un proveedor solo se usa para divisas que ningún otro cubre
+SALUD_MINIMA = 0.3
+# Dígitos significativos al invertir las tasas "unidades por USD" de las fuentes masivas
+DIGITOS_TASA = 10
+# Antigüedad máxima (segundos) de una respuesta masiva que informa su hora de actualización
+ANTIGUEDAD_MAXIMA_MASIVA = 26 * 3600
+# URL de la página individual de Google Finance (precio en USD de una unidad de la divisa)
+URL_GOOGLE = "https://www.google.com/finance/quote/{codigo}-USD?hl=es"
+
+# Divisas que publica el Banco Central Europeo (las que sirve Frankfurter)
+DIVISAS_BCE = frozenset([
+    "AUD", "BGN", "BRL", "CAD", "CHF", "CNY", "CZK", "DKK", "EUR", "GBP", "HKD", "HUF", "IDR", "ILS", "INR",
+    "ISK", "JPY", "KRW", "MXN", "MYR", "NOK", "NZD", "PHP", "PLN", "RON", "SEK", "SGD", "THB", "TRY", "ZAR",
+])
+# Fuentes masivas: una sola respuesta JSON con {"<clave_tasas>": {"EUR": 0.92, ...}} en unidades por USD.
+# clave_base es el campo que indica la moneda base (se exige USD); clave_fecha, si existe, la hora
+# (epoch) de la última actualización de la fuente; cobertura None = la que devuelva.
+# open.er-api.com pide atribución ("Rates By Exchange Rate API") en los usos públicos.
+FUENTES_MASIVAS = {
+    "open_er_api": {"url": "https://open.er-api.com/v6/latest/USD", "clave_base": "base_code",
+                    "clave_fecha": "time_last_update_unix"},
+    "frankfurter": {"url": "https://api.frankfurter.app/latest?from=USD", "clave_base": "base",
+                    "cobertura": DIVISAS_BCE},
+}
+
+
+def divisa_data(codigo: str, valor: Decimal, fuente: str) -> dict:
+    """Registro con la misma forma que ContentComparer.snapshot_scraping_individual (más la fuente)."""
+    return {"codigo": f"{codigo}-USD", "valor_comparacion": "USD", "valor_actual": valor, "fuente": fuente}
+
+
+class Proveedor(ABC):
+    """
+    Fuente de cotizaciones: arma las peticiones para un conjunto de divisas
+    (peticiones), extrae los valores de cada respuesta (extraer) y lleva una
+    salud entre 0 y 1 (media móvil de la fracción de divisas entregadas) que el
+    planificador usa para encarecerla o descartarla.
+    Las subclases definen nombre, costo_peticion y, si la conocen, cobertura, e
+    implementan peticiones y extraer (sin ellas no pueden instanciarse).
+    """
+
+    nombre = ""
+    # Costo relativo de una petición (una página de Google Finance = 1)
+    costo_peticion = 1.0
+
+    def __init__(self, cobertura: Optional[Iterable[str]] = None):
+        # None = puede servir cualquier divisa (se sabe cuáles al ver la respuesta)
+        self.cobertura = frozenset(cobertura) if cobertura is not None else None
+        self.salud = 1.0
+
+    def cubre(self, codigos: Iterable[str]) -> Set[str]:
+        """Divisas de `codigos` que este proveedor puede servir."""
+        codigos = set(codigos)
+        return codigos if self.cobertura is None else codigos & self.cobertura
+
+    @abstractmethod
+    def peticiones(self, codigos: Iterable[str]) -> Dict[str, List[str]]:
+        """{url: [codigos que responde]} necesarias para obtener `codigos`."""
+
+    @abstractmethod
+    def extraer(self, contenido: str, codigos: List[str]) -> Dict[str, Decimal]:
+        """{codigo: valor en USD de una unidad} de las divisas pedidas presentes en la respuesta."""
+
+    def costo(self, codigos: Iterable[str]) -> float:
+        return self.costo_peticion * len(self.peticiones(codigos))
+
+    async def obtener(self, codigos: List[str]) -> Dict[str, dict]:
+        """Descarga y extrae: {codigo: divisa_data} de las divisas obtenidas."""
+        resultados = {}
+        for url, pedidas in self.peticiones(codigos).items():
+            contenido = await asyncio.to_thread(descargar_texto, url)
+            if not contenido:
+                continue
+            try:
+                valores = self.extraer(contenido, pedidas)
+            except Exception as e:
+                logger.error(f"[{self.nombre}] Respuesta inválida de {url}: {e}")
+                continue
+            resultados.update((codigo, divisa_data(codigo, valor, self.nombre)) for codigo, valor in valores.items())
+        return resultados
+
+    def registrar_salud(self, pedidas: Iterable[str], obtenidas: Iterable[str]):
+        """Actualiza la salud con la fracción entregada de las divisas pedidas que el proveedor cubre."""
+        cubiertas = self.cubre(pedidas)
+        if not cubiertas:
+            fraccion = 0.0
+        else:
+            fraccion = len(cubiertas & set(obtenidas)) / len(cubiertas)
+        self.salud = SUAVIZADO_SALUD * self.salud + (1 - SUAVIZADO_SALUD) * fraccion
+        METRICAS.fijar("proveedor_salud", round(self.salud, 4), proveedor=self.nombre)
+
+
+class GoogleFinance(Proveedor):
+    """
+    Página individual de Google Finance por divisa ({codigo}-USD), extraída con
+    ContentComparer. descargar_y_parsear permite usar el pipeline en streaming de
+    main.py (limitador, caché condicional y pool de parseo): recibe {url: codigo}
+    y retorna [(codigo, divisa_data), ...]. Sin él descarga las páginas de a una.
+    """
+
+    nombre = "google_finance"
+
+    def __init__(self, descargar_y_parsear: Callable[[Dict[str, str]], Awaitable[list]] = None,
+                 comparer: ContentComparer = None):
+        super().__init__()
+        self.descargar_y_parsear = descargar_y_parsear
+        self.comparer = comparer
+
+    def peticiones(self, codigos: Iterable[str]) -> Dict[str, List[str]]:
+        return {URL_GOOGLE.format(codigo=codigo): [codigo] for codigo in sorted(set(codigos)) if codigo != "USD"}
+
+    def extraer(self, contenido: str, codigos: List[str]) -> Dict[str, Decimal]:
+        if self.comparer is None:
+            self.comparer = ContentComparer()
+        datos = self.comparer.snapshot_scraping_individual(contenido, codigo=codigos[0])
+        return {codigos[0]: datos["valor_actual"]} if datos else {}
+
+    async def obtener(self, codigos: List[str]) -> Dict[str, dict]:
+        if self.descargar_y_parsear is None:
+            return await super().obtener(codigos)
+        urls = {url: pedidas[0] for url, pedidas in self.peticiones(codigos).items()}
+        return {
+            codigo: {**datos, "fuente": self.nombre}
+            for codigo, datos in await self.descargar_y_parsear(urls)
+            if datos
+        }
+
+
+class ProveedorMasivo(Proveedor):
+    """
+    Fuente que devuelve todas las tasas respecto al USD en una sola respuesta JSON
+    (ver FUENTES_MASIVAS). Las tasas vienen en unidades de la divisa por USD y se
+    invierten con DIGITOS_TASA dígitos significativos. Sin cobertura fija, la que
+    se usa para planificar es la de la última respuesta válida. Con clave_fecha,
+    una respuesta más antigua que ANTIGUEDAD_MAXIMA_MASIVA se rechaza para que
+    esas divisas pasen al siguiente proveedor.
+    """
+
+    def __init__(self, nombre: str, url: str, clave_base: str = None, clave_tasas: str = "rates",
+                 clave_fecha: str = None, cobertura: Optional[Iterable[str]] = None):
+        super().__init__(cobertura)
+        self.nombre = nombre
+        self.url = url
+        self.clave_base = clave_base
+        self.clave_tasas = clave_tasas
+        self.clave_fecha = clave_fecha
+        self.cobertura_observada: Optional[frozenset] = None
+
+    def cubre(self, codigos: Iterable[str]) -> Set[str]:
+        cubiertas = super().cubre(codigos)
+        if self.cobertura_observada is not None:
+            cubiertas &= self.cobertura_observada
+        return cubiertas
+
+    def peticiones(self, codigos: Iterable[str]) -> Dict[str, List[str]]:
+        pedidas = sorted(set(codigos) - {"USD"})
+        return {self.url: pedidas} if pedidas else {}
+
+    def extraer(self, contenido: str, codigos: List[str]) -> Dict[str, Decimal]:
+        documento = json.loads(contenido)
+        if self.clave_base and documento.get(self.clave_base) != "USD":
+            raise ValueError(f"moneda base {documento.get(self.clave_base)!r} en vez de USD")
+        if self.clave_fecha:
+            antiguedad = time.time() - float(documento[self.clave_fecha])
+            if antiguedad > ANTIGUEDAD_MAXIMA_MASIVA:
+                raise ValueError(f"tasas de hace {antiguedad / 3600:.1f} h (máximo {ANTIGUEDAD_MAXIMA_MASIVA / 3600:.0f} h)")
+        tasas = documento[self.clave_tasas]
+        self.cobertura_observada = frozenset(tasas)
+
+        valores = {}
+        for codigo in codigos:
+            try:
+                tasa = Decimal(str(tasas[codigo]))
+            except (KeyError, InvalidOperation):
+                continue
+            if tasa > 0:
+                with localcontext() as contexto:
+                    contexto.prec = DIGITOS_TASA
+                    valores[codigo] = Decimal(1) / tasa
+        return valores
+
+
+def crear_proveedores(nombres: str = PROVEEDORES,
+                      descargar_google: Callable[[Dict[str, str]], Awaitable[list]] = None,
+                      comparer: ContentComparer = None) -> List[Proveedor]:
+    """Instancia los proveedores listados en `nombres` (formato de PROVEEDORES), en ese orden."""
+    proveedores = []
+    for nombre in (n.strip() for n in nombres.split(",")):
+        if not nombre:
+            continue
+        if nombre == GoogleFinance.nombre:
+            proveedores.append(GoogleFinance(descargar_google, comparer))
+        elif nombre in FUENTES_MASIVAS:
+            proveedores.append(ProveedorMasivo(nombre, **FUENTES_MASIVAS[nombre]))
+        else:
+            logger.warning(f"Proveedor desconocido '{nombre}' en PROVEEDORES: se ignora.")
+    return proveedores
+
+
+def planificar(codigos: Iterable[str], proveedores: List[Proveedor],
+               excluidas: Dict[str, Set[str]] = None) -> List[Tuple[Proveedor, List[str]]]:
+    """
+    Elige qué proveedor consulta cada divisa al menor costo (cobertura de conjuntos
+    voraz): en cada paso toma el proveedor que cubre más divisas pendientes por
+    unidad de costo (costo / salud) y, a igual rendimiento, el primero de la lista.
+    Los proveedores con salud menor a SALUD_MINIMA solo se usan para lo que los
+    sanos no cubren. excluidas = {nombre: divisas que ese proveedor ya no entregó}.
+    Retorna [(proveedor, divisas), ...] en el orden elegido; las divisas que nadie
+    cubre quedan fuera del plan.
+    """
+    excluidas = excluidas or {}
+    pendientes = set(codigos) - {"USD"}
+    plan = []
+    sanos = [p for p in proveedores if p.salud >= SALUD_MINIMA]
+    for candidatos in (sanos, [p for p in proveedores if p.salud < SALUD_MINIMA]):
+        candidatos = list(candidatos)
+        while pendientes and candidatos:
+            mejor = None
+            for proveedor in candidatos:
+                cubiertas = proveedor.cubre(pendientes - excluidas.get(proveedor.nombre, set()))
+                if not cubiertas:
+                    continue
+                rendimiento = len(cubiertas) * max(proveedor.salud, 0.01) / max(proveedor.costo(cubiertas), 1e-9)
+                if mejor is None or rendimiento > mejor[0]:
+                    mejor = (rendimiento, proveedor, cubiertas)
+            if mejor is None:
+                break
+            _, proveedor, cubiertas = mejor
+            plan.append((proveedor, sorted(cubiertas)))
+            candidatos.remove(proveedor)
+            pendientes -= cubiertas
+    return plan
+
+
+class MotorCotizaciones:
+    """
+    Obtiene las cotizaciones de un conjunto de divisas combinando proveedores:
+    ejecuta el plan más barato y re-planifica lo que faltó con los proveedores
+    restantes (respaldo), hasta cubrir todo o agotar las alternativas. La salud
+    de cada proveedor se conserva entre corridas mientras viva el motor (daemon).
+    """
+
+    def __init__(self, proveedores: List[Proveedor]):
+        self.proveedores = proveedores
+
+    async def obtener(self, codigos: Iterable[str]) -> Dict[str, dict]:
+        """{codigo: divisa_data} de las divisas obtenidas por cualquier proveedor."""
+        pendientes = set(codigos) - {"USD"}
+        resultados = {}
+        excluidas: Dict[str, Set[str]] = {}
+
+        while pendientes:
+            plan = planificar(pendientes, self.proveedores, excluidas)
+            if not plan:
+                break
+            for proveedor, asignadas in plan:
+                inicio = time.perf_counter()
+                try:
+                    obtenidas = await proveedor.obtener(asignadas)
+                except Exception as e:
+                    logger.error(f"[{proveedor.nombre}] Falló la obtención de {len(asignadas)} divisas: {e}")
+                    obtenidas = {}
+                METRICAS.observar("proveedor_segundos", time.perf_counter() - inicio, proveedor=proveedor.nombre)
+                METRICAS.contar("proveedor_divisas_total", len(obtenidas), proveedor=proveedor.nombre)
+                proveedor.registrar_salud(asignadas, obtenidas)
+                resultados.update(obtenidas)
+                faltantes = set(asignadas) - obtenidas.keys()
+                excluidas.setdefault(proveedor.nombre, set()).update(faltantes)
+                logger.info(
+                    f"[{proveedor.nombre}] {len(obtenidas)}/{len(asignadas)} divisas "
+                    f"en {time.perf_counter() - inicio:.2f}s (salud {proveedor.salud:.2f})."
+                )
+            pendientes -= resultados.keys()
+            if pendientes:
+                logger.info(f"{len(pendientes)} divisas sin cotización: se intenta con otro proveedor.")
+        return resultados
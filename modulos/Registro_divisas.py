@@ -0,0 +1,154 @@
+import random
+import sqlite3
+import time
+import logging
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional, Set
+from modulos.Metricas import METRICAS
+
+logger = logging.getLogger(__name__)
+
+# --- Configuración del registro de disponibilidad ---
+# Fallos consecutivos a partir de los cuales una divisa deja de consultarse en cada corrida
+UMBRAL_FALLOS = 3
+# Espera (segundos) antes del primer re-sondeo; se duplica con cada fallo adicional
+ESPERA_BASE_SONDEO = 2 * 3600
+# Espera máxima entre re-sondeos de una divisa muerta
+ESPERA_MAXIMA_SONDEO = 7 * 86400
+# Variación aleatoria (fracción) para que las divisas muertas no se re-sondeen todas juntas
+JITTER_SONDEO = 0.1
+# Fracción mínima de éxitos de una corrida para registrar sus fallos (menos indica bloqueo)
+FRACCION_MINIMA_FIABLE = 0.5
+
+
+class RegistroDisponibilidad:
+    """
+    Historial de disponibilidad por divisa en divisas.db (tabla disponibilidad).
+    Reemplaza la reescritura de divisas_list.py: la lista queda como catálogo fijo y
+    este registro decide qué divisas se consultan en cada corrida. Una divisa con
+    UMBRAL_FALLOS fallos seguidos se re-sondea con backoff exponencial (ESPERA_BASE_SONDEO,
+    el doble en cada fallo, hasta ESPERA_MAXIMA_SONDEO); un solo éxito la reactiva.
+    Las corridas con menos de FRACCION_MINIMA_FIABLE de éxitos (bloqueo) no cuentan fallos.
+    """
+
+    def __init__(self, db_path: str = "Almacenamiento/divisas.db"):
+        self.db_path = db_path
+        self._init_db()
+
+    def _init_db(self):
+        query = '''
+        CREATE TABLE IF NOT EXISTS disponibilidad (
+            codigo TEXT PRIMARY KEY,
+            exitos INTEGER NOT NULL DEFAULT 0,
+            fallos INTEGER NOT NULL DEFAULT 0,
+            fallos_consecutivos INTEGER NOT NULL DEFAULT 0,
+            ultimo_exito INTEGER,
+            ultimo_intento INTEGER,
+            proximo_intento INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        '''
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(query)
+        except Exception as e:
+            logger.error(f"Error inicializando el registro de disponibilidad: {e}")
+            raise
+
+    def a_consultar(self, codigos: Iterable[str], ahora: float = None) -> List[str]:
+        """Divisas de `codigos` que toca consultar (las nuevas y las sanas siempre; las muertas cuando vence su espera)."""
+        ahora = int(time.time()) if ahora is None else int(ahora)
+        codigos = list(dict.fromkeys(codigos))
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            en_espera = {
+                codigo for (codigo,) in conn.execute(
+                    'SELECT codigo FROM disponibilidad WHERE proximo_intento > ?', (ahora,)
+                )
+            }
+        seleccion = [codigo for codigo in codigos if codigo not in en_espera]
+        omitidas = len(codigos) - len(seleccion)
+        if omitidas:
+            METRICAS.contar("divisas_omitidas_total", omitidas)
+            logger.info(f"{omitidas} divisas sin precio en las últimas corridas se omiten hasta su próximo sondeo.")
+        return seleccion
+
+    def registrar(self, intentadas: Iterable[str], exitosas: Set[str], ahora: float = None,
+                  sondeo: bool = False) -> bool:
+        """
+        Actualiza el historial con el resultado de una corrida. Retorna False si la
+        corrida no fue fiable (posible bloqueo) y por eso solo se registraron los éxitos.
+        Con sondeo=True (corrida solo de divisas muertas) los fallos cuentan siempre.
+        """
+        ahora = int(time.time()) if ahora is None else int(ahora)
+        intentadas = set(intentadas)
+        fallidas = intentadas - exitosas
+        fiable = sondeo or len(intentadas & exitosas) >= len(intentadas) * FRACCION_MINIMA_FIABLE
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany('''
+                    INSERT INTO disponibilidad (codigo, exitos, fallos_consecutivos, ultimo_exito, ultimo_intento, proximo_intento)
+                    VALUES (?, 1, 0, ?, ?, 0)
+                    ON CONFLICT(codigo) DO UPDATE SET
+                        exitos = exitos + 1, fallos_consecutivos = 0,
+                        ultimo_exito = excluded.ultimo_exito, ultimo_intento = excluded.ultimo_intento,
+                        proximo_intento = 0
+                ''', [(codigo, ahora, ahora) for codigo in intentadas & exitosas])
+
+                if fiable and fallidas:
+                    previos = dict(conn.execute(
+                        f'SELECT codigo, fallos_consecutivos FROM disponibilidad '
+                        f'WHERE codigo IN ({", ".join("?" * len(fallidas))})', sorted(fallidas)
+                    ))
+                    conn.executemany('''
+                        INSERT INTO disponibilidad (codigo, fallos, fallos_consecutivos, ultimo_intento, proximo_intento)
+                        VALUES (?, 1, ?, ?, ?)
+                        ON CONFLICT(codigo) DO UPDATE SET
+                            fallos = fallos + 1, fallos_consecutivos = excluded.fallos_consecutivos,
+                            ultimo_intento = excluded.ultimo_intento, proximo_intento = excluded.proximo_intento
+                    ''', [
+                        (codigo, consecutivos, ahora, self._proximo_intento(consecutivos, ahora))
+                        for codigo in fallidas
+                        for consecutivos in [previos.get(codigo, 0) + 1]
+                    ])
+        except Exception as e:
+            logger.error(f"Error actualizando el registro de disponibilidad: {e}")
+            raise
+
+        if not fiable:
+            logger.warning(
+                f"Solo {len(intentadas & exitosas)}/{len(intentadas)} divisas tuvieron precio. "
+                f"Posible bloqueo: no se registran fallos en esta corrida."
+            )
+        elif fallidas:
+            logger.info(f"{len(fallidas)} divisas sin precio en esta corrida: {sorted(fallidas)}")
+        METRICAS.fijar("divisas_en_espera", len(self.en_espera(ahora)))
+        return fiable
+
+    @staticmethod
+    def _proximo_intento(consecutivos: int, ahora: int) -> int:
+        if consecutivos < UMBRAL_FALLOS:
+            return 0
+        espera = min(ESPERA_MAXIMA_SONDEO, ESPERA_BASE_SONDEO * 2 ** (consecutivos - UMBRAL_FALLOS))
+        return ahora + int(espera * random.uniform(1 - JITTER_SONDEO, 1 + JITTER_SONDEO))
+
+    def sondeos_vencidos(self, ahora: float = None) -> List[str]:
+        """Divisas muertas (UMBRAL_FALLOS fallos seguidos) cuya espera ya venció."""
+        ahora = int(time.time()) if ahora is None else int(ahora)
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            return [codigo for (codigo,) in conn.execute(
+                'SELECT codigo FROM disponibilidad WHERE fallos_consecutivos >= ? AND proximo_intento <= ? ORDER BY codigo',
+                (UMBRAL_FALLOS, ahora)
+            )]
+
+    def en_espera(self, ahora: float = None) -> Dict[str, int]:
+        """{codigo: timestamp del próximo sondeo} de las divisas que hoy no se consultan."""
+        ahora = int(time.time()) if ahora is None else int(ahora)
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            return dict(conn.execute(
+                'SELECT codigo, proximo_intento FROM disponibilidad WHERE proximo_intento > ? ORDER BY codigo', (ahora,)
+            ))
+
+    def segundos_hasta_proximo_sondeo(self, ahora: float = None) -> Optional[float]:
+        """Segundos hasta que vence la espera de la próxima divisa muerta (None si no hay ninguna)."""
+        ahora = time.time() if ahora is None else ahora
+        proximos = self.en_espera(ahora).values()
+        return max(0.0, min(proximos) - ahora) if proximos else None
@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+from contextlib import closing
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+logger = logging.getLogger(__name__)
+
+# --- Configuración del servidor de tasas ---
+PUERTO_POR_DEFECTO = 8080
+# Cada cuántos segundos se revisa si main.py publicó un snapshot nuevo
+INTERVALO_RECARGA = 5.0
+# Segundos que se mantiene abierta una conexión keep-alive sin peticiones
+TIMEOUT_KEEP_ALIVE = 15.0
+# Respuestas más chicas que esto no se comprimen (gzip no compensa)
+MINIMO_GZIP = 512
+# Respuestas cacheadas por snapshot (pares /rate/ más consultados)
+MAX_RESPUESTAS_CACHE = 4096
+
+MOTIVOS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+class _Respuesta:
+    """Cuerpo ya serializado de una respuesta, con su versión gzip y ETag."""
+    __slots__ = ("estado", "cuerpo", "cuerpo_gzip", "etag")
+
+    def __init__(self, estado: int, datos: dict):
+        self.estado = estado
+        self.cuerpo = json.dumps(datos, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.cuerpo_gzip = gzip.compress(self.cuerpo, mtime=0) if len(self.cuerpo) >= MINIMO_GZIP else None
+        self.etag = '"' + hashlib.blake2b(self.cuerpo, digest_size=12).hexdigest() + '"'
+
+
+class IndiceTasas:
+    """
+    Snapshot en memoria de los valores en USD leído de divisas.db (tabla divisas)
+    o de un JSON exportado. Se recarga solo cuando cambia la fecha de modificación
+    del archivo, y las respuestas serializadas se cachean hasta la siguiente recarga.
+    """
+
+    def __init__(self, origen: str):
+        self.origen = origen
+        self.tabla: Dict[str, Decimal] = {}
+        self.fecha_actualizacion: Optional[str] = None
+        self._firma = None
+        self._respuestas: Dict[str, _Respuesta] = {}
+
+    def _firma_origen(self) -> Tuple:
+        rutas = [self.origen, self.origen + "-wal"] if self.origen.endswith(".db") else [self.origen]
+        return tuple(os.stat(r).st_mtime_ns if os.path.exists(r) else 0 for r in rutas)
+
+    def _leer(self) -> Tuple[Dict[str, Decimal], Optional[str]]:
+        if self.origen.endswith(".json"):
+            with open(self.origen, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                # datos_mapa.json incluye la secuencia de deltas junto a las divisas
+                return {codigo: Decimal(valor) for codigo, valor in data.items() if codigo != "secuencia"}, None
+            filas = [(d["codigo"], d["valor_actual"], d.get("fecha_actualizacion")) for d in data]
+        else:
+            with closing(sqlite3.connect(f"file:{self.origen}?mode=ro", uri=True)) as conn:
+                filas = conn.execute('SELECT codigo, valor_actual, fecha_actualizacion FROM divisas').fetchall()
+        tabla = {codigo.replace("-USD", ""): Decimal(valor) for codigo, valor, _ in filas}
+        fecha = max((f for _, _, f in filas if f), default=None)
+        return tabla, fecha
+
+    def recargar_si_cambio(self) -> bool:
+        """Relee el origen si cambió desde la última carga. Retorna True si hubo recarga."""
+        try:
+            firma = self._firma_origen()
+            if firma == self._firma:
+                return False
+            tabla, fecha = self._leer()
+        except Exception as e:
+            logger.error(f"Error recargando {self.origen}: {e}")
+            return False
+        # Reemplazo por referencia: las peticiones en curso siguen viendo el snapshot anterior completo
+        self.tabla, self.fecha_actualizacion, self._firma = tabla, fecha, firma
+        self._respuestas = {}
+        logger.info(f"Snapshot cargado desde {self.origen}: {len(tabla)} divisas ({fecha}).")
+        return True
+
+    def respuesta(self, ruta: str) -> _Respuesta:
+        """Respuesta para una ruta (path + query), cacheada por snapshot."""
+        respuesta = self._respuestas.get(ruta)
+        if respuesta is None:
+            respuesta = _Respuesta(*self._resolver(ruta))
+            if len(self._respuestas) < MAX_RESPUESTAS_CACHE:
+                self._respuestas[ruta] = respuesta
+        return respuesta
+
+    def _resolver(self, ruta: str) -> Tuple[int, dict]:
+        partes = urlsplit(ruta)
+        segmentos = [s for s in partes.path.split("/") if s]
+
+        if segmentos == ["currencies"]:
+            return 200, {"cantidad": len(self.tabla), "divisas": sorted(self.tabla),
+                         "fecha_actualizacion": self.fecha_actualizacion}
+
+        if segmentos == ["rates"]:
+            base = parse_qs(partes.query).get("base", ["USD"])[0].upper()
+            if base not in self.tabla:
+                return 404, {"status": "error", "mensaje": f"La divisa base '{base}' no se encuentra en el origen de datos."}
+            valor_base = self.tabla[base]
+            return 200, {"base": base, "fecha_actualizacion": self.fecha_actualizacion,
+                         "rates": {codigo: str(valor / valor_base) for codigo, valor in sorted(self.tabla.items())}}
+
+        if len(segmentos) == 3 and segmentos[0] == "rate":
+            divisa_1, divisa_2 = segmentos[1].upper(), segmentos[2].upper()
+            for divisa, rol in ((divisa_1, "base"), (divisa_2, "objetivo")):
+                if divisa not in self.tabla:
+                    return 404, {"status": "error", "mensaje": f"La divisa {rol} '{divisa}' no se encuentra en el origen de datos."}
+            return 200, {"codigo": f"{divisa_1}-{divisa_2}", "valor": str(self.tabla[divisa_1] / self.tabla[divisa_2]),
+                         "divisa_base": divisa_1, "divisa_objetivo": divisa_2,
+                         "fecha_actualizacion": self.fecha_actualizacion}
+
+        return 404, {"status": "error", "mensaje": "Ruta no encontrada. Usa /rate/{origen}/{destino}, /rates?base= o /currencies."}
+
+
+class ServidorTasas:
+    """Servidor HTTP/1.1 mínimo sobre asyncio (keep-alive, gzip y ETag) para las consultas de tasas."""
+
+    def __init__(self, origen: str = "Almacenamiento/divisas.db", host: str = "127.0.0.1",
+                 puerto: int = PUERTO_POR_DEFECTO, intervalo_recarga: float = INTERVALO_RECARGA):
+        self.indice = IndiceTasas(origen)
+        self.host = host
+        self.puerto = puerto
+        self.intervalo_recarga = intervalo_recarga
+        self._servidor = None
+        self._vigilancia = None
+
+    async def _vigilar_origen(self):
+        while True:
+            await asyncio.sleep(self.intervalo_recarga)
+            self.indice.recargar_si_cambio()
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    cabecera = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), TIMEOUT_KEEP_ALIVE)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                lineas = cabecera.decode('latin-1').split("\r\n")
+                try:
+                    metodo, ruta, version = lineas[0].split(" ", 2)
+                except ValueError:
+                    self._escribir(writer, _Respuesta(400, {"status": "error", "mensaje": "Petición inválida."}), False, None, False)
+                    break
+                headers = {}
+                for linea in lineas[1:]:
+                    if ":" in linea:
+                        nombre, valor = linea.split(":", 1)
+                        headers[nombre.strip().lower()] = valor.strip()
+                if int(headers.get("content-length", 0) or 0):
+                    await reader.readexactly(int(headers["content-length"]))
+
+                conexion = headers.get("connection", "").lower()
+                keep_alive = conexion != "close" if version == "HTTP/1.1" else conexion == "keep-alive"
+
+                if metodo not in ("GET", "HEAD"):
+                    respuesta = _Respuesta(405, {"status": "error", "mensaje": "Solo se admite GET."})
+                else:
+                    respuesta = self.indice.respuesta(ruta)
+                acepta_gzip = "gzip" in headers.get("accept-encoding", "")
+                self._escribir(writer, respuesta, keep_alive, headers.get("if-none-match"), acepta_gzip, metodo == "HEAD")
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _escribir(writer, respuesta: _Respuesta, keep_alive: bool, if_none_match: Optional[str],
+                  acepta_gzip: bool, solo_cabeceras: bool = False):
+        estado, cuerpo = respuesta.estado, respuesta.cuerpo
+        cabeceras = [f"ETag: {respuesta.etag}", "Content-Type: application/json; charset=utf-8",
+                     "Access-Control-Allow-Origin: *", "Vary: Accept-Encoding",
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if estado == 200 and if_none_match == respuesta.etag:
+            estado, cuerpo = 304, b""
+        elif acepta_gzip and respuesta.cuerpo_gzip is not None:
+            cuerpo = respuesta.cuerpo_gzip
+            cabeceras.append("Content-Encoding: gzip")
+        cabeceras.append(f"Content-Length: {len(cuerpo)}")
+        inicio = f"HTTP/1.1 {estado} {MOTIVOS[estado]}\r\n" + "".join(c + "\r\n" for c in cabeceras) + "\r\n"
+        writer.write(inicio.encode('latin-1') + (b"" if solo_cabeceras else cuerpo))
+
+    async def iniciar(self):
+        """Carga el snapshot y empieza a escuchar (no bloquea)."""
+        self.indice.recargar_si_cambio()
+        self._servidor = await asyncio.start_server(self._atender, self.host, self.puerto)
+        self.puerto = self._servidor.sockets[0].getsockname()[1]
+        self._vigilancia = asyncio.create_task(self._vigilar_origen())
+        logger.info(f"Servidor de tasas escuchando en http://{self.host}:{self.puerto}")
+
+    async def detener(self):
+        """Deja de escuchar; no hace nada si el servidor no se inició o ya se detuvo."""
+        if self._vigilancia is not None:
+            self._vigilancia.cancel()
+            self._vigilancia = None
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+            self._servidor = None
+
+    async def servir(self):
+        """Inicia el servidor y atiende hasta que se cancele."""
+        await self.iniciar()
+        try:
+            await self._servidor.serve_forever()
+        finally:
+            await self.detener()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor HTTP local de tasas de cambio.")
+    parser.add_argument("--origen", default="Almacenamiento/divisas.db", help="divisas.db o un JSON exportado")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO_POR_DEFECTO)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    try:
+        asyncio.run(ServidorTasas(args.origen, args.host, args.puerto).servir())
+    except KeyboardInterrupt:
+        logger.info("Servidor detenido.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import math
+import re
+import sqlite3
+import time
+import logging
+from contextlib import closing
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from modulos.Metricas import METRICAS
+
+logger = logging.getLogger(__name__)
+
+# --- Configuración de la guardia de anomalías ---
+# Salto (fracción) respecto al valor anterior que siempre se pone en cuarentena
+SALTO_MAXIMO = 0.5
+# Salto por debajo del cual no se evalúa el z-score (divisas casi fijas tienen varianza ~0)
+SALTO_MINIMO = 0.02
+# Retornos (escalados por √horas) más allá de estas desviaciones típicas van a cuarentena
+Z_MAXIMO = 8.0
+# Observaciones aceptadas antes de confiar en la varianza de una divisa
+MUESTRAS_MINIMAS = 10
+# Peso de cada retorno nuevo en la varianza móvil (EWMA)
+PESO_VARIANZA = 0.05
+# Resolución de los precios (Google Finance muestra 4 decimales): error de redondeo tolerado a cada lado
+RESOLUCION_PRECIOS = Decimal("0.00005")
+# Corridas seguidas con el mismo valor en cuarentena (± TOLERANCIA_CONFIRMACION) para aceptarlo como nuevo nivel
+CONFIRMACIONES_CAMBIO = 3
+TOLERANCIA_CONFIRMACION = 0.01
+# Días que se conserva el registro de valores en cuarentena
+RETENCION_CUARENTENA_DIAS = 30
+
+# Paridades fijas para la verificación triangular: {divisa: (ancla, unidades de la divisa por unidad del ancla)}.
+# divisa/USD debe coincidir con ancla/USD ÷ paridad (el cruce divisa→ancla→USD).
+PARIDADES_FIJAS = {
+    "XOF": ("EUR", Decimal("655.957")), "XAF": ("EUR", Decimal("655.957")), "KMF": ("EUR", Decimal("491.96775")),
+    "CVE": ("EUR", Decimal("110.265")), "XPF": ("EUR", Decimal("119.33174")), "BAM": ("EUR", Decimal("1.95583")),
+    "BGN": ("EUR", Decimal("1.95583")), "DKK": ("EUR", Decimal("7.46038")),
+    "BMD": ("USD", Decimal("1")), "BSD": ("USD", Decimal("1")), "PAB": ("USD", Decimal("1")),
+    "KYD": ("USD", Decimal("0.8333")), "AWG": ("USD", Decimal("1.79")), "ANG": ("USD", Decimal("1.79")),
+    "XCD": ("USD", Decimal("2.7")), "BBD": ("USD", Decimal("2")), "SAR": ("USD", Decimal("3.75")),
+    "AED": ("USD", Decimal("3.6725")), "QAR": ("USD", Decimal("3.64")), "OMR": ("USD", Decimal("0.3845")),
+    "BHD": ("USD", Decimal("0.376")), "JOD": ("USD", Decimal("0.709")), "DJF": ("USD", Decimal("177.721")),
+    "BTN": ("INR", Decimal("1")), "NPR": ("INR", Decimal("1.6")),
+    "FKP": ("GBP", Decimal("1")), "GIP": ("GBP", Decimal("1")), "SHP": ("GBP", Decimal("1")),
+}
+# Desvío tolerado respecto a la paridad (bandas como la de DKK ±2,25 % y diferenciales de mercado)
+TOLERANCIA_PARIDAD = 0.03
+# Divisas con la misma ancla que deben contradecirla (y ser mayoría) para poner el ancla en cuarentena
+MINIMO_TESTIGOS = 3
+
+PATRON_CODIGO = re.compile(r'^[A-Z]{3}$')
+
+
+class Evaluacion(NamedTuple):
+    """Resultado de GuardiaAnomalias.evaluar, pendiente de confirmar una vez publicado."""
+    aceptadas: List[str]
+    cuarentena: Dict[str, str]
+    nuevas: Dict[str, Decimal]
+    previas: Dict[str, Decimal]
+    estadisticas: Dict[str, list]
+    retornos: Dict[str, float]
+    ahora: int
+
+
+class GuardiaAnomalias:
+    """
+    Valida cada corrida antes de publicarla, en una sola pasada O(N) con una lectura
+    y una escritura en lote de divisas.db:
+      - integridad: código ISO de tres letras, valor finito y positivo;
+      - salto respecto al valor publicado (SALTO_MAXIMO) y z-score del retorno frente
+        a la varianza móvil de la divisa (Z_MAXIMO, solo si el salto supera SALTO_MINIMO);
+      - verificación triangular con PARIDADES_FIJAS: divisa→ancla→USD debe coincidir con
+        divisa→USD; si la mayoría de las divisas ancladas contradicen al ancla, el ancla es la errónea.
+    Las divisas en cuarentena conservan su último valor bueno y el motivo queda en la
+    tabla cuarentena. Un salto que se repite CONFIRMACIONES_CAMBIO corridas seguidas se
+    acepta como nuevo nivel (devaluaciones); una paridad rota no (se corrige PARIDADES_FIJAS).
+    evaluar no escribe nada: las estadísticas, confirmaciones y cuarentenas se guardan con
+    confirmar una vez publicada la corrida, así una corrida abortada no las hace avanzar.
+    """
+
+    def __init__(self, db_path: str = "Almacenamiento/divisas.db"):
+        self.db_path = db_path
+        self._init_db()
+
+    def _init_db(self):
+        esquema = '''
+        CREATE TABLE IF NOT EXISTS estadisticas_divisas (
+            codigo TEXT PRIMARY KEY,
+            muestras INTEGER NOT NULL DEFAULT 0,
+            varianza REAL NOT NULL DEFAULT 0,
+            ultimo_timestamp INTEGER,
+            pendiente TEXT,
+            confirmaciones INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS cuarentena (
+            codigo TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            valor TEXT NOT NULL,
+            anterior TEXT,
+            motivo TEXT NOT NULL,
+            PRIMARY KEY (codigo, timestamp)
+        ) WITHOUT ROWID;
+        '''
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executescript(esquema)
+        except Exception as e:
+            logger.error(f"Error inicializando la guardia de anomalías: {e}")
+            raise
+
+    def validar(self, nuevas: Dict[str, Decimal], previas: Dict[str, Decimal],
+                ahora: float = None) -> Tuple[List[str], Dict[str, str]]:
+        """
+        evaluar y confirmar en un paso (cuando la corrida se publica siempre).
+        Retorna (códigos aceptados, {codigo: motivo} de los puestos en cuarentena).
+        """
+        evaluacion = self.evaluar(nuevas, previas, ahora)
+        self.confirmar(evaluacion)
+        return evaluacion.aceptadas, evaluacion.cuarentena
+
+    def evaluar(self, nuevas: Dict[str, Decimal], previas: Dict[str, Decimal], ahora: float = None) -> Evaluacion:
+        """
+        nuevas y previas son {codigo: valor en USD} (sin el sufijo -USD); previas es lo publicado.
+        Decide qué divisas se aceptan y cuáles van a cuarentena (con su motivo) sin escribir
+        en la base; el estado resultante se guarda con confirmar.
+        """
+        ahora = int(time.time()) if ahora is None else int(ahora)
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            estadisticas = {
+                fila[0]: list(fila[1:])
+                for fila in conn.execute(
+                    'SELECT codigo, muestras, varianza, ultimo_timestamp, pendiente, confirmaciones FROM estadisticas_divisas'
+                )
+            }
+
+        cuarentena: Dict[str, str] = {}
+        confirmables = set()  # cuarentenas por salto, que pueden confirmarse como nuevo nivel
+        retornos: Dict[str, float] = {}
+
+        for codigo, valor in nuevas.items():
+            motivo = self._integridad(codigo, valor)
+            if motivo:
+                cuarentena[codigo] = motivo
+                continue
+            anterior = previas.get(codigo)
+            if anterior is None or anterior <= 0:
+                continue
+            muestras, varianza, ultimo_timestamp, _, _ = estadisticas.get(codigo, [0, 0.0, None, None, 0])
+            salto = float(max(Decimal(0), abs(valor - anterior) - 2 * RESOLUCION_PRECIOS) / anterior)
+            horas = max((ahora - ultimo_timestamp) / 3600, 1 / 60) if ultimo_timestamp else 1.0
+            retorno = math.log(valor / anterior) / math.sqrt(horas)
+            retornos[codigo] = retorno
+            if salto > SALTO_MAXIMO:
+                cuarentena[codigo] = f"salto de {salto:.1%} respecto a {anterior}"
+                confirmables.add(codigo)
+            elif salto > SALTO_MINIMO and muestras >= MUESTRAS_MINIMAS and varianza > 0:
+                z = abs(retorno) / math.sqrt(varianza)
+                if z > Z_MAXIMO:
+                    cuarentena[codigo] = f"z-score {z:.1f} (salto de {salto:.1%} respecto a {anterior})"
+                    confirmables.add(codigo)
+
+        for codigo, motivo in self._triangular(nuevas, previas, cuarentena).items():
+            cuarentena[codigo] = motivo
+            confirmables.discard(codigo)
+
+        # Saltos repetidos: nuevo nivel de la divisa
+        for codigo in sorted(confirmables):
+            fila = estadisticas.setdefault(codigo, [0, 0.0, None, None, 0])
+            pendiente = Decimal(fila[3]) if fila[3] is not None else None
+            valor = nuevas[codigo]
+            if pendiente is not None and abs(valor - pendiente) <= pendiente * Decimal(str(TOLERANCIA_CONFIRMACION)) + 2 * RESOLUCION_PRECIOS:
+                fila[4] += 1
+            else:
+                fila[3], fila[4] = str(valor), 1
+            if fila[4] >= CONFIRMACIONES_CAMBIO:
+                logger.warning(f"{codigo}: nuevo nivel {valor} confirmado en {fila[4]} corridas seguidas ({cuarentena[codigo]}).")
+                del cuarentena[codigo]
+                retornos.pop(codigo, None)  # no se incorpora a la varianza
+                fila[3], fila[4] = None, 0
+
+        aceptadas = [codigo for codigo in nuevas if codigo not in cuarentena]
+        for codigo, motivo in sorted(cuarentena.items()):
+            METRICAS.contar("divisas_cuarentena_total", tipo=motivo.split()[0].rstrip(":"))
+            logger.warning(f"{codigo} en cuarentena ({nuevas[codigo]}): {motivo}. Se conserva el último valor bueno.")
+        return Evaluacion(aceptadas, cuarentena, nuevas, previas, estadisticas, retornos, ahora)
+
+    def confirmar(self, evaluacion: Evaluacion):
+        """Guarda el estado de una evaluación (varianzas, confirmaciones pendientes y cuarentenas)."""
+        self._guardar(*evaluacion)
+
+    @staticmethod
+    def _integridad(codigo: str, valor) -> Optional[str]:
+        if not isinstance(codigo, str) or not PATRON_CODIGO.match(codigo):
+            return f"integridad: código inválido {codigo!r}"
+        if not isinstance(valor, Decimal) or not valor.is_finite() or valor <= 0:
+            return f"integridad: valor inválido {valor!r}"
+        return None
+
+    @staticmethod
+    def _triangular(nuevas: Dict[str, Decimal], previas: Dict[str, Decimal],
+                    cuarentena: Dict[str, str]) -> Dict[str, str]:
+        """
+        Motivos de las divisas que rompen la verificación triangular con PARIDADES_FIJAS.
+        Si el ancla no vino en la corrida (corrida parcial) o está en cuarentena, se
+        compara con su último valor publicado.
+        """
+        def coincide(divisa: str, valor_ancla: Decimal) -> bool:
+            paridad = PARIDADES_FIJAS[divisa][1]
+            esperado = valor_ancla / paridad
+            margen = esperado * Decimal(str(TOLERANCIA_PARIDAD)) + RESOLUCION_PRECIOS * (1 + 1 / paridad)
+            return abs(nuevas[divisa] - esperado) <= margen
+
+        por_ancla: Dict[str, List[str]] = {}
+        for divisa, (ancla, _) in PARIDADES_FIJAS.items():
+            if divisa in nuevas and divisa not in cuarentena:
+                por_ancla.setdefault(ancla, []).append(divisa)
+
+        motivos = {}
+        for ancla, divisas in sorted(por_ancla.items()):
+            nueva = ancla in nuevas and ancla not in cuarentena
+            valor_ancla = Decimal(1) if ancla == "USD" else nuevas[ancla] if nueva else previas.get(ancla)
+            if valor_ancla is None:
+                continue
+            contradicen = [divisa for divisa in divisas if not coincide(divisa, valor_ancla)]
+            if nueva and len(contradicen) >= MINIMO_TESTIGOS and len(contradicen) * 2 > len(divisas):
+                motivos[ancla] = f"paridad: contradicho por {', '.join(contradicen)}"
+                continue
+            for divisa in contradicen:
+                paridad = PARIDADES_FIJAS[divisa][1]
+                motivos[divisa] = f"paridad: {ancla}/{paridad} = {valor_ancla / paridad:.6g} USD"
+        return motivos
+
+    def _guardar(self, aceptadas: List[str], cuarentena: Dict[str, str], nuevas: Dict[str, Decimal],
+                 previas: Dict[str, Decimal], estadisticas: Dict[str, list], retornos: Dict[str, float], ahora: int):
+        filas = []
+        for codigo in aceptadas:
+            muestras, varianza, _, _, _ = estadisticas.get(codigo, [0, 0.0, None, None, 0])
+            if codigo in retornos:
+                cuadrado = retornos[codigo] ** 2
+                if muestras >= MUESTRAS_MINIMAS and varianza > 0:
+                    # Acotado para que un movimiento grande aceptado no dispare la varianza
+                    cuadrado = min(cuadrado, Z_MAXIMO ** 2 * varianza)
+                varianza = cuadrado if muestras == 0 else (1 - PESO_VARIANZA) * varianza + PESO_VARIANZA * cuadrado
+                muestras += 1
+            filas.append((codigo, muestras, varianza, ahora, None, 0))
+        for codigo in cuarentena:
+            if codigo in estadisticas and PATRON_CODIGO.match(codigo):
+                muestras, varianza, ultimo_timestamp, pendiente, confirmaciones = estadisticas[codigo]
+                filas.append((codigo, muestras, varianza, ultimo_timestamp, pendiente, confirmaciones))
+
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO estadisticas_divisas
+                        (codigo, muestras, varianza, ultimo_timestamp, pendiente, confirmaciones)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', filas)
+                conn.executemany(
+                    'INSERT OR REPLACE INTO cuarentena (codigo, timestamp, valor, anterior, motivo) VALUES (?, ?, ?, ?, ?)',
+                    [
+                        (str(codigo), ahora, str(nuevas[codigo]),
+                         str(previas[codigo]) if codigo in previas else None, motivo)
+                        for codigo, motivo in cuarentena.items()
+                    ]
+                )
+                conn.execute('DELETE FROM cuarentena WHERE timestamp < ?', (ahora - RETENCION_CUARENTENA_DIAS * 86400,))
+        except Exception as e:
+            logger.error(f"Error guardando las estadísticas de la guardia de anomalías: {e}")
+            raise
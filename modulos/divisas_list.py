@@ -1,4 +1,6 @@
 # Lista de todas las divisas para consultar su valor contra el USD en Google Finance.
+# Es el catálogo fijo: qué divisas se consultan en cada corrida lo decide
+# modulos/Registro_divisas.py según su historial de disponibilidad.
 DIVISAS_SOPORTADAS = [
     "AFN", "EUR", "ALL", "DZD", "USD", "AOA", "XCD", "AWG", "AUD", "AZN", "BSD", "BHD", 
     "BDT", "BBD", "BYN", "XOF", "BMD", "BTN", "INR", "BOB", "BOV", "BAM", "BWP", "NOK", 